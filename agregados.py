@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Agregados incrementais por minuto e por hora (rollups).
+
+A cada amostra ingerida a API atualiza, por grandeza, linha, dispositivo e
+sensor, um documento por bucket de 1 min e outro de 1 h com contagem, soma,
+mínimo e máximo ($inc/$min/$max com upsert). As consultas de intervalos
+longos leem estes documentos em vez de varrerem as leituras brutas, para
+uma linha ou somando todas. Nos buckets, linha/dispositivo/sensor ficam no
+topo (nas leituras estão no subdocumento meta). Os buckets anteriores ao
+registo de dispositivos não têm linha/dispositivo: são do dispositivo por
+omissão, como as leituras (filtro dispositivos.Dispositivo.filtro()).
+
+Para dados já existentes (ou para reparar buckets), os agregados são
+recalculados a partir das coleções *_logger pela linha de comandos:
+
+    python agregados.py --reconstruir
+    python agregados.py --reconstruir --grandeza temperatura --desde 2025-01-01
+"""
+import argparse, threading
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from indices_mongo import expr_meta, metadados
+
+EPOCA = datetime(1970, 1, 1)
+
+# granularidade -> segundos (coleção agregados_<granularidade>)
+GRANULARIDADES = {"1m": 60, "1h": 3600}
+
+# grandeza -> coleção de origem (campo "valor")
+FONTES = {
+    "temperatura":       "temperatura_logger",
+    "humidade":          "humidade_logger",
+    "velocidade":        "velocidade_logger",
+    "contador_pequenas": "contador_unidades_logger",
+    "contador_grandes":  "contador_unidades_logger_grandes",
+}
+
+LOTE_RECONSTRUCAO = 1000
+CHAVE_DUPLICADA   = 11000
+
+# chave única de um bucket; o índice antigo (sem linha/dispositivo) é removido
+CHAVE = [("grandeza", ASCENDING), ("linha", ASCENDING), ("dispositivo", ASCENDING),
+         ("sensor", ASCENDING), ("inicio", ASCENDING)]
+INDICE_ANTIGO = "grandeza_1_sensor_1_inicio_1"
+
+
+def inicio_bucket(ts, segundos):
+    s = (ts - EPOCA) // timedelta(seconds=segundos) * segundos
+    return EPOCA + timedelta(seconds=s)
+
+def colecao(db, granularidade):
+    return db[f"agregados_{granularidade}"]
+
+def escrever_upserts(col, ops):
+    """bulk_write de upserts; repete os que perderam a corrida a criar o mesmo documento."""
+    try:
+        col.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # dois upserts do mesmo bucket novo em simultâneo: o perdedor repete
+        repetir = [ops[x["index"]] for x in e.details.get("writeErrors", [])
+                   if x.get("code") == CHAVE_DUPLICADA]
+        if len(repetir) < len(e.details.get("writeErrors", [])): raise
+        col.bulk_write(repetir, ordered=False)
+
+def garantir_indices(db):
+    acoes = []
+    for g in GRANULARIDADES:
+        col = colecao(db, g)
+        if INDICE_ANTIGO in col.index_information():
+            # único só por sensor: recusaria o mesmo bucket de dois dispositivos
+            col.drop_index(INDICE_ANTIGO)
+            acoes.append(f"{col.name}: índice {INDICE_ANTIGO} removido")
+        idx = col.create_index(CHAVE, unique=True)
+        acoes.append(f"{col.name}: índice {idx}")
+    return acoes
+
+
+# --------------------------
+# Atualização incremental (ingestão)
+# --------------------------
+class Agregados:
+    """Mantém os agregados de 1 min / 1 h atualizados a partir das amostras ingeridas."""
+
+    def __init__(self, db):
+        self.cols  = {g: colecao(db, g) for g in GRANULARIDADES}
+        self._lock = threading.Lock()
+        self.atualizacoes = 0
+        self.erros = 0
+
+    def atualizar(self, grandeza, docs, campo="valor"):
+        """Soma as amostras aos buckets (uma operação por bucket, não por amostra)."""
+        for g, segundos in GRANULARIDADES.items():
+            acum = {}
+            for d in docs:
+                v = d.get(campo)
+                if v is None: continue
+                m = metadados(d)
+                k = (m.get("linha"), m.get("dispositivo"), m.get("sensor"),
+                     inicio_bucket(d["timestamp"], segundos))
+                a = acum.get(k)
+                if a is None:
+                    acum[k] = [1, v, v, v]
+                else:
+                    a[0] += 1; a[1] += v
+                    if v < a[2]: a[2] = v
+                    if v > a[3]: a[3] = v
+            ops = [
+                UpdateOne({"grandeza": grandeza, "linha": l, "dispositivo": disp, "sensor": s, "inicio": t},
+                          {"$inc": {"n": n, "soma": soma}, "$min": {"min": mn}, "$max": {"max": mx}},
+                          upsert=True)
+                for (l, disp, s, t), (n, soma, mn, mx) in acum.items()
+            ]
+            if ops: self._escrever(self.cols[g], ops)
+
+    def _escrever(self, col, ops):
+        try:
+            escrever_upserts(col, ops)
+            with self._lock: self.atualizacoes += len(ops)
+        except PyMongoError:
+            # a leitura bruta já foi aceite; o bucket repara-se com --reconstruir
+            with self._lock: self.erros += 1
+
+    def estado(self):
+        return {"granularidades": list(GRANULARIDADES), "atualizacoes": self.atualizacoes,
+                "erros": self.erros}
+
+
+# --------------------------
+# Reconstrução a partir das leituras brutas
+# --------------------------
+def reconstruir(db, grandeza, granularidade, desde=None, ate=None):
+    """Recalcula (substitui) os buckets do intervalo. Devolve o nº de buckets escritos."""
+    segundos = GRANULARIDADES[granularidade]
+    ms = segundos * 1000
+    f = {}
+    # alinha aos buckets para não substituir um bucket por parte dos seus dados
+    if desde: f["$gte"] = inicio_bucket(desde, segundos)
+    if ate:   f["$lt"]  = inicio_bucket(ate, segundos) + timedelta(seconds=segundos)
+    t = {"$subtract": ["$timestamp", EPOCA]}
+    pipeline = ([{"$match": {"timestamp": f}}] if f else []) + [
+        {"$group": {
+            "_id":  dict(expr_meta("linha", "dispositivo", "sensor"),
+                         t={"$subtract": [t, {"$mod": [t, ms]}]}),
+            "n":    {"$sum": 1},
+            "soma": {"$sum": "$valor"},
+            "min":  {"$min": "$valor"},
+            "max":  {"$max": "$valor"},
+        }},
+    ]
+    destino, ops, total = colecao(db, granularidade), [], 0
+    for b in db[FONTES[grandeza]].aggregate(pipeline, allowDiskUse=True):
+        chave = {"grandeza": grandeza, "linha": b["_id"].get("linha"),
+                 "dispositivo": b["_id"].get("dispositivo"), "sensor": b["_id"].get("sensor"),
+                 "inicio": EPOCA + timedelta(milliseconds=b["_id"]["t"])}
+        ops.append(ReplaceOne(chave, dict(chave, n=b["n"], soma=b["soma"], min=b["min"], max=b["max"]),
+                              upsert=True))
+        if len(ops) >= LOTE_RECONSTRUCAO:
+            destino.bulk_write(ops, ordered=False); total += len(ops); ops = []
+    if ops:
+        destino.bulk_write(ops, ordered=False); total += len(ops)
+    return total
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Agregados de 1 min / 1 h do ProdSenseBD")
+    ap.add_argument("--uri", default="mongodb://localhost:27017/")
+    ap.add_argument("--db", default="ProdSenseBD")
+    ap.add_argument("--reconstruir", action="store_true",
+                    help="recalcula os agregados a partir das leituras brutas")
+    ap.add_argument("--grandeza", choices=list(FONTES), help="por omissão, todas")
+    ap.add_argument("--granularidade", choices=list(GRANULARIDADES), help="por omissão, todas")
+    ap.add_argument("--desde", type=datetime.fromisoformat, help="UTC, ex.: 2025-01-01T00:00")
+    ap.add_argument("--ate", type=datetime.fromisoformat, help="UTC")
+    args = ap.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    for acao in garantir_indices(db):
+        print(" -", acao)
+    if args.reconstruir:
+        for grandeza in ([args.grandeza] if args.grandeza else FONTES):
+            for g in ([args.granularidade] if args.granularidade else GRANULARIDADES):
+                n = reconstruir(db, grandeza, g, args.desde, args.ate)
+                print(f"{grandeza} {g}: {n} buckets")
@@ -1,35 +1,173 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Header
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pymongo import MongoClient
 from pymongo.collection import Collection
 from pydantic import BaseModel
-from pymodbus.client import ModbusTcpClient
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-import threading, time, os
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio, time, os, sys
+
+from modbus_conexao import ErroModbus, GestorModbus
+from cache_ultimas import CacheUltimas
+import historico_recente
+from historico_recente import HistoricoRecente
+from escrita_diferida import EscritaDiferida, BufferCheio
+import historico
+import idempotencia
+import agregados
+import contadores
+import dispositivos
+import exportacao
+from dispositivos import DispositivoDesconhecido
+from historico import ErroConsulta
+import indices_mongo
+import interlock
+import metricas
+from serializacao import RespostaJSON
+from difusao import Difusor
+from pisca_alarme import PiscaAlarme
+from fila_comandos import CONTROLO, COSMETICO, ComandoExpirado, ComandoRejeitado
+from interlock import MotorInterlock
+from controlo_histerese import ControladorHisterese
 
 # --------------------------
 # Configurações gerais
 # --------------------------
-MONGO_URI        = "mongodb://localhost:27017/"
-DB_NAME          = "ProdSenseBD"
-FIELDLOGGER_IP   = "192.168.0.30"
-FIELDLOGGER_PORT = 502
+# as variáveis SYSSENSE_* permitem apontar a API para um Mongo/FieldLogger de teste (ex.: bench/)
+MONGO_URI        = os.environ.get("SYSSENSE_MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME          = os.environ.get("SYSSENSE_DB_NAME", "ProdSenseBD")
+# FieldLogger por omissão (sem dispositivos.json; ver dispositivos.py)
+FIELDLOGGER_IP   = os.environ.get("SYSSENSE_FIELDLOGGER_IP", "192.168.0.30")
+FIELDLOGGER_PORT = int(os.environ.get("SYSSENSE_FIELDLOGGER_PORT", "502"))
 MODBUS_UNIT_ID   = 1
 
+# --------------------------
+# Escrita diferida (write-behind) nas coleções *_logger
+# --------------------------
+ESCRITA_DIFERIDA       = os.environ.get("SYSSENSE_ESCRITA_DIFERIDA", "0") == "1"
+ESCRITA_MAX_LOTE       = 500      # documentos por insert_many
+ESCRITA_MAX_ESPERA     = 1.0      # s máximos que uma leitura espera no buffer
+ESCRITA_CAPACIDADE     = 20000    # documentos em memória por coleção
+# leituras aceites (202) que não chegaram ao Mongo ao parar; voltam ao buffer no arranque
+ESCRITA_RESGATE        = os.environ.get("SYSSENSE_ESCRITA_RESGATE",
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "escrita_pendente"))
+
+# --------------------------
+# Ingestão rápida: resposta mínima em vez do documento gravado (os coletores ignoram-no)
+# 204 = gravado; 202 = aceite na escrita diferida, ainda por gravar
+# --------------------------
+INGESTAO_RAPIDA        = os.environ.get("SYSSENSE_INGESTAO_RAPIDA", "0") == "1"
+
 # --------------------------
 # Registros Modbus do Tapete
 # --------------------------
 REG_ENTRADA_CANAL_4 = 17   # habilita o tapete (1 = on, 0 = off)
 REG_ENTRADA_CANAL_8 = 21   # modo: 0 = automático, 1 = manual
 REG_SAIDA_LUZ_VERDE = 26   # saída do tapete/luz verde
+REG_SAIDA_ALERTA    = 27   # luz de alerta (pisca)
+
+# interlock: canal 4 lido a cada INTERLOCK_PERIODO s (máx. 0,1) numa ligação própria
+INTERLOCK_PERIODO   = float(os.environ.get("SYSSENSE_INTERLOCK_PERIODO", "0.05"))
+INTERLOCK_TIMEOUT   = 0.5  # s por leitura (a ligação do snapshot usa o timeout do dispositivo)
+
+# --------------------------
+# Snapshot de registos (lidos em bloco a cada ciclo, em cada dispositivo)
+# --------------------------
+REG_TEMPERATURA     = 3    # canal analógico 1 (PT100)
+REG_HUMIDADE        = 5    # canal analógico 3
+REG_PULSO_TAPETE    = 14   # pulso de movimento do tapete
+REG_PECAS_PEQUENAS  = 15
+REG_PECAS_GRANDES   = 16
+REGISTOS_SNAPSHOT = [
+    REG_TEMPERATURA, REG_HUMIDADE, REG_PULSO_TAPETE,
+    REG_PECAS_PEQUENAS, REG_PECAS_GRANDES,
+    REG_ENTRADA_CANAL_4, REG_ENTRADA_CANAL_8,
+    REG_SAIDA_LUZ_VERDE, REG_SAIDA_ALERTA,
+]
+SNAPSHOT_PERIODO  = 0.5    # s entre ciclos de leitura
+SNAPSHOT_IDADE_MAX = 2.0   # s; acima disto lê diretamente do FieldLogger
+
+# --------------------------
+# Métricas (/metrics, formato Prometheus)
+# --------------------------
+registo_metricas = metricas.Registo()
+m_modbus = registo_metricas.histograma(
+    "syssense_modbus_latencia_segundos", "Latência das operações Modbus por dispositivo e registo",
+    ("dispositivo", "op", "registo", "resultado"))
+m_modbus_erros = registo_metricas.contador(
+    "syssense_modbus_erros_total", "Operações Modbus falhadas (erro ou sem resposta)",
+    ("dispositivo", "op", "registo", "tipo"))
+m_leituras_falhadas = registo_metricas.contador(
+    "syssense_leituras_falhadas_total", "Leituras de registo devolvidas como indisponíveis",
+    ("dispositivo", "registo"))
+m_mongo = registo_metricas.histograma(
+    "syssense_mongo_latencia_segundos", "Latência dos comandos MongoDB por coleção",
+    ("comando", "colecao"))
+m_mongo_erros = registo_metricas.contador(
+    "syssense_mongo_erros_total", "Comandos MongoDB falhados", ("comando", "colecao"))
+m_http = registo_metricas.histograma(
+    "syssense_http_latencia_segundos", "Latência dos pedidos HTTP por rota",
+    ("metodo", "rota", "estado"))
+m_http_erros = registo_metricas.contador(
+    "syssense_http_erros_total", "Pedidos HTTP com resposta 5xx", ("metodo", "rota", "estado"))
+m_interlock = registo_metricas.histograma(
+    "syssense_interlock_periodo_segundos", "Intervalo real entre leituras do interlock do tapete",
+    ("dispositivo",), limites=(0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5))
+m_interlock_reacao = registo_metricas.histograma(
+    "syssense_interlock_reacao_segundos", "Tempo do disparo do interlock até à saída confirmada a 0",
+    ("dispositivo",))
+m_interlock_disparos = registo_metricas.contador(
+    "syssense_interlock_disparos_total", "Disparos do interlock do tapete",
+    ("dispositivo", "motivo", "confirmado"))
+m_comandos = registo_metricas.histograma(
+    "syssense_comandos_latencia_segundos", "Latência dos comandos de escrita (fila + FieldLogger)",
+    ("dispositivo", "prioridade", "estado"))
+
+# medidores lidos no momento da recolha (os objetos são criados mais abaixo)
+registo_metricas.medidor("process_cpu_seconds_total", "Tempo de CPU do processo da API",
+                         time.process_time, tipo="counter")
+registo_metricas.medidor("syssense_modbus_ligado", "1 se a ligação ao FieldLogger está aberta",
+                         lambda: {d.id: int(d.modbus.ligado) for d in registo_dispositivos},
+                         ("dispositivo",))
+registo_metricas.medidor("syssense_snapshot_idade_segundos", "Idade do último snapshot Modbus",
+                         lambda: {d.id: d.snapshot.atual.idade() for d in registo_dispositivos
+                                  if d.snapshot.atual}, ("dispositivo",))
+registo_metricas.medidor("syssense_comandos_pendentes", "Comandos de escrita à espera na fila",
+                         lambda: {d.id: d.comandos.estado()["pendentes"] for d in registo_dispositivos},
+                         ("dispositivo",))
+registo_metricas.medidor("syssense_recente_bytes", "Memória dos buffers do histórico recente",
+                         lambda: recente.memoria(),
+                         ("dispositivo", "grandeza"))
+registo_metricas.medidor("syssense_sse_subscritores", "Clientes ligados a /stream",
+                         lambda: difusor.subscritores)
+registo_metricas.medidor("syssense_escrita_diferida_pendentes", "Documentos à espera de insert",
+                         lambda: {nome: e["pendentes"] for nome, e in escrita.estado().items()},
+                         ("colecao",))
+
+def medir_modbus(dispositivo, op, end, duracao, resultado):
+    registo = "" if end is None else str(end)
+    m_modbus.observar(duracao, dispositivo, op, registo, resultado)
+    if resultado != "ok":
+        m_modbus_erros.inc(dispositivo, op, registo, resultado)
+
+def medir_comando(dispositivo, prioridade, estado, latencia):
+    m_comandos.observar(latencia, dispositivo, prioridade, estado)
+
+# --------------------------
+# Dispositivos: uma ligação Modbus persistente, um snapshot e uma fila de comandos por FieldLogger
+# --------------------------
+registo_dispositivos = dispositivos.carregar(REGISTOS_SNAPSHOT, FIELDLOGGER_IP, FIELDLOGGER_PORT,
+                                             MODBUS_UNIT_ID, periodo=SNAPSHOT_PERIODO,
+                                             ao_medir=medir_modbus, ao_comando=medir_comando)
 
 # --------------------------
 # Conexão ao MongoDB
 # --------------------------
-mongo       = MongoClient(MONGO_URI)
+mongo       = MongoClient(MONGO_URI, event_listeners=[metricas.OuvinteMongo(m_mongo, m_mongo_erros)])
 db          = mongo[DB_NAME]
 col_status  : Collection = db["comunicacao_logger"]
 col_temp    : Collection = db["temperatura_logger"]
@@ -37,69 +175,290 @@ col_hum     : Collection = db["humidade_logger"]
 col_vel     : Collection = db["velocidade_logger"]
 col_cnt_s   : Collection = db["contador_unidades_logger"]
 col_cnt_l   : Collection = db["contador_unidades_logger_grandes"]
+col_setpoints: Collection = db["controlo_setpoints"]
+col_interlock: Collection = db[interlock.COLECAO]   # auditoria dos disparos
+
+agregacao = agregados.Agregados(db)   # rollups de 1 min / 1 h
+envios    = idempotencia.RegistoEnvios(db) # ids das leituras já gravadas (reenvios)
+contagem  = contadores.Contadores(db) # totais de peças por hora / turno
+escrita = EscritaDiferida(max_lote=ESCRITA_MAX_LOTE, max_espera=ESCRITA_MAX_ESPERA,
+                          capacidade=ESCRITA_CAPACIDADE, pasta_resgate=ESCRITA_RESGATE)
+
+# --------------------------
+# Difusão em tempo real (SSE) para os dashboards
+# --------------------------
+difusor = Difusor()
+
+def publicar(tipo, d, dados, chave=None):
+    """Evento SSE de um dispositivo (o stream de cada dashboard filtra por dispositivo)."""
+    difusor.publicar(tipo, dict(dados, dispositivo=d.id, linha=d.linha),
+                     chave=(d.id, chave), dispositivo=d.id)
+
+# --------------------------
+# Pisca da luz de alerta (comandado pela API, não pelo browser), um por dispositivo
+# As escritas do pisca são cosméticas: passam depois da segurança e dos relés.
+# --------------------------
+for _d in registo_dispositivos:
+    _d.pisca = PiscaAlarme(_d.comandos.vista(COSMETICO), REG_SAIDA_ALERTA,
+                           ao_mudar=lambda e, d=_d: publicar("alarme", d, e))
+
+# --------------------------
+# Interlock do tapete (canal 4 → saída 26), um por dispositivo
+# Lê numa ligação persistente própria; escreve pela fila com prioridade de segurança.
+# --------------------------
+def gravar_disparo(doc):
+    try:
+        col_interlock.insert_one(doc)
+    except Exception:
+        pass   # a falha fica em syssense_mongo_erros_total; o disparo já está nas estatísticas
+
+def auditar_disparo(d, disparo):
+    m_interlock_disparos.inc(d.id, disparo["motivo"], "sim" if disparo["confirmado"] else "nao")
+    m_interlock_reacao.observar(disparo["reacao_ms"] / 1000, d.id)
+    # pymongo é síncrono: grava fora do event loop
+    asyncio.get_running_loop().run_in_executor(None, gravar_disparo, dict(disparo, **d.metadados()))
+
+for _d in registo_dispositivos:
+    _d.interlock = MotorInterlock(
+        GestorModbus(_d.modbus.ip, _d.modbus.porta, _d.modbus.unit_id, timeout=INTERLOCK_TIMEOUT,
+                     ao_medir=lambda *a, d=_d: medir_modbus(d.id, *a)),
+        _d.comandos, REG_ENTRADA_CANAL_4, REG_SAIDA_LUZ_VERDE, periodo=INTERLOCK_PERIODO,
+        ao_disparar=lambda e, d=_d: auditar_disparo(d, e),
+        ao_ciclo=lambda s, d=_d: m_interlock.observar(s, d.id))
+
+# --------------------------
+# Controlo automático por histerese (avaliado a cada amostra ingerida)
+# Um controlador por grandeza em cada dispositivo: atua nos relés do dispositivo,
+# com as amostras desse dispositivo.
+# --------------------------
+padrao = registo_dispositivos.padrao
+
+def criar_controladores(d):
+    # os setpoints do dispositivo por omissão mantêm o _id de antes (nome da grandeza)
+    chave = (lambda nome: None) if d is padrao else (lambda nome: f"{d.id}:{nome}")
+    return {
+        "temperatura": ControladorHisterese(
+            "temperatura", lambda st: comandar_ventilador(d, st),
+            lambda: d.estado_reles["ventilador"], col_setpoints,
+            ao_mudar=lambda e: publicar("controlo", d, e, chave="temperatura"),
+            chave=chave("temperatura")),
+        "humidade": ControladorHisterese(
+            "humidade", lambda st: comandar_humidificador(d, st),
+            lambda: d.estado_reles["humidificador"], col_setpoints,
+            ao_mudar=lambda e: publicar("controlo", d, e, chave="humidade"),
+            chave=chave("humidade")),
+    }
+
+# dispositivo -> grandeza -> controlador
+controladores = {d.id: criar_controladores(d) for d in registo_dispositivos}
+
+def todos_controladores():
+    return [(d_id, ctl) for d_id, ctls in controladores.items() for ctl in ctls.values()]
+
+# --------------------------
+# Grandezas: canal → (coleção, campo do valor)
+# Mapa único usado pela cache, pelo histórico e pelo arranque.
+# --------------------------
+GRANDEZAS = {
+    "status":           (col_status, "status"),
+    "temperatura":      (col_temp,   "valor"),
+    "humidade":         (col_hum,    "valor"),
+    "velocidade":       (col_vel,    "valor"),
+    "contador_pequenas":(col_cnt_s,  "valor"),
+    "contador_grandes": (col_cnt_l,  "valor"),
+}
+
+# --------------------------
+# Cache das últimas leituras (evita find_one em cada /ultima_*)
+# --------------------------
+cache = CacheUltimas()
+
+# --------------------------
+# Histórico recente em memória (tendências dos dashboards sem ir ao Mongo)
+# Um buffer numpy de tamanho fixo por dispositivo e canal; ver historico_recente.py.
+# --------------------------
+RECENTE_CANAIS = ("temperatura", "humidade", "velocidade")
+recente = HistoricoRecente(RECENTE_CANAIS)
 
 # --------------------------
 # Inicialização do FastAPI
 # --------------------------
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    await arranque()
+    try:
+        yield
+    finally:
+        await encerramento()
+
+# RespostaJSON: orjson quando instalado; as rotas com listas grandes devolvem-na diretamente
+app = FastAPI(lifespan=ciclo_de_vida, default_response_class=RespostaJSON)
 app.mount(
     "/static",
     StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")),
     name="static"
 )
+app.add_middleware(metricas.MiddlewareLatencia, histograma=m_http, erros=m_http_erros)
 
 # --------------------------
 # Modelos Pydantic
 # --------------------------
+# timestamp opcional: leituras reenviadas/em lote trazem a hora original
+# dispositivo opcional: sem ele, a leitura é do dispositivo por omissão
+class Compressao(BaseModel):
+    # metadados da compressão feita no coletor (windows_services/compressao.py)
+    modo: str                     # "deadband" (degraus) ou "swinging_door" (linear)
+    desvio: float
+    motivo: Optional[str] = None  # inicial / desvio / atraso / heartbeat / final
+
 class StatusEntrada(BaseModel):
     status: int
+    timestamp: Optional[datetime] = None
+    dispositivo: Optional[str] = None
+    id_envio: Optional[str] = None      # id da fila do coletor: um reenvio não duplica
 
 class TemperaturaEntrada(BaseModel):
     sensor: str
     valor: float
+    timestamp: Optional[datetime] = None
+    compressao: Optional[Compressao] = None
+    dispositivo: Optional[str] = None
+    id_envio: Optional[str] = None      # id da fila do coletor: um reenvio não duplica
 
 class ContadorEntrada(BaseModel):
     sensor: str
     valor: int
+    timestamp: Optional[datetime] = None
+    dispositivo: Optional[str] = None
+    id_envio: Optional[str] = None      # id da fila do coletor: um reenvio não duplica
 
 class VelocidadeEntrada(BaseModel):
     timestamp: str
     valor: float
+    compressao: Optional[Compressao] = None
+    dispositivo: Optional[str] = None
+    id_envio: Optional[str] = None      # id da fila do coletor: um reenvio não duplica
+    jitter_ms: Optional[float] = None   # qualidade da estimativa por pulsos (estimador_velocidade)
+    confianca: Optional[float] = None
+
+class LimitesControlo(BaseModel):
+    minimo: float
+    maximo: float
+
+class PiscaConfig(BaseModel):
+    padrao: str = "pisca"     # ver pisca_alarme.PADROES
+    periodo: float = 0.6      # s por passo do padrão
 
 # --------------------------
 # Helpers Modbus
 # --------------------------
-def ler_registro_modbus(end: int):
-    client = ModbusTcpClient(FIELDLOGGER_IP, port=FIELDLOGGER_PORT)
-    if not client.connect(): return None
+def obter_dispositivo(id: Optional[str] = None):
+    """Dispositivo do pedido (None → por omissão); DispositivoDesconhecido dá 404."""
+    return registo_dispositivos.obter(id)
+
+@app.exception_handler(DispositivoDesconhecido)
+def dispositivo_desconhecido(_req, e: DispositivoDesconhecido):
+    return JSONResponse({"error": str(e)}, 404)
+
+async def ler_registro_modbus(d, end: int, idade_max: float = SNAPSHOT_IDADE_MAX):
+    # usa o snapshot se for recente; caso contrário lê diretamente
+    v = d.snapshot.valor(end, idade_max)
+    if v is not None: return v
     try:
-        resp = client.read_holding_registers(address=end, count=1, slave=MODBUS_UNIT_ID)
-        if resp.isError(): return None
-        return resp.registers[0]
-    finally:
-        client.close()
+        return await d.modbus.ler_registo(end)
+    except ErroModbus:
+        # a causa (erro/timeout) fica em syssense_modbus_erros_total
+        m_leituras_falhadas.inc(d.id, str(end))
+        return None
 
 # --------------------------
-# Monitor de Canal 4 em Background
+# Produtor do stream: estado do tapete e interlock a partir do snapshot
 # --------------------------
-def monitorar_canal_4_em_background():
+async def publicar_estado_tapete(d):
+    versao, anterior = 0, None
     while True:
-        val = ler_registro_modbus(REG_ENTRADA_CANAL_4)
-        if val == 0:
-            # força desligar o tapete
-            c = ModbusTcpClient(FIELDLOGGER_IP, port=FIELDLOGGER_PORT)
+        snap = await d.snapshot.esperar_nova(versao, timeout=5)
+        if snap is None: continue
+        versao = snap.versao
+        regs = snap.registos
+        # estado conhecido das saídas para a fila de comandos (lido a partir do início do ciclo)
+        d.comandos.observar(regs, snap.monotonic - snap.duracao_ms / 1000)
+        atual = (regs.get(REG_ENTRADA_CANAL_4), regs.get(REG_ENTRADA_CANAL_8),
+                 regs.get(REG_SAIDA_LUZ_VERDE))
+        if atual == anterior: continue
+        anterior = atual
+        canal_4, canal_8, luz = atual
+        publicar("tapete", d, {"estado": "on" if luz == 1 else "off",
+                               "timestamp": snap.timestamp})
+        publicar("interlock", d, {"seguranca_ativa": canal_4 == 0,
+                                  "modo_manual": canal_8 == 1,
+                                  "timestamp": snap.timestamp})
+
+# --------------------------
+# Arranque e encerramento (lifespan)
+# --------------------------
+provisionamento: list = []   # ações do último provisionamento de índices
+tarefas: list = []           # tarefas asyncio de fundo
+
+def preparar_mongo():
+    # índices antes da cache: índices em falta tornam o carregamento lento
+    try:
+        provisionamento[:] = (indices_mongo.garantir_colecoes(db) + agregados.garantir_indices(db)
+                              + contadores.garantir_indices(db) + interlock.garantir_indices(db)
+                              + idempotencia.garantir_indices(db))
+    except Exception as e:
+        provisionamento[:] = [f"falhou: {e}"]
+    for d in registo_dispositivos:
+        for canal, (col, campo) in GRANDEZAS.items():
             try:
-                c.connect()
-                c.unit_id = MODBUS_UNIT_ID
-                c.write_register(REG_SAIDA_LUZ_VERDE, 0, slave=MODBUS_UNIT_ID)
-            finally:
-                c.close()
-        time.sleep(1)
+                cache.carregar((d.id, canal), col, campo, d.filtro_leituras())
+                if canal in RECENTE_CANAIS: recente.carregar((d.id, canal), col, campo, d.filtro_leituras())
+            except Exception:
+                pass   # Mongo indisponível → a cache é preenchida no primeiro pedido
+    for _, ctl in todos_controladores():
+        try:
+            ctl.carregar()
+        except Exception:
+            pass   # Mongo indisponível → automático fica desligado até novo iniciar
+
+async def arranque():
+    # pymongo é síncrono: corre fora do event loop
+    await asyncio.to_thread(preparar_mongo)
 
-@app.on_event("startup")
-def startup_monitor():
-    t = threading.Thread(target=monitorar_canal_4_em_background, daemon=True)
-    t.start()
+    loop = asyncio.get_running_loop()
+    difusor.ligar_loop(loop)
+    for disp_id, ctl in todos_controladores():
+        ctl.ligar_loop(loop)
+        e = cache.obter((disp_id, ctl.nome))
+        if e: ctl.amostra(e.valor, e.timestamp)
+
+    # quem subscreve o stream recebe logo o estado atual
+    for (disp_id, canal), e in cache.todos().items():
+        publicar("leitura", obter_dispositivo(disp_id),
+                 {"canal": canal, "timestamp": e.timestamp, "valor": e.valor}, chave=canal)
+    for d in registo_dispositivos:
+        for nome, estado in d.estado_reles.items():
+            publicar("reles", d, {"rele": nome, "estado": estado}, chave=nome)
+    for disp_id, ctl in todos_controladores():
+        publicar("controlo", obter_dispositivo(disp_id), ctl.estado(), chave=ctl.nome)
+
+    # cada dispositivo tem as suas tarefas (snapshot, fila, interlock): um FieldLogger
+    # offline não atrasa os outros
+    registo_dispositivos.iniciar()
+    for d in registo_dispositivos:
+        tarefas.append(loop.create_task(publicar_estado_tapete(d), name=f"stream-tapete-{d.id}"))
+
+async def encerramento():
+    for t in tarefas: t.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    tarefas.clear()
+    await registo_dispositivos.parar()
+    # drena os buffers da escrita diferida antes de sair; com o Mongo em baixo, o que
+    # sobrar fica na pasta de resgate (e é gravado no próximo arranque)
+    por_gravar = await asyncio.to_thread(escrita.parar)
+    for nome, n in por_gravar.items():
+        print(f"escrita diferida: {n} leituras de {nome} por gravar no Mongo "
+              f"(resgate em {ESCRITA_RESGATE})", file=sys.stderr)
 
 # --------------------------
 # Endpoint HTML
@@ -112,170 +471,631 @@ def pagina_html():
 # --------------------------
 # Logging Genérico
 # --------------------------
+def utc(ts: Optional[datetime]) -> datetime:
+    """Timestamp da leitura em UTC sem tzinfo (como o resto da base); agora se vier vazio."""
+    if ts is None: return datetime.utcnow()
+    if ts.tzinfo is not None: ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def gravar(col: Collection, canal: str, docs: list, campo: str = "valor"):
+    """
+    Insere os documentos (ou entrega-os à escrita diferida) e atualiza a cache.
+    Devolve os documentos gravados: os reenvios já recebidos (mesmo id_envio) ficam de fora.
+    """
+    docs, ids = envios.reservar(col.name, docs)
+    if not docs: return docs
+    # última leitura de cada dispositivo do lote (antes do insert, que acrescenta o _id)
+    ultimos = {}
+    for doc in docs:
+        disp_id = doc[indices_mongo.META]["dispositivo"]
+        u = ultimos.get(disp_id)
+        if u is None or doc["timestamp"] > u["timestamp"]: ultimos[disp_id] = doc
+    try:
+        if ESCRITA_DIFERIDA:
+            escrita.buffer(col).adicionar(docs)
+        elif len(docs) == 1:
+            col.insert_one(docs[0])
+        else:
+            col.insert_many(docs)
+    except Exception:
+        envios.libertar(ids)   # nada gravado: o reenvio do coletor tem de passar
+        raise
+    if canal in agregados.FONTES: agregacao.atualizar(canal, docs, campo)
+    if canal in contadores.TIPOS: contagem.registar(canal, docs)
+    recente.registar(canal, docs, campo)
+    for disp_id, ultimo in ultimos.items():
+        e = cache.atualizar((disp_id, canal), ultimo["timestamp"], ultimo[campo])
+        publicar("leitura", obter_dispositivo(disp_id),
+                 {"canal": canal, "timestamp": e.timestamp, "valor": e.valor}, chave=canal)
+        ctl = controladores[disp_id].get(canal)
+        if ctl: ctl.amostra(e.valor, e.timestamp)
+    return docs
+
+def confirmacao():
+    return Response(status_code=202 if ESCRITA_DIFERIDA else 204)
+
+def resposta_doc(msg: str, doc: dict):
+    if INGESTAO_RAPIDA: return confirmacao()
+    if "_id" not in doc: return {"msg": msg, "duplicado": True}   # reenvio já gravado
+    # cópia: o documento pode ainda estar no buffer da escrita diferida
+    return {"msg": msg, "dados": dict(doc, _id=str(doc["_id"]))}
+
+def resposta_lote(msg: str, docs: list, gravados: list):
+    if INGESTAO_RAPIDA: return confirmacao()
+    return {"msg": msg, "inseridos": len(gravados), "duplicados": len(docs) - len(gravados)}
+
+def com_compressao(doc, d):
+    # só as leituras comprimidas levam o campo (as restantes ficam como estavam)
+    if getattr(d, "compressao", None) is not None: doc["compressao"] = d.compressao.model_dump()
+    return doc
+
+def com_metadados(doc, d, sensor=None):
+    # linha + dispositivo (+ sensor) no subdocumento meta de todas as leituras: metaField das
+    # time-series, onde ficam os índices por linha e sensor (404 se o id não existir)
+    meta = obter_dispositivo(d.dispositivo).metadados()
+    if sensor is not None: meta["sensor"] = sensor
+    doc[indices_mongo.META] = meta
+    if d.id_envio is not None: doc[idempotencia.CAMPO] = d.id_envio   # retirado em gravar()
+    return doc
+
+def doc_status(d):
+    return com_metadados({"timestamp": utc(d.timestamp), "status": d.status}, d)
+
+def doc_sensor(d):
+    return com_metadados(com_compressao(
+        {"timestamp": utc(d.timestamp), "valor": d.valor}, d), d, d.sensor)
+
+def doc_velocidade(d):
+    doc = {"timestamp": utc(datetime.fromisoformat(d.timestamp)), "valor": d.valor}
+    # só as leituras do estimador por pulsos trazem a qualidade (as restantes ficam como estavam)
+    if d.confianca is not None: doc.update(jitter_ms=d.jitter_ms, confianca=d.confianca)
+    return com_metadados(com_compressao(doc, d), d)
+
+@app.exception_handler(BufferCheio)
+def buffer_cheio(_req, e: BufferCheio):
+    return JSONResponse({"error": str(e)}, 503)
+
 @app.post("/status_logger")
 def postar_status(d: StatusEntrada):
-    doc = {"timestamp": datetime.utcnow(), "status": d.status}
-    res = col_status.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return {"msg":"Status inserido","dados":doc}
+    doc = doc_status(d)
+    gravar(col_status, "status", [doc], campo="status")
+    return resposta_doc("Status inserido", doc)
 
 @app.post("/temperatura_logger")
 def postar_temp(d: TemperaturaEntrada):
-    doc = {"timestamp": datetime.utcnow(), "sensor":d.sensor, "valor":d.valor}
-    res = col_temp.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return {"msg":"Temperatura inserida","dados":doc}
+    doc = doc_sensor(d)
+    gravar(col_temp, "temperatura", [doc])
+    return resposta_doc("Temperatura inserida", doc)
 
 @app.post("/humidade_logger")
 def postar_hum(d: TemperaturaEntrada):
-    doc = {"timestamp": datetime.utcnow(), "sensor":d.sensor, "valor":d.valor}
-    res = col_hum.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return {"msg":"Humidade inserida","dados":doc}
+    doc = doc_sensor(d)
+    gravar(col_hum, "humidade", [doc])
+    return resposta_doc("Humidade inserida", doc)
 
 @app.post("/contador_unidades_logger")
 def postar_cnt_small(d: ContadorEntrada):
-    doc = {
-        "timestamp": datetime.utcnow(),
-        "sensor": d.sensor,
-        "valor": d.valor
-    }
-    res = col_cnt_s.insert_one(doc)
-    # converte o ObjectId em string
-    doc["_id"] = str(res.inserted_id)
-    return {"msg": "Contador pequenas inserido", "dados": doc}
+    doc = doc_sensor(d)
+    gravar(col_cnt_s, "contador_pequenas", [doc])
+    return resposta_doc("Contador pequenas inserido", doc)
 
 @app.post("/contador_unidades_logger_grandes")
 def postar_cnt_large(d: ContadorEntrada):
-    # monta o documento sem o _id
-    doc = {
-        "timestamp": datetime.utcnow(),
-        "sensor": d.sensor,
-        "valor": d.valor
-    }
-    # insere no MongoDB e obtém o ObjectId
-    res = col_cnt_l.insert_one(doc)
-    # converte o ObjectId em string antes de incluir no JSON de resposta
-    doc["_id"] = str(res.inserted_id)
-    return {"msg": "Contador grandes inserido", "dados": doc}
-
+    doc = doc_sensor(d)
+    gravar(col_cnt_l, "contador_grandes", [doc])
+    return resposta_doc("Contador grandes inserido", doc)
 
 @app.post("/velocidade_logger")
 def postar_vel(d: VelocidadeEntrada):
-    doc = {"timestamp": datetime.fromisoformat(d.timestamp), "valor":d.valor}
-    res = col_vel.insert_one(doc)
-    doc["_id"] = str(res.inserted_id)
-    return {"msg":"Velocidade inserida","dados":doc}
+    doc = doc_velocidade(d)
+    gravar(col_vel, "velocidade", [doc])
+    return resposta_doc("Velocidade inserida", doc)
+
+# --------------------------
+# Ingestão em Lote (arrays de leituras)
+# --------------------------
+@app.post("/status_logger/lote")
+def postar_status_lote(ds: List[StatusEntrada]):
+    docs = [doc_status(d) for d in ds]
+    gravados = gravar(col_status, "status", docs, campo="status")
+    return resposta_lote("Status inseridos", docs, gravados)
+
+@app.post("/temperatura_logger/lote")
+def postar_temp_lote(ds: List[TemperaturaEntrada]):
+    docs = [doc_sensor(d) for d in ds]
+    gravados = gravar(col_temp, "temperatura", docs)
+    return resposta_lote("Temperaturas inseridas", docs, gravados)
+
+@app.post("/humidade_logger/lote")
+def postar_hum_lote(ds: List[TemperaturaEntrada]):
+    docs = [doc_sensor(d) for d in ds]
+    gravados = gravar(col_hum, "humidade", docs)
+    return resposta_lote("Humidades inseridas", docs, gravados)
+
+@app.post("/contador_unidades_logger/lote")
+def postar_cnt_small_lote(ds: List[ContadorEntrada]):
+    docs = [doc_sensor(d) for d in ds]
+    gravados = gravar(col_cnt_s, "contador_pequenas", docs)
+    return resposta_lote("Contadores pequenas inseridos", docs, gravados)
+
+@app.post("/contador_unidades_logger_grandes/lote")
+def postar_cnt_large_lote(ds: List[ContadorEntrada]):
+    docs = [doc_sensor(d) for d in ds]
+    gravados = gravar(col_cnt_l, "contador_grandes", docs)
+    return resposta_lote("Contadores grandes inseridos", docs, gravados)
+
+@app.post("/velocidade_logger/lote")
+def postar_vel_lote(ds: List[VelocidadeEntrada]):
+    docs = [doc_velocidade(d) for d in ds]
+    gravados = gravar(col_vel, "velocidade", docs)
+    return resposta_lote("Velocidades inseridas", docs, gravados)
+
+@app.get("/admin/indices")
+def relatorio_indices():
+    return {
+        "timeseries_suportado": indices_mongo.suporta_timeseries(db),
+        "provisionamento": provisionamento,
+        "planos": indices_mongo.relatorio_planos(db),
+    }
+
+@app.get("/agregados/estado")
+def estado_agregados():
+    return agregacao.estado()
+
+@app.get("/escrita_diferida/estado")
+def estado_escrita_diferida():
+    return {"ativa": ESCRITA_DIFERIDA, "colecoes": escrita.estado()}
+
+@app.get("/ingestao/estado")
+def estado_ingestao():
+    # leituras reenviadas pelas filas dos coletores que já tinham sido gravadas
+    return envios.estado()
 
 # --------------------------
 # Últimas Leituras
 # --------------------------
+def resposta_ultima(canal:str, if_none_match:Optional[str], erro:str, id:Optional[str]):
+    d = obter_dispositivo(id)
+    e = cache.obter((d.id, canal))
+    if e is None:
+        # cache vazia (ex.: Mongo em baixo no arranque) → tenta carregar uma vez
+        col, campo = GRANDEZAS[canal]
+        e = cache.carregar((d.id, canal), col, campo, d.filtro_leituras())
+        if e is None: return JSONResponse({"error":erro},404)
+    headers = {"ETag": e.etag, "Cache-Control": "no-cache"}
+    if if_none_match == e.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=e.corpo, media_type="application/json", headers=headers)
+
+# cada rota existe também em /dispositivos/{dispositivo}/...; sem ele, dispositivo por omissão
 @app.get("/ultima_temperatura")
-def get_ultima_temp():
-    u = col_temp.find_one(sort=[("timestamp",-1)])
-    if not u: return JSONResponse({"error":"Sem temperatura"},404)
-    return {"timestamp":u["timestamp"],"valor":u["valor"]}
+@app.get("/dispositivos/{dispositivo}/ultima_temperatura")
+def get_ultima_temp(dispositivo: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    return resposta_ultima("temperatura", if_none_match, "Sem temperatura", dispositivo)
 
 @app.get("/ultima_humidade")
-def get_ultima_hum():
-    u = col_hum.find_one(sort=[("timestamp",-1)])
-    if not u: return JSONResponse({"error":"Sem humidade"},404)
-    return {"timestamp":u["timestamp"],"valor":u["valor"]}
+@app.get("/dispositivos/{dispositivo}/ultima_humidade")
+def get_ultima_hum(dispositivo: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    return resposta_ultima("humidade", if_none_match, "Sem humidade", dispositivo)
 
 @app.get("/ultima_velocidade")
-def get_ultima_vel():
-    u = col_vel.find_one(sort=[("timestamp",-1)])
-    if not u: return JSONResponse({"error":"Sem velocidade"},404)
-    return {"timestamp":u["timestamp"],"valor":u["valor"]}
+@app.get("/dispositivos/{dispositivo}/ultima_velocidade")
+def get_ultima_vel(dispositivo: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    return resposta_ultima("velocidade", if_none_match, "Sem velocidade", dispositivo)
 
 # --------------------------
-# Controle de Relés
+# Histórico (agregado por buckets ou bruto paginado)
+# --------------------------
+HISTORICO_JANELA = timedelta(hours=24)   # intervalo por omissão
+
+def intervalo(inicio: Optional[datetime], fim: Optional[datetime]):
+    fim = utc(fim)
+    return (utc(inicio) if inicio else fim - HISTORICO_JANELA), fim
+
+@app.exception_handler(ErroConsulta)
+def erro_consulta(_req, e: ErroConsulta):
+    return JSONResponse({"error": str(e)}, 400)
+
+def filtro_dispositivo(id: Optional[str]):
+    # sem dispositivo, o histórico junta todas as linhas
+    return obter_dispositivo(id).filtro() if id is not None else None
+
+@app.get("/historico/{grandeza}")
+@app.get("/dispositivos/{dispositivo}/historico/{grandeza}")
+def get_historico(grandeza:str, inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                  sensor: Optional[str] = None, bucket: Optional[float] = None,
+                  dispositivo: Optional[str] = None):
+    if grandeza not in GRANDEZAS:
+        return JSONResponse({"error":"Grandeza desconhecida"},404)
+    col, campo = GRANDEZAS[grandeza]
+    meta = filtro_dispositivo(dispositivo)
+    inicio, fim = intervalo(inicio, fim)
+    bucket = bucket or historico.bucket_automatico(inicio, fim)
+    # maior granularidade dos agregados que divide o bucket; senão, leituras brutas
+    # (os agregados têm linha/dispositivo: servem também com filtro de dispositivo)
+    gran = next((g for g, seg in sorted(agregados.GRANULARIDADES.items(), key=lambda x: -x[1])
+                 if grandeza in agregados.FONTES and bucket % seg == 0), None)
+    t0 = time.perf_counter()
+    if gran:
+        fonte = agregados.colecao(db, gran)
+        pontos = historico.agregar_rollups(fonte, grandeza, inicio, fim, bucket, sensor, meta)
+    else:
+        fonte = col
+        pontos = historico.agregar(col, campo, inicio, fim, bucket, sensor, meta)
+    return RespostaJSON({"grandeza": grandeza, "inicio": inicio, "fim": fim, "sensor": sensor,
+                         "dispositivo": dispositivo, "bucket_s": bucket, "fonte": fonte.name, "pontos": pontos,
+                         "duracao_ms": round((time.perf_counter() - t0) * 1000, 2)})
+
+@app.get("/recente")
+def estado_recente():
+    return recente.estado()
+
+@app.get("/recente/{grandeza}")
+@app.get("/dispositivos/{dispositivo}/recente/{grandeza}")
+def get_recente(grandeza:str, segundos: Optional[float] = None, pontos: Optional[int] = None,
+                dispositivo: Optional[str] = None):
+    # última hora em memória, em colunas (t em ms desde a época); pontos=N decima em N buckets
+    if grandeza not in RECENTE_CANAIS:
+        return JSONResponse({"error":"Grandeza sem histórico recente"},404)
+    if segundos is not None and not 0 < segundos <= recente.horizonte:
+        return JSONResponse({"error":f"segundos fora de ]0, {recente.horizonte}]"},400)
+    if pontos is not None and not 1 <= pontos <= historico_recente.MAX_PONTOS:
+        return JSONResponse({"error":f"pontos fora de [1, {historico_recente.MAX_PONTOS}]"},400)
+    d = obter_dispositivo(dispositivo)
+    t0 = time.perf_counter()
+    out = recente.consultar((d.id, grandeza), segundos, pontos)
+    return RespostaJSON({"grandeza": grandeza, "dispositivo": d.id, **out,
+                         "duracao_ms": round((time.perf_counter() - t0) * 1000, 3)})
+
+@app.get("/historico/{grandeza}/bruto")
+@app.get("/dispositivos/{dispositivo}/historico/{grandeza}/bruto")
+def get_historico_bruto(grandeza:str, inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                        sensor: Optional[str] = None, cursor: Optional[str] = None,
+                        limite: int = historico.LIMITE_PAGINA, formato: str = "json",
+                        dispositivo: Optional[str] = None):
+    if grandeza not in GRANDEZAS:
+        return JSONResponse({"error":"Grandeza desconhecida"},404)
+    col, campo = GRANDEZAS[grandeza]
+    meta = filtro_dispositivo(dispositivo)
+    inicio, fim = intervalo(inicio, fim)
+    if formato == "ndjson":
+        # intervalo inteiro, transmitido à medida que o cursor avança
+        return StreamingResponse(historico.ndjson(col, campo, inicio, fim, sensor, meta),
+                                 media_type="application/x-ndjson")
+    if formato != "json":
+        return JSONResponse({"error":"Formato inválido (json ou ndjson)"},400)
+    if not 1 <= limite <= historico.LIMITE_PAGINA:
+        return JSONResponse({"error":f"Limite fora de [1, {historico.LIMITE_PAGINA}]"},400)
+    return RespostaJSON(historico.pagina(col, campo, inicio, fim, sensor, cursor, limite, meta))
+
+@app.get("/historico/{grandeza}/reconstruido")
+@app.get("/dispositivos/{dispositivo}/historico/{grandeza}/reconstruido")
+def get_historico_reconstruido(grandeza:str, inicio: Optional[datetime] = None,
+                               fim: Optional[datetime] = None, sensor: Optional[str] = None,
+                               passo: float = 5.0, modo: str = "auto",
+                               dispositivo: Optional[str] = None):
+    # sinal em grelha regular a partir de leituras comprimidas (degraus ou linear)
+    if grandeza not in GRANDEZAS:
+        return JSONResponse({"error":"Grandeza desconhecida"},404)
+    col, campo = GRANDEZAS[grandeza]
+    meta = filtro_dispositivo(dispositivo)
+    inicio, fim = intervalo(inicio, fim)
+    modo, pontos = historico.reconstruir(col, campo, inicio, fim, passo, modo, sensor, meta)
+    return RespostaJSON({"grandeza": grandeza, "inicio": inicio, "fim": fim, "sensor": sensor,
+                         "dispositivo": dispositivo, "passo_s": passo, "modo": modo, "pontos": pontos})
+
+@app.get("/exportar/{grandeza}")
+@app.get("/dispositivos/{dispositivo}/exportar/{grandeza}")
+def get_exportar(grandeza:str, formato: str = "csv", inicio: Optional[datetime] = None,
+                 fim: Optional[datetime] = None, sensor: Optional[str] = None, gzip: bool = False,
+                 dispositivo: Optional[str] = None):
+    # intervalo inteiro em CSV/Parquet, lido e enviado por lotes (memória constante);
+    # o gerador é síncrono, por isso corre na threadpool e não atrasa a ingestão
+    if grandeza not in GRANDEZAS:
+        return JSONResponse({"error":"Grandeza desconhecida"},404)
+    col, campo = GRANDEZAS[grandeza]
+    meta = filtro_dispositivo(dispositivo)
+    inicio, fim = intervalo(inicio, fim)
+    try:
+        partes = exportacao.exportar(col, campo, formato, inicio, fim, sensor, meta, gzip)
+    except exportacao.ParquetIndisponivel as e:
+        return JSONResponse({"error":str(e)},501)
+    nome = exportacao.nome_ficheiro(grandeza, formato, inicio, fim, dispositivo)
+    headers = {"Content-Disposition": f'attachment; filename="{nome}"'}
+    if gzip: headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(partes, media_type=exportacao.FORMATOS[formato], headers=headers)
+
+# --------------------------
+# Contadores de produção (totais por hora / turno, sem varrer as leituras)
+# --------------------------
+def filtro_contadores(dispositivo: Optional[str], todos: bool):
+    # como os relés: sem dispositivo, o dispositivo por omissão; todos=true soma as linhas
+    return None if todos and dispositivo is None else obter_dispositivo(dispositivo).filtro()
+
+@app.get("/contadores")
+@app.get("/dispositivos/{dispositivo}/contadores")
+def get_contadores(dispositivo: Optional[str] = None, todos: bool = False):
+    return RespostaJSON(contagem.atual(meta=filtro_contadores(dispositivo, todos)))
+
+@app.get("/contadores/sequencia")
+@app.get("/dispositivos/{dispositivo}/contadores/sequencia")
+def get_sequencia_contadores(dispositivo: Optional[str] = None):
+    # os coletores de cada dispositivo retomam a numeração a partir daqui quando reiniciam
+    return contagem.sequencia(obter_dispositivo(dispositivo).filtro())
+
+@app.get("/contadores/estado")
+def estado_contadores():
+    return contagem.estado()
+
+@app.get("/contadores/{periodo}")
+@app.get("/dispositivos/{dispositivo}/contadores/{periodo}")
+def get_contadores_periodo(periodo: str, inicio: Optional[datetime] = None,
+                           fim: Optional[datetime] = None, tipo: Optional[str] = None,
+                           dispositivo: Optional[str] = None, todos: bool = False):
+    if periodo not in contadores.PERIODOS:
+        return JSONResponse({"error":"Período desconhecido (hora ou turno)"},404)
+    meta = filtro_contadores(dispositivo, todos)
+    inicio, fim = intervalo(inicio, fim)
+    return RespostaJSON({"periodo": periodo, "inicio": inicio, "fim": fim,
+                         "dados": contagem.periodos(periodo, inicio, fim, tipo, meta)})
+
+# --------------------------
+# Controle de Relés (por dispositivo)
 # --------------------------
 RELAY1=8; RELAY2=9
-def controlar_rele_generico(state:str, addr:int, nome:str):
+def erro_escrita(e: ErroModbus):
+    # 409: a saída tem uma escrita de segurança à espera (ex.: disparo do interlock);
+    # 504: a fila de comandos não respondeu a tempo
+    codigo = 409 if isinstance(e, ComandoRejeitado) else 504 if isinstance(e, ComandoExpirado) else 500
+    return JSONResponse({"error":str(e)}, codigo)
+
+async def registar_estado_rele(d, rele:str, state:str):
+    d.estado_reles[rele] = state
+    publicar("reles", d, {"rele": rele, "estado": state}, chave=rele)
+    await avaliar_alarme(d)
+
+async def avaliar_alarme(d):
+    # a luz de alerta pisca enquanto algum relé do dispositivo estiver ligado
+    if any(v == "on" for v in d.estado_reles.values()):
+        if not d.pisca.ativo: await d.pisca.iniciar()
+    elif d.pisca.ativo:
+        await d.pisca.parar()
+
+async def comandar_ventilador(d, state:str):
+    res = await d.comandos.escrever_coil(RELAY1, state=="on", CONTROLO)
+    await registar_estado_rele(d, "ventilador", state)
+    return res
+
+async def comandar_humidificador(d, state:str):
+    # o humidificador alterna com pulsos: 1 pulso liga, 2 pulsos desligam; a fila não os
+    # repete se já estiver em `state` e, nas pausas, deixa passar as escritas dos outros relés
+    pulses = 1 if state=="on" else 2
+    res = await d.comandos.sequencia("humidificador", state,
+                                     [("coil", RELAY2, 1, 0.1), ("coil", RELAY2, 0, 0.1)] * pulses,
+                                     CONTROLO)
+    await registar_estado_rele(d, "humidificador", state)
+    return res
+
+async def controlar_rele_generico(d, state:str, addr:int, nome:str):
     if state not in ("on","off"):
         return JSONResponse({"error":"Estado inválido"},400)
-    client = ModbusTcpClient(FIELDLOGGER_IP,port=FIELDLOGGER_PORT)
     try:
-        if not client.connect(): raise Exception("Falha conexão Modbus")
-        client.unit_id = MODBUS_UNIT_ID
         val = True if state=="on" else False
-        rsp = client.write_coil(addr,val)
-        if rsp.isError(): raise Exception("Erro coil Modbus")
-        return {"status":f"{nome} {'ligado' if val else 'desligado'} com sucesso"}
-    except Exception as e:
-        return JSONResponse({"error":str(e)},500)
-    finally:
-        client.close()
+        res = await d.comandos.escrever_coil(addr, val, CONTROLO)
+        await registar_estado_rele(d, nome.lower(), state)
+        return {"status":f"{nome} {'ligado' if val else 'desligado'} com sucesso",
+                "comando": res.estado, "latencia_ms": res.latencia_ms}
+    except ErroModbus as e:
+        return erro_escrita(e)
 
 @app.post("/relay_temp/{state}")
-def relay_temp(state:str):
-    return controlar_rele_generico(state, RELAY1, "Ventilador")
+@app.post("/dispositivos/{dispositivo}/relay_temp/{state}")
+async def relay_temp(state:str, dispositivo: Optional[str] = None):
+    return await controlar_rele_generico(obter_dispositivo(dispositivo), state, RELAY1, "Ventilador")
 
 @app.post("/relay_hum/{state}")
-def relay_hum(state:str):
+@app.post("/dispositivos/{dispositivo}/relay_hum/{state}")
+async def relay_hum(state:str, dispositivo: Optional[str] = None):
+    d = obter_dispositivo(dispositivo)
     if state not in ("on","off"):
         return JSONResponse({"error":"Estado inválido"},400)
-    client = ModbusTcpClient(FIELDLOGGER_IP,port=FIELDLOGGER_PORT)
     try:
-        if not client.connect(): raise Exception("Falha conexão Modbus")
-        client.unit_id = MODBUS_UNIT_ID
-        pulses = 1 if state=="on" else 2
-        for _ in range(pulses):
-            client.write_coil(RELAY2,True); time.sleep(0.1)
-            client.write_coil(RELAY2,False); time.sleep(0.1)
-        return {"status":f"Humidificador {'ligado' if state=='on' else 'desligado'} com sucesso"}
-    except Exception as e:
-        return JSONResponse({"error":str(e)},500)
-    finally:
-        client.close()
+        res = await comandar_humidificador(d, state)
+        return {"status":f"Humidificador {'ligado' if state=='on' else 'desligado'} com sucesso",
+                "comando": res.estado, "latencia_ms": res.latencia_ms}
+    except ErroModbus as e:
+        return erro_escrita(e)
 
 @app.post("/escrever_registro/{endereco}/{valor}")
-def escrever_registro(endereco:int, valor:int):
-    client=ModbusTcpClient(FIELDLOGGER_IP,port=FIELDLOGGER_PORT)
+@app.post("/dispositivos/{dispositivo}/escrever_registro/{endereco}/{valor}")
+async def escrever_registro(endereco:int, valor:int, dispositivo: Optional[str] = None):
+    d = obter_dispositivo(dispositivo)
+    # holding registers: endereço e valor de 16 bits sem sinal
+    if not 0 <= endereco <= 0xFFFF:
+        return JSONResponse({"error":"Endereço fora de [0, 65535]"},400)
+    if not 0 <= valor <= 0xFFFF:
+        return JSONResponse({"error":"Valor fora de [0, 65535]"},400)
     try:
-        if not client.connect(): raise Exception("Falha conexão Modbus")
-        client.unit_id = MODBUS_UNIT_ID
-        rsp = client.write_register(endereco,valor)
-        if rsp.isError(): raise Exception("Erro register Modbus")
-        return {"status":f"Registrador {endereco} atualizado para {valor}"}
-    except Exception as e:
-        return JSONResponse({"error":str(e)},500)
-    finally:
-        client.close()
+        res = await d.comandos.escrever_registo(endereco, valor, CONTROLO)
+        return {"status":f"Registrador {endereco} atualizado para {valor}",
+                "comando": res.estado, "latencia_ms": res.latencia_ms}
+    except ErroModbus as e:
+        return erro_escrita(e)
+
+# --------------------------
+# Controlo Automático (histerese)
+# --------------------------
+@app.post("/controlo/{grandeza}/iniciar")
+@app.post("/dispositivos/{dispositivo}/controlo/{grandeza}/iniciar")
+def controlo_iniciar(grandeza:str, lim: LimitesControlo, dispositivo: Optional[str] = None):
+    ctl = controladores[obter_dispositivo(dispositivo).id].get(grandeza)
+    if ctl is None: return JSONResponse({"error":"Grandeza inválida"},404)
+    try:
+        ctl.iniciar(lim.minimo, lim.maximo)
+    except ValueError as e:
+        return JSONResponse({"error":str(e)},400)
+    return ctl.estado()
+
+@app.post("/controlo/{grandeza}/parar")
+@app.post("/dispositivos/{dispositivo}/controlo/{grandeza}/parar")
+def controlo_parar(grandeza:str, dispositivo: Optional[str] = None):
+    ctl = controladores[obter_dispositivo(dispositivo).id].get(grandeza)
+    if ctl is None: return JSONResponse({"error":"Grandeza inválida"},404)
+    ctl.parar()
+    return ctl.estado()
+
+@app.get("/controlo/estado")
+@app.get("/dispositivos/{dispositivo}/controlo/estado")
+def controlo_estado(dispositivo: Optional[str] = None):
+    ctls = controladores[obter_dispositivo(dispositivo).id]
+    return {nome: ctl.estado() for nome, ctl in ctls.items()}
+
+# --------------------------
+# Luz de Alerta (pisca)
+# --------------------------
+@app.post("/alarme/iniciar")
+@app.post("/dispositivos/{dispositivo}/alarme/iniciar")
+async def alarme_iniciar(cfg: Optional[PiscaConfig] = None, dispositivo: Optional[str] = None):
+    pisca = obter_dispositivo(dispositivo).pisca
+    cfg = cfg or PiscaConfig()
+    try:
+        await pisca.iniciar(cfg.padrao, cfg.periodo)
+    except ValueError as e:
+        return JSONResponse({"error":str(e)},400)
+    return pisca.estado()
+
+@app.post("/alarme/parar")
+@app.post("/dispositivos/{dispositivo}/alarme/parar")
+async def alarme_parar(dispositivo: Optional[str] = None):
+    pisca = obter_dispositivo(dispositivo).pisca
+    await pisca.parar()
+    return pisca.estado()
+
+@app.get("/alarme/estado")
+@app.get("/dispositivos/{dispositivo}/alarme/estado")
+def alarme_estado(dispositivo: Optional[str] = None):
+    return obter_dispositivo(dispositivo).pisca.estado()
 
 # --------------------------
 # Tapete / Luz Verde
 # --------------------------
 @app.get("/luz_verde/status")
-def status_luz_verde():
-    v = ler_registro_modbus(REG_SAIDA_LUZ_VERDE)
+@app.get("/dispositivos/{dispositivo}/luz_verde/status")
+async def status_luz_verde(dispositivo: Optional[str] = None):
+    v = await ler_registro_modbus(obter_dispositivo(dispositivo), REG_SAIDA_LUZ_VERDE)
     if v is None:
         return JSONResponse({"error":"Não consegui ler estado"},500)
     return {"estado":"on" if v==1 else "off"}
 
 @app.post("/luz_verde/{estado}")
-def api_luz_verde(estado:str):
+@app.post("/dispositivos/{dispositivo}/luz_verde/{estado}")
+async def api_luz_verde(estado:str, dispositivo: Optional[str] = None):
+    d = obter_dispositivo(dispositivo)
+    modbus = d.modbus
     if estado not in ("on","off"):
         return JSONResponse({"error":"use 'on' ou 'off'"},400)
 
-    # só permite ligar se Canal4=1 e Canal8=0
-    if estado=="on":
-        if ler_registro_modbus(REG_ENTRADA_CANAL_4)!=1:
-            return JSONResponse({"error":"Segurança ativa, não posso ligar"},400)
-        if ler_registro_modbus(REG_ENTRADA_CANAL_8)!=0:
-            return JSONResponse({"error":"Modo manual ativo, não posso ligar"},400)
-
-    # efetua escrita
-    c = ModbusTcpClient(FIELDLOGGER_IP,port=FIELDLOGGER_PORT)
     try:
-        c.connect()
-        c.unit_id = MODBUS_UNIT_ID
+        # só permite ligar se Canal4=1 e Canal8=0 (ambos lidos numa só transação)
+        if estado=="on":
+            regs = await modbus.ler_registos(REG_ENTRADA_CANAL_4,
+                                       REG_ENTRADA_CANAL_8 - REG_ENTRADA_CANAL_4 + 1)
+            if regs[0]!=1:
+                return JSONResponse({"error":"Segurança ativa, não posso ligar"},400)
+            if regs[REG_ENTRADA_CANAL_8 - REG_ENTRADA_CANAL_4]!=0:
+                return JSONResponse({"error":"Modo manual ativo, não posso ligar"},400)
+
+        # efetua escrita
         val = 1 if estado=="on" else 0
-        rsp = c.write_register(REG_SAIDA_LUZ_VERDE, val, slave=MODBUS_UNIT_ID)
-        if rsp.isError():
-            raise Exception("Erro ao escrever luz verde")
-    finally:
-        c.close()
+        res = await d.comandos.escrever_registo(REG_SAIDA_LUZ_VERDE, val, CONTROLO)
+    except ErroModbus as e:
+        return erro_escrita(e)
+
+    return {"status":f"Tapete {'ligado' if estado=='on' else 'desligado'} com sucesso",
+            "comando": res.estado, "latencia_ms": res.latencia_ms}
+
+
+@app.get("/interlock/estado")
+@app.get("/dispositivos/{dispositivo}/interlock/estado")
+def estado_interlock(dispositivo: Optional[str] = None):
+    return obter_dispositivo(dispositivo).interlock.estado()
+
+@app.get("/interlock/disparos")
+@app.get("/dispositivos/{dispositivo}/interlock/disparos")
+def get_disparos(dispositivo: Optional[str] = None, inicio: Optional[datetime] = None,
+                 fim: Optional[datetime] = None, limite: int = 100):
+    # auditoria: disparos mais recentes primeiro (sem dispositivo, todas as linhas)
+    if not 1 <= limite <= 1000:
+        return JSONResponse({"error":"limite fora de [1, 1000]"},400)
+    q = {} if dispositivo is None else obter_dispositivo(dispositivo).metadados()
+    if inicio or fim:
+        q["timestamp"] = {k: utc(v) for k, v in (("$gte", inicio), ("$lt", fim)) if v}
+    docs = list(col_interlock.find(q, {"_id": 0}).sort("timestamp", -1).limit(limite))
+    return RespostaJSON({"disparos": docs})
+
+# --------------------------
+# Dispositivos e Diagnóstico Modbus
+# --------------------------
+@app.get("/dispositivos")
+def get_dispositivos():
+    return registo_dispositivos.estado()
+
+@app.get("/dispositivos/{dispositivo}")
+def get_dispositivo(dispositivo: str):
+    d = obter_dispositivo(dispositivo)
+    snap = d.snapshot.atual
+    return {**d.resumo(), "modbus": d.modbus.estatisticas(),
+            "snapshot_idade_s": round(snap.idade(), 3) if snap else None,
+            "ciclos_falhados": d.snapshot.ciclos_falhados,
+            "comandos": d.comandos.estado(), "interlock": d.interlock.estado()}
 
-    return {"status":f"Tapete {'ligado' if estado=='on' else 'desligado'} com sucesso"}
+@app.get("/modbus/estado")
+@app.get("/dispositivos/{dispositivo}/modbus/estado")
+def estado_modbus(dispositivo: Optional[str] = None):
+    return obter_dispositivo(dispositivo).modbus.estatisticas()
+
+@app.get("/modbus/comandos")
+@app.get("/dispositivos/{dispositivo}/modbus/comandos")
+def estado_comandos(dispositivo: Optional[str] = None):
+    return obter_dispositivo(dispositivo).comandos.estado()
+
+@app.get("/modbus/snapshot")
+@app.get("/dispositivos/{dispositivo}/modbus/snapshot")
+def get_snapshot(dispositivo: Optional[str] = None):
+    snap = obter_dispositivo(dispositivo).snapshot.atual
+    if snap is None:
+        return JSONResponse({"error":"Sem snapshot disponível"},503)
+    return {
+        "versao": snap.versao,
+        "timestamp": snap.timestamp,
+        "idade_s": round(snap.idade(), 3),
+        "duracao_ms": snap.duracao_ms,
+        "completo": snap.completo,
+        "registos": {str(k): v for k, v in snap.registos.items()},
+    }
+
+# --------------------------
+# Stream em Tempo Real (SSE)
+# --------------------------
+@app.get("/stream")
+@app.get("/dispositivos/{dispositivo}/stream")
+async def stream_eventos(dispositivo: Optional[str] = None, todos: bool = False):
+    # um stream por dispositivo (por omissão, o dispositivo por omissão): leituras, tapete,
+    # relés e interlock; todos=true junta os eventos de todas as linhas
+    d = None if todos else obter_dispositivo(dispositivo)
+    return StreamingResponse(
+        difusor.subscrever(d.id if d else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/stream/estado")
+def estado_stream():
+    return difusor.estado()
+
+# --------------------------
+# Métricas (Prometheus)
+# --------------------------
+@app.get("/metrics")
+def get_metrics():
+    return Response(registo_metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
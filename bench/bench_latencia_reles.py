@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência dos endpoints de relés e estado sob concorrência.
+
+Dispara N pedidos concorrentes (mistura de comandos de relé e leituras de
+estado) contra uma API em execução e mede a latência de cada rota.
+Serve para comparar duas versões da API (ex.: antes/depois do Modbus
+assíncrono) nas mesmas condições:
+
+    python bench/bench_latencia_reles.py --url http://127.0.0.1:8000 --rotulo antes
+    python bench/bench_latencia_reles.py --url http://127.0.0.1:8000 --rotulo depois
+    python bench/bench_latencia_reles.py --comparar bench_latencia_antes.json bench_latencia_depois.json
+
+Atenção: os comandos atuam nos relés reais se a API estiver ligada ao FieldLogger.
+"""
+import argparse, asyncio, json, random, time
+from datetime import datetime
+
+import httpx
+
+# (método, rota, peso na mistura)
+MISTURA = [
+    ("GET",  "/luz_verde/status",       4),
+    ("GET",  "/modbus/estado",          2),
+    ("POST", "/relay_temp/{estado}",    2),
+    ("POST", "/relay_hum/{estado}",     1),
+]
+
+
+def percentil(valores, p):
+    if not valores: return None
+    v = sorted(valores)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+
+def resumo(lat):
+    return {
+        "n": len(lat),
+        "p50_ms": round(percentil(lat, 50), 2),
+        "p95_ms": round(percentil(lat, 95), 2),
+        "p99_ms": round(percentil(lat, 99), 2),
+        "max_ms": round(max(lat), 2),
+    }
+
+
+async def correr(url, pedidos, concorrencia, semente):
+    rnd = random.Random(semente)
+    rotas = [(m, r) for m, r, peso in MISTURA for _ in range(peso)]
+    plano = [rnd.choice(rotas) for _ in range(pedidos)]
+    lat, erros = {}, {}
+    sem = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(base_url=url, timeout=30) as cli:
+        async def um(metodo, rota):
+            caminho = rota.format(estado=rnd.choice(("on", "off")))
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await cli.request(metodo, caminho)
+                    ok = r.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                dt = (time.perf_counter() - t0) * 1000
+            lat.setdefault(rota, []).append(dt)
+            if not ok: erros[rota] = erros.get(rota, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(um(m, r) for m, r in plano))
+        total = time.perf_counter() - t0
+
+    todas = [x for v in lat.values() for x in v]
+    return {
+        "total": resumo(todas),
+        "rotas": {r: resumo(v) for r, v in lat.items()},
+        "erros": erros,
+        "duracao_s": round(total, 3),
+        "pedidos_s": round(len(todas) / total, 1),
+    }
+
+
+def comparar(a, b):
+    ra, rb = json.load(open(a)), json.load(open(b))
+    print(f"{'rota':28} {'métrica':8} {ra['rotulo']:>10} {rb['rotulo']:>10}")
+    for rota in ["total"] + sorted(ra["resultado"]["rotas"]):
+        ma = ra["resultado"]["total"] if rota == "total" else ra["resultado"]["rotas"].get(rota)
+        mb = rb["resultado"]["total"] if rota == "total" else rb["resultado"]["rotas"].get(rota)
+        if not ma or not mb: continue
+        for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms"):
+            print(f"{rota:28} {k:8} {ma[k]:>10} {mb[k]:>10}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Latência de relés/estado sob concorrência")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--pedidos", type=int, default=400)
+    ap.add_argument("--concorrencia", type=int, default=100)
+    ap.add_argument("--semente", type=int, default=1)
+    ap.add_argument("--rotulo", default="atual", help="ex.: antes / depois")
+    ap.add_argument("--saida", help="ficheiro JSON (por omissão bench_latencia_<rotulo>.json)")
+    ap.add_argument("--comparar", nargs=2, metavar=("A", "B"),
+                    help="compara dois resultados JSON já gravados")
+    args = ap.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    else:
+        res = asyncio.run(correr(args.url, args.pedidos, args.concorrencia, args.semente))
+        saida = args.saida or f"bench_latencia_{args.rotulo}.json"
+        with open(saida, "w") as f:
+            json.dump({"rotulo": args.rotulo, "url": args.url, "data": datetime.utcnow().isoformat(),
+                       "pedidos": args.pedidos, "concorrencia": args.concorrencia,
+                       "resultado": res}, f, indent=2, ensure_ascii=False)
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+        print("gravado em", saida)
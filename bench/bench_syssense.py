@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Benchmark reprodutível da API e do motor de contagem contra um FieldLogger simulado.
+
+Arranca no mesmo processo o simulador Modbus (bench/simulador_fieldlogger.py)
+e a API (uvicorn, porta local) apontada para ele, com um MongoDB local ou
+com o mongomock em memória, e corre os cenários:
+    ingestao   amostras/s e latência em POST unitário e em /lote
+    difusao    latência de entrega de uma leitura a N clientes de /stream
+    reles      latência de comandos de relé/estado sob concorrência
+    contagem   exatidão do MotorContagem face aos pulsos gerados
+    cpu        CPU da API por amostra ingerida (resposta completa vs. ingestão rápida),
+               com a API num processo próprio e lida em /metrics (com o mongomock,
+               o CPU do próprio mongomock entra na medida: usar --mongo para valores reais)
+    dispositivos  ciclos de snapshot/s e latência de relés por FieldLogger, com
+               --dispositivos simuladores e --offline FieldLoggers sem resposta
+
+    python bench/bench_syssense.py --rotulo antes
+    python bench/bench_syssense.py --rotulo depois --mongo mongodb://localhost:27017/ --latencia-ms 5
+    python bench/bench_syssense.py --comparar bench_syssense_antes.json bench_syssense_depois.json
+    python bench/bench_syssense.py --cenarios dispositivos --dispositivos 20 --offline 2
+
+Os resultados são gravados em JSON (um ficheiro por execução) para comparação.
+"""
+import argparse, asyncio, json, os, random, socket, subprocess, sys, tempfile, threading, time
+from datetime import datetime
+
+import httpx
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(AQUI), os.path.join(os.path.dirname(AQUI), "windows_services")]
+
+from bench_latencia_reles import correr as correr_reles, resumo
+from simulador_fieldlogger import SimuladorFieldLogger, TremPulsos
+
+CENARIOS = ("ingestao", "difusao", "reles", "contagem", "cpu", "dispositivos")
+
+
+# --------------------------
+# Ambiente: MongoDB e API
+# --------------------------
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def usar_mongomock():
+    """Substitui o MongoClient pelo mongomock (tem de ser chamado antes de importar a API)."""
+    import mongomock, pymongo
+    from pymongo import InsertOne, ReplaceOne, UpdateOne
+
+    # o mongomock não aceita as operações de bulk_write das versões recentes do pymongo
+    def bulk_write(self, ops, ordered=True, **kw):
+        for o in ops:
+            if isinstance(o, UpdateOne):    self.update_one(o._filter, o._doc, upsert=o._upsert)
+            elif isinstance(o, ReplaceOne): self.replace_one(o._filter, o._doc, upsert=o._upsert)
+            elif isinstance(o, InsertOne):  self.insert_one(o._doc)
+    mongomock.collection.Collection.bulk_write = bulk_write
+    pymongo.MongoClient = lambda *a, **kw: mongomock.MongoClient()
+
+def iniciar_api(porta):
+    import uvicorn, api_logger
+    servidor = uvicorn.Server(uvicorn.Config(api_logger.app, host="127.0.0.1", port=porta,
+                                             log_level="warning"))
+    threading.Thread(target=servidor.run, name="api", daemon=True).start()
+    limite = time.monotonic() + 15
+    while not servidor.started:
+        if time.monotonic() > limite:
+            raise RuntimeError("A API não arrancou")
+        time.sleep(0.05)
+    return servidor
+
+def servir(porta, mongo):
+    """Só a API, num processo próprio (cenário cpu); o ambiente vem do processo pai."""
+    if mongo == "mongomock":
+        usar_mongomock()
+    import uvicorn, api_logger
+    uvicorn.run(api_logger.app, host="127.0.0.1", port=porta, log_level="warning")
+
+
+# --------------------------
+# Cenários
+# --------------------------
+def amostra(i):
+    return {"sensor": "bench", "valor": 20 + (i % 100) / 10}
+
+async def cenario_ingestao(url, amostras, lote, concorrencia):
+    sem = asyncio.Semaphore(concorrencia)
+
+    async def fase(cli, caminho, corpos):
+        lat, erros = [], 0
+        async def um(corpo):
+            nonlocal erros
+            async with sem:
+                t0 = time.perf_counter()
+                r = await cli.post(caminho, json=corpo)
+                lat.append((time.perf_counter() - t0) * 1000)
+                if r.status_code >= 300: erros += 1
+        t0 = time.perf_counter()
+        await asyncio.gather(*(um(c) for c in corpos))
+        return lat, erros, time.perf_counter() - t0
+
+    res = {}
+    async with httpx.AsyncClient(base_url=url, timeout=30) as cli:
+        lat, erros, dur = await fase(cli, "/temperatura_logger", [amostra(i) for i in range(amostras)])
+        res["unitario"] = {**resumo(lat), "erros": erros, "amostras_s": round(amostras / dur, 1)}
+        corpos = [[amostra(i) for i in range(k, min(k + lote, amostras))] for k in range(0, amostras, lote)]
+        lat, erros, dur = await fase(cli, "/temperatura_logger/lote", corpos)
+        res["lote"] = {**resumo(lat), "erros": erros, "tamanho": lote,
+                       "amostras_s": round(amostras / dur, 1)}
+    return res
+
+
+async def cenario_difusao(url, clientes, eventos, intervalo):
+    enviados, recebidos = {}, [dict() for _ in range(clientes)]
+    prontos = asyncio.Event()
+    ligados = 0
+
+    async def cliente(i, cli):
+        nonlocal ligados
+        async with cli.stream("GET", "/stream") as r:
+            ligados += 1
+            if ligados == clientes: prontos.set()
+            tipo = None
+            async for linha in r.aiter_lines():
+                if linha.startswith("event: "):
+                    tipo = linha[7:]
+                elif linha.startswith("data: ") and tipo == "leitura":
+                    d = json.loads(linha[6:])
+                    if d.get("canal") == "humidade" and d["valor"] in enviados:
+                        recebidos[i][d["valor"]] = time.perf_counter()
+
+    limites = httpx.Limits(max_connections=clientes + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limites) as cli:
+        tarefas = [asyncio.create_task(cliente(i, cli)) for i in range(clientes)]
+        await asyncio.wait_for(prontos.wait(), 10)
+        await asyncio.sleep(0.2)
+        for n in range(eventos):
+            valor = 1000.0 + n            # valores únicos para casar envio e receção
+            enviados[valor] = time.perf_counter()
+            await cli.post("/humidade_logger", json={"sensor": "bench", "valor": valor})
+            await asyncio.sleep(intervalo)
+        await asyncio.sleep(1.0)
+        for t in tarefas: t.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    lat = [(t - enviados[v]) * 1000 for rec in recebidos for v, t in rec.items()]
+    esperados = clientes * eventos
+    return {**(resumo(lat) if lat else {}), "clientes": clientes, "eventos": eventos,
+            "entregues": len(lat), "perdidos": esperados - len(lat)}
+
+
+def cenario_contagem(sim, porta, duracao, periodo):
+    from motor_contagem import MotorContagem
+    motor = MotorContagem("127.0.0.1", porta, periodo=periodo)
+    sim.pecas.reiniciar_contagem()
+    parar = threading.Event()
+    t = threading.Thread(target=motor.correr, args=(parar,), daemon=True)
+    t.start()
+    time.sleep(duracao)
+    parar.set()
+    t.join()
+    sim.pecas.estado()
+    gerados = dict(sim.pecas.gerados)
+    contados = {"pequena": motor.contador_pequenas, "grande": motor.contador_grandes}
+    total = sum(gerados.values())
+    erro = sum(abs(contados[k] - gerados[k]) for k in gerados)
+    e = motor.estatisticas()
+    return {
+        "gerados": gerados, "contados": contados,
+        # o pulso em curso no fim da janela pode ficar por contar (±1)
+        "erro_absoluto": erro,
+        "exatidao": round(1 - erro / total, 4) if total else None,
+        **{k: e[k] for k in ("taxa_hz", "periodo_medio_ms", "jitter_ms", "intervalo_max_ms",
+                             "falhas", "lacunas_suspeitas", "pulsos_curtos", "grandes_sem_pequena")},
+    }
+
+
+async def cpu_api(cli):
+    r = await cli.get("/metrics")
+    for linha in r.text.splitlines():
+        if linha.startswith("process_cpu_seconds_total "):
+            return float(linha.split()[1])
+    raise RuntimeError("A API não exporta process_cpu_seconds_total")
+
+async def medir_cpu(url, amostras, lote):
+    res = {}
+    async with httpx.AsyncClient(base_url=url, timeout=30) as cli:
+        for i in range(50): await cli.post("/temperatura_logger", json=amostra(i))   # aquecimento
+        # consumo em repouso (snapshot Modbus, monitor, ...) a descontar de cada fase
+        c0, t0 = await cpu_api(cli), time.perf_counter()
+        await asyncio.sleep(2)
+        repouso = (await cpu_api(cli) - c0) / (time.perf_counter() - t0)
+        res["repouso_cpu_pct"] = round(repouso * 100, 2)
+        fases = (("unitario", "/temperatura_logger", [amostra(i) for i in range(amostras)]),
+                 ("lote", "/temperatura_logger/lote",
+                  [[amostra(i) for i in range(k, min(k + lote, amostras))] for k in range(0, amostras, lote)]))
+        for fase, caminho, corpos in fases:
+            c0, t0 = await cpu_api(cli), time.perf_counter()
+            for corpo in corpos:   # sequencial: mede CPU, não concorrência
+                r = await cli.post(caminho, json=corpo)
+            dt = time.perf_counter() - t0
+            cpu = await cpu_api(cli) - c0 - repouso * dt
+            res[fase] = {"amostras": amostras, "estado_http": r.status_code,
+                         "cpu_us_por_amostra": round(cpu / amostras * 1e6, 1),
+                         "amostras_s": round(amostras / dt, 1)}
+    return res
+
+def cenario_cpu(amostras, lote, mongo):
+    res = {}
+    for modo, rapida in (("completa", "0"), ("rapida", "1")):
+        porta = porta_livre()
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--servir", str(porta),
+                                 "--mongo", mongo], env=dict(os.environ, SYSSENSE_INGESTAO_RAPIDA=rapida))
+        try:
+            url, limite = f"http://127.0.0.1:{porta}", time.monotonic() + 20
+            while True:
+                try:
+                    if httpx.get(url + "/metrics").status_code == 200: break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > limite: raise RuntimeError("A API não arrancou")
+                time.sleep(0.1)
+            res[modo] = asyncio.run(medir_cpu(url, amostras, lote))
+        finally:
+            proc.terminate()
+            proc.wait()
+    return res
+
+
+async def cenario_dispositivos(url, janela, pedidos):
+    async with httpx.AsyncClient(base_url=url, timeout=30) as cli:
+        ids = [d["id"] for d in (await cli.get("/dispositivos")).json()["dispositivos"]]
+
+        async def versoes():
+            rs = await asyncio.gather(*(cli.get(f"/dispositivos/{i}/modbus/snapshot") for i in ids))
+            return {i: r.json()["versao"] if r.status_code == 200 else 0 for i, r in zip(ids, rs)}
+
+        await asyncio.sleep(2)   # arranque desfasado dos ciclos e ligações
+        v0, t0 = await versoes(), time.perf_counter()
+        await asyncio.sleep(janela)
+        v1, dt = await versoes(), time.perf_counter() - t0
+        ciclos = {i: round((v1[i] - v0[i]) / dt, 2) for i in ids}
+
+        # relés em todos os dispositivos ligados ao mesmo tempo (os offline ficam de fora)
+        ligados = [i for i in ids if ciclos[i] > 0]
+        lat = {i: [] for i in ligados}
+        async def comandar(i, n):
+            t = time.perf_counter()
+            r = await cli.post(f"/dispositivos/{i}/relay_temp/{'on' if n % 2 == 0 else 'off'}")
+            if r.status_code == 200: lat[i].append((time.perf_counter() - t) * 1000)
+        await asyncio.gather(*(comandar(i, n) for n in range(pedidos) for i in ligados))
+
+    return {"dispositivos": len(ids), "ligados": len(ligados),
+            "ciclos_s_min": min((ciclos[i] for i in ligados), default=0),
+            "ciclos_s_max": max((ciclos[i] for i in ligados), default=0),
+            "ciclos_s": ciclos,
+            "reles": resumo([x for v in lat.values() for x in v]) if ligados else {}}
+
+
+# --------------------------
+# Comparação de resultados
+# --------------------------
+def _folhas(d, prefixo=""):
+    for k, v in d.items():
+        chave = f"{prefixo}{k}"
+        if isinstance(v, dict):
+            yield from _folhas(v, chave + ".")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield chave, v
+
+def comparar(a, b):
+    ra, rb = json.load(open(a)), json.load(open(b))
+    fa, fb = dict(_folhas(ra["cenarios"])), dict(_folhas(rb["cenarios"]))
+    print(f"{'métrica':48} {ra['rotulo']:>12} {rb['rotulo']:>12} {'Δ%':>8}")
+    for k in fa:
+        if k not in fb: continue
+        delta = f"{(fb[k] - fa[k]) / fa[k] * 100:+.1f}" if fa[k] else ""
+        print(f"{k:48} {fa[k]:>12} {fb[k]:>12} {delta:>8}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark da API/coletores com FieldLogger simulado")
+    ap.add_argument("--cenarios", default=",".join(CENARIOS), help="lista separada por vírgulas")
+    ap.add_argument("--mongo", default="mongomock",
+                    help="'mongomock' (em memória) ou URI de um MongoDB local")
+    ap.add_argument("--latencia-ms", type=float, default=2.0, help="latência Modbus simulada")
+    ap.add_argument("--jitter-ms", type=float, default=0.5)
+    ap.add_argument("--amostras", type=int, default=2000)
+    ap.add_argument("--lote", type=int, default=200)
+    ap.add_argument("--concorrencia", type=int, default=50)
+    ap.add_argument("--clientes", type=int, default=50, help="clientes SSE no cenário difusao")
+    ap.add_argument("--eventos", type=int, default=100)
+    ap.add_argument("--pedidos", type=int, default=400, help="pedidos no cenário reles")
+    ap.add_argument("--contagem-s", type=float, default=20.0)
+    ap.add_argument("--pulso-periodo-ms", type=float, default=250)
+    ap.add_argument("--pulso-largura-ms", type=float, default=80)
+    ap.add_argument("--semente", type=int, default=1)
+    ap.add_argument("--dispositivos", type=int, default=1, help="FieldLoggers simulados na API")
+    ap.add_argument("--offline", type=int, default=0, help="FieldLoggers registados sem resposta")
+    ap.add_argument("--janela-s", type=float, default=10.0, help="janela do cenário dispositivos")
+    ap.add_argument("--rotulo", default="atual")
+    ap.add_argument("--saida", help="ficheiro JSON (por omissão bench_syssense_<rotulo>.json)")
+    ap.add_argument("--comparar", nargs=2, metavar=("A", "B"),
+                    help="compara dois resultados JSON já gravados")
+    ap.add_argument("--servir", type=int, metavar="PORTA", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        raise SystemExit
+    if args.servir:
+        servir(args.servir, args.mongo)
+        raise SystemExit
+
+    random.seed(args.semente)
+    porta_modbus, porta_api = porta_livre(), porta_livre()
+    pecas = TremPulsos(args.pulso_periodo_ms / 1000, args.pulso_largura_ms / 1000,
+                       prop_grandes=0.3, jitter=0.2, semente=args.semente)
+    sim = SimuladorFieldLogger(porta_modbus, args.latencia_ms, args.jitter_ms,
+                               args.semente, pecas).iniciar()
+
+    os.environ["SYSSENSE_FIELDLOGGER_IP"] = "127.0.0.1"
+    os.environ["SYSSENSE_FIELDLOGGER_PORT"] = str(porta_modbus)
+    if args.dispositivos > 1 or args.offline:
+        # registo da API: o simulador principal (por omissão), os extra e os offline (porta fechada)
+        registo = [{"id": "fl1", "linha": "linha1", "ip": "127.0.0.1", "porta": porta_modbus}]
+        for i in range(2, args.dispositivos + 1):
+            p = porta_livre()
+            SimuladorFieldLogger(p, args.latencia_ms, args.jitter_ms, args.semente + i).iniciar()
+            registo.append({"id": f"fl{i}", "linha": f"linha{i}", "ip": "127.0.0.1", "porta": p})
+        for i in range(1, args.offline + 1):
+            registo.append({"id": f"offline{i}", "linha": f"offline{i}", "ip": "127.0.0.1",
+                            "porta": porta_livre()})
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(registo, f)
+        os.environ["SYSSENSE_DISPOSITIVOS"] = f.name
+    os.environ["SYSSENSE_DB_NAME"] = "SysSenseBench"
+    if args.mongo == "mongomock":
+        usar_mongomock()
+    else:
+        os.environ["SYSSENSE_MONGO_URI"] = args.mongo
+    iniciar_api(porta_api)
+    url = f"http://127.0.0.1:{porta_api}"
+
+    resultados = {}
+    for nome in args.cenarios.split(","):
+        print(f"--- {nome}", flush=True)
+        if nome == "ingestao":
+            r = asyncio.run(cenario_ingestao(url, args.amostras, args.lote, args.concorrencia))
+        elif nome == "difusao":
+            r = asyncio.run(cenario_difusao(url, args.clientes, args.eventos, 0.02))
+        elif nome == "reles":
+            r = asyncio.run(correr_reles(url, args.pedidos, args.concorrencia, args.semente))
+        elif nome == "contagem":
+            r = cenario_contagem(sim, porta_modbus, args.contagem_s, 0.02)
+        elif nome == "cpu":
+            r = cenario_cpu(args.amostras, args.lote, args.mongo)
+        elif nome == "dispositivos":
+            r = asyncio.run(cenario_dispositivos(url, args.janela_s, 5))
+        else:
+            raise SystemExit(f"Cenário desconhecido: {nome} (disponíveis: {', '.join(CENARIOS)})")
+        resultados[nome] = r
+        print(json.dumps(r, indent=2, ensure_ascii=False))
+
+    config = {k: v for k, v in vars(args).items() if k not in ("comparar", "saida")}
+    saida = args.saida or f"bench_syssense_{args.rotulo}.json"
+    with open(saida, "w") as f:
+        json.dump({"rotulo": args.rotulo, "data": datetime.utcnow().isoformat(), "config": config,
+                   "simulador": sim.estado(), "cenarios": resultados}, f, indent=2, ensure_ascii=False)
+    print("gravado em", saida)
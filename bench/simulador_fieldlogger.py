@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Simulador local do FieldLogger (servidor Modbus TCP) para benchmarks.
+
+Emula o mapa de registos usado pela API e pelos coletores:
+    3, 5      canais analógicos (PT100 bruto = °C + 5; humidade em %)
+    14        pulso de movimento do tapete
+    15, 16    pulsos de peças pequenas / grandes (0 ou 5)
+    17, 21    entradas: habilitação do tapete (1 = on) e modo manual (1 = manual)
+    26, 27    saídas: tapete/luz verde e luz de alerta
+    coils 8/9 relés do ventilador e do humidificador
+
+Cada transação pode ter uma latência fixa mais jitter. Os trens de pulsos
+são deterministas (semente) e avaliados à hora de cada leitura; o simulador
+conta os pulsos que gerou para se medir a exatidão da contagem.
+
+    python bench/simulador_fieldlogger.py --porta 5020 --latencia-ms 5 --jitter-ms 2
+"""
+import argparse, asyncio, math, random, socket, threading, time
+
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.server import StartAsyncTcpServer
+
+ALTO, BAIXO = 5, 0
+
+REG_TEMPERATURA, REG_HUMIDADE = 3, 5
+REG_PULSO_TAPETE = 14
+REG_PECAS_PEQUENAS, REG_PECAS_GRANDES = 15, 16
+REG_ENTRADA_CANAL_4, REG_ENTRADA_CANAL_8 = 17, 21
+REG_SAIDA_LUZ_VERDE, REG_SAIDA_ALERTA = 26, 27
+COIL_VENTILADOR, COIL_HUMIDIFICADOR = 8, 9
+
+
+# --------------------------
+# Trem de pulsos
+# --------------------------
+class TremPulsos:
+    """
+    Pulsos BAIXO -> ALTO -> BAIXO com período e largura (± jitter relativo).
+    Uma fração `prop_grandes` dos pulsos ativa também o sensor de grandes.
+    Os pulsos são gerados à medida que o tempo avança (estado(t)); os que
+    terminam entre duas leituras continuam a contar como gerados.
+    """
+
+    def __init__(self, periodo, largura, prop_grandes=0.0, jitter=0.0, semente=1):
+        if largura >= periodo:
+            raise ValueError("A largura do pulso tem de ser menor que o período")
+        self.periodo, self.largura = periodo, largura
+        self.prop_grandes, self.jitter = prop_grandes, jitter
+        self._rnd = random.Random(semente)
+        self._proximo = time.monotonic() + periodo
+        self._atual = None        # (inicio, fim, grande)
+        self.gerados = {"pequena": 0, "grande": 0}
+
+    def _variar(self, x):
+        return x * (1 + self._rnd.uniform(-self.jitter, self.jitter))
+
+    def _novo(self):
+        inicio = self._proximo
+        fim = inicio + self._variar(self.largura)
+        grande = self._rnd.random() < self.prop_grandes
+        self._proximo = max(inicio + self._variar(self.periodo), fim + 0.001)
+        return inicio, fim, grande
+
+    def estado(self, t=None):
+        """(pequena, grande) no instante t (monotonic)."""
+        t = time.monotonic() if t is None else t
+        while True:
+            if self._atual is None:
+                self._atual = self._novo()
+            inicio, fim, grande = self._atual
+            if t < fim:
+                break
+            self.gerados["grande" if grande else "pequena"] += 1
+            self._atual = None
+        if t < inicio:
+            return BAIXO, BAIXO
+        return ALTO, ALTO if grande else BAIXO
+
+    def reiniciar_contagem(self):
+        self.estado()
+        self.gerados = {"pequena": 0, "grande": 0}
+
+
+# --------------------------
+# Datastore com latência e registos dinâmicos
+# --------------------------
+class _Contexto(ModbusSlaveContext):
+    def __init__(self, sim, **blocos):
+        super().__init__(**blocos)
+        self.sim = sim
+
+    async def async_getValues(self, fc_as_hex, address, count=1):
+        await self.sim._atrasar()
+        self.sim._atualizar()
+        self.sim.leituras += 1
+        return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(self, fc_as_hex, address, values):
+        await self.sim._atrasar()
+        self.sim.escritas += 1
+        return self.setValues(fc_as_hex, address, values)
+
+
+class SimuladorFieldLogger:
+    """Servidor Modbus TCP numa thread própria (o seu event loop não partilha nada com quem o usa)."""
+
+    def __init__(self, porta=5020, latencia_ms=0.0, jitter_ms=0.0, semente=1,
+                 pecas=None, tapete=None):
+        self.porta = porta
+        self.latencia = latencia_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self._rnd = random.Random(semente)
+        self.pecas  = pecas or TremPulsos(0.25, 0.08, prop_grandes=0.3, jitter=0.2, semente=semente)
+        self.tapete = tapete or TremPulsos(0.5, 0.1, semente=semente + 1)
+        self._hr = ModbusSequentialDataBlock(0, [0] * 200)
+        self._co = ModbusSequentialDataBlock(0, [0] * 200)
+        # di/ir explícitos: sem di, o pymodbus 3.9 ignora os blocos hr/co passados
+        self._ctx = ModbusServerContext(slaves=_Contexto(
+            self, di=ModbusSequentialDataBlock(0, [0] * 200), co=self._co,
+            ir=ModbusSequentialDataBlock(0, [0] * 200), hr=self._hr), single=True)
+        self._t0 = time.monotonic()
+        self.leituras = 0
+        self.escritas = 0
+        self.definir(REG_ENTRADA_CANAL_4, 1)   # tapete habilitado
+        self.definir(REG_ENTRADA_CANAL_8, 0)   # modo automático
+
+    async def _atrasar(self):
+        if self.latencia or self.jitter:
+            await asyncio.sleep(max(0.0, self.latencia + self._rnd.uniform(-self.jitter, self.jitter)))
+
+    def _atualizar(self):
+        agora = time.monotonic()
+        t = agora - self._t0
+        temperatura = 22 + 3 * math.sin(t / 600) + 0.3 * math.sin(t / 7)
+        humidade = 55 + 5 * math.sin(t / 900)
+        pequena, grande = self.pecas.estado(agora)
+        self._hr.setValues(REG_TEMPERATURA + 1, [round(temperatura + 5)])
+        self._hr.setValues(REG_HUMIDADE + 1, [round(humidade)])
+        self._hr.setValues(REG_PULSO_TAPETE + 1, [self.tapete.estado(agora)[0]])
+        self._hr.setValues(REG_PECAS_PEQUENAS + 1, [pequena, grande])
+
+    # --------------------------
+    # Acesso direto aos registos (cenários)
+    # --------------------------
+    # o bloco sequencial é indexado a partir de 1 (endereço Modbus + 1)
+    def definir(self, end, valor): self._hr.setValues(end + 1, [valor])
+    def registo(self, end):        return self._hr.getValues(end + 1, 1)[0]
+    def coil(self, end):           return int(self._co.getValues(end + 1, 1)[0])
+
+    # --------------------------
+    # Arranque
+    # --------------------------
+    def iniciar(self, timeout=5.0):
+        threading.Thread(target=lambda: asyncio.run(StartAsyncTcpServer(
+            context=self._ctx, address=("127.0.0.1", self.porta))),
+            name="simulador-fieldlogger", daemon=True).start()
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            try:
+                socket.create_connection(("127.0.0.1", self.porta), 0.2).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"O simulador não abriu a porta {self.porta}")
+
+    def estado(self):
+        return {
+            "porta": self.porta,
+            "latencia_ms": self.latencia * 1000,
+            "jitter_ms": self.jitter * 1000,
+            "leituras": self.leituras,
+            "escritas": self.escritas,
+            "pulsos_gerados": dict(self.pecas.gerados),
+        }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Simulador Modbus TCP do FieldLogger")
+    ap.add_argument("--porta", type=int, default=5020)
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--pulso-periodo-ms", type=float, default=250)
+    ap.add_argument("--pulso-largura-ms", type=float, default=80)
+    ap.add_argument("--prop-grandes", type=float, default=0.3)
+    ap.add_argument("--semente", type=int, default=1)
+    args = ap.parse_args()
+
+    pecas = TremPulsos(args.pulso_periodo_ms / 1000, args.pulso_largura_ms / 1000,
+                       args.prop_grandes, jitter=0.2, semente=args.semente)
+    sim = SimuladorFieldLogger(args.porta, args.latencia_ms, args.jitter_ms, args.semente, pecas).iniciar()
+    print(f"Simulador do FieldLogger em 127.0.0.1:{args.porta}")
+    while True:
+        time.sleep(10)
+        print(sim.estado())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Cache em memória da última leitura de cada canal.
+
+Os endpoints de ingestão atualizam a cache à medida que escrevem no MongoDB,
+por isso os endpoints /ultima_* respondem sem ida à base de dados. O corpo
+JSON e o ETag são calculados uma vez por atualização, não por pedido.
+"""
+import threading, zlib
+from datetime import datetime
+
+from serializacao import dumps
+
+
+def _etag(timestamp, valor):
+    # derivado do conteúdo (e não de um contador) para continuar válido após reinício
+    micros = int(timestamp.timestamp() * 1_000_000) if isinstance(timestamp, datetime) else 0
+    return f'"{micros:x}-{zlib.crc32(repr(valor).encode()):x}"'
+
+
+class Entrada:
+    __slots__ = ("timestamp", "valor", "corpo", "etag")
+
+    def __init__(self, timestamp, valor):
+        self.timestamp = timestamp
+        self.valor     = valor
+        self.corpo     = dumps({"timestamp": timestamp, "valor": valor})
+        self.etag      = _etag(timestamp, valor)
+
+
+class CacheUltimas:
+    """Última leitura por canal (temperatura, humidade...); a chave pode incluir o dispositivo."""
+
+    def __init__(self):
+        self._dados = {}
+        self._lock  = threading.Lock()
+
+    def atualizar(self, canal, timestamp, valor):
+        """Guarda a leitura se for mais recente do que a que está em cache."""
+        with self._lock:
+            atual = self._dados.get(canal)
+            if atual is not None and timestamp < atual.timestamp:
+                return atual   # leitura atrasada (ex.: reenvio) não substitui a mais recente
+            entrada = self._dados[canal] = Entrada(timestamp, valor)
+            return entrada
+
+    def carregar(self, canal, col, campo="valor", filtro=None):
+        """Preenche o canal com o documento mais recente da coleção (ex.: de um dispositivo)."""
+        u = col.find_one(filtro or {}, sort=[("timestamp", -1)])
+        if u is None:
+            return None
+        return self.atualizar(canal, u["timestamp"], u[campo])
+
+    def obter(self, canal):
+        return self._dados.get(canal)
+
+    def todos(self):
+        return dict(self._dados)
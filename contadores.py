@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Contadores de produção (peças pequenas / grandes) mantidos no servidor.
+
+Cada peça ingerida em /contador_unidades_logger* soma 1, com $inc atómico,
+ao documento da hora, ao do turno e ao total acumulado do seu tipo, na sua
+linha e dispositivo. Os totais e as taxas (peças/min) leem-se assim de
+meia dúzia de documentos por linha, sem varrer as leituras brutas, e o
+total acumulado (a "sequência") de cada dispositivo não se perde quando o
+coletor reinicia: o coletor retoma a numeração a partir dele. Os documentos
+anteriores ao registo de dispositivos não têm linha/dispositivo e contam
+para o dispositivo por omissão (filtro dispositivos.Dispositivo.filtro()).
+
+Para dados já existentes, os contadores recalculam-se pela linha de comandos:
+
+    python contadores.py --reconstruir
+    python contadores.py --reconstruir --desde 2025-01-01
+"""
+import argparse, threading
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from agregados import EPOCA, FONTES, escrever_upserts, inicio_bucket
+from indices_mongo import expr_meta, metadados
+
+COLECAO = "contadores_producao"
+
+# canal de ingestão -> tipo de peça
+TIPOS = {"contador_pequenas": "pequena", "contador_grandes": "grande"}
+
+# turnos de 8 h (horas em UTC, como os timestamps guardados): A 06-14, B 14-22, C 22-06
+TURNO_INICIO = 6
+TURNO_HORAS  = 8
+TURNOS       = ("A", "B", "C")
+assert TURNO_HORAS * len(TURNOS) == 24
+
+# periodo -> segundos (o total acumulado usa o período "total", com início na época)
+PERIODOS = {"hora": 3600, "turno": TURNO_HORAS * 3600}
+MAX_PERIODOS = 5000
+
+
+def turno(ts):
+    """(nome, início) do turno que contém ts."""
+    inicio = inicio_bucket(ts - timedelta(hours=TURNO_INICIO), PERIODOS["turno"]) + timedelta(hours=TURNO_INICIO)
+    return TURNOS[(inicio.hour - TURNO_INICIO) // TURNO_HORAS % len(TURNOS)], inicio
+
+def inicio_periodo(periodo, ts):
+    return turno(ts)[1] if periodo == "turno" else inicio_bucket(ts, PERIODOS[periodo])
+
+# chave única de um contador; o índice antigo (sem linha/dispositivo) é removido
+CHAVE = [("tipo", ASCENDING), ("periodo", ASCENDING), ("inicio", ASCENDING),
+         ("linha", ASCENDING), ("dispositivo", ASCENDING)]
+INDICE_ANTIGO = "tipo_1_periodo_1_inicio_1"
+
+def garantir_indices(db):
+    acoes, col = [], db[COLECAO]
+    if INDICE_ANTIGO in col.index_information():
+        # único só por tipo/período: recusaria a mesma hora de dois dispositivos
+        col.drop_index(INDICE_ANTIGO)
+        acoes.append(f"{COLECAO}: índice {INDICE_ANTIGO} removido")
+    idx = col.create_index(CHAVE, unique=True)
+    return acoes + [f"{COLECAO}: índice {idx}"]
+
+def _por_minuto(n, segundos):
+    return round(n / max(segundos / 60, 1), 2)
+
+
+# --------------------------
+# Atualização na ingestão e leitura
+# --------------------------
+class Contadores:
+    """Totais por hora, por turno e acumulados de cada tipo de peça."""
+
+    def __init__(self, db):
+        self.col   = db[COLECAO]
+        self._lock = threading.Lock()
+        self.atualizacoes = 0
+        self.erros = 0
+
+    def registar(self, canal, docs):
+        """Cada documento é uma peça: soma-as aos períodos (uma operação por período)."""
+        tipo = TIPOS[canal]
+        acum = {}
+        for d in docs:
+            ts = d["timestamp"]
+            m = metadados(d)
+            linha, disp = m.get("linha"), m.get("dispositivo")
+            for periodo, inicio in (("hora", inicio_periodo("hora", ts)),
+                                    ("turno", inicio_periodo("turno", ts)),
+                                    ("total", EPOCA)):
+                k = (linha, disp, periodo, inicio)
+                a = acum.get(k)
+                if a is None:
+                    acum[k] = [1, ts, ts]
+                else:
+                    a[0] += 1
+                    if ts < a[1]: a[1] = ts
+                    if ts > a[2]: a[2] = ts
+        ops = []
+        for (linha, disp, periodo, inicio), (n, primeira, ultima) in acum.items():
+            upd = {"$inc": {"total": n}, "$min": {"primeira": primeira}, "$max": {"ultima": ultima}}
+            if periodo == "turno": upd["$setOnInsert"] = {"turno": turno(inicio)[0]}
+            ops.append(UpdateOne({"tipo": tipo, "periodo": periodo, "inicio": inicio,
+                                  "linha": linha, "dispositivo": disp}, upd, upsert=True))
+        try:
+            escrever_upserts(self.col, ops)
+            with self._lock: self.atualizacoes += len(ops)
+        except PyMongoError:
+            # a leitura bruta já foi aceite; os contadores reparam-se com --reconstruir
+            with self._lock: self.erros += 1
+
+    def sequencia(self, meta=None):
+        """Total acumulado de cada tipo (de onde os coletores de `meta` retomam a numeração)."""
+        seq = {t: 0 for t in TIPOS.values()}
+        for d in self.col.find(dict(meta or {}, periodo="total", inicio=EPOCA),
+                               {"_id": 0, "tipo": 1, "total": 1}):
+            seq[d["tipo"]] += d["total"]
+        return seq
+
+    def atual(self, agora=None, meta=None):
+        """
+        Totais da hora e do turno correntes e taxas em peças/min, de uma linha
+        (`meta`) ou de todas (meta=None): 8 documentos lidos por linha.
+        """
+        agora = agora or datetime.utcnow()
+        hora = inicio_periodo("hora", agora)
+        nome_turno, inicio_turno = turno(agora)
+        chaves = {("hora", hora): "hora", ("hora", hora - timedelta(hours=1)): "hora_anterior",
+                  ("turno", inicio_turno): "turno", ("total", EPOCA): "sequencia"}
+        lidos = {}
+        f = {"$or": [{"tipo": t, "periodo": p, "inicio": i} for t in TIPOS.values() for p, i in chaves]}
+        if meta: f = {"$and": [meta, f]}
+        for d in self.col.find(f, {"_id": 0, "tipo": 1, "periodo": 1, "inicio": 1, "total": 1}):
+            k = (d["tipo"], chaves[(d["periodo"], d["inicio"])])
+            lidos[k] = lidos.get(k, 0) + d["total"]
+
+        s_hora = (agora - hora).total_seconds()
+        s_turno = (agora - inicio_turno).total_seconds()
+        res = {"timestamp": agora,
+               "turno": {"nome": nome_turno, "inicio": inicio_turno,
+                         "fim": inicio_turno + timedelta(hours=TURNO_HORAS)},
+               "hora": {"inicio": hora}}
+        for tipo in list(TIPOS.values()) + ["total"]:
+            def n(k):
+                if tipo == "total": return sum(lidos.get((t, k), 0) for t in TIPOS.values())
+                return lidos.get((tipo, k), 0)
+            # última hora: hora corrente + a parte da anterior ainda dentro da janela de 60 min
+            ultimos_60 = n("hora") + n("hora_anterior") * (1 - s_hora / 3600)
+            res[tipo] = {
+                "sequencia": n("sequencia"),
+                "turno": n("turno"),
+                "turno_por_minuto": _por_minuto(n("turno"), s_turno),
+                "hora": n("hora"),
+                "hora_por_minuto": _por_minuto(n("hora"), s_hora),
+                "ultimos_60_min_por_minuto": round(ultimos_60 / 60, 2),
+            }
+        return res
+
+    def periodos(self, periodo, inicio, fim, tipo=None, meta=None):
+        """Totais de hora/turno do intervalo por ordem cronológica (somadas as linhas de `meta`)."""
+        f = dict(meta or {}, periodo=periodo, inicio={"$gte": inicio_periodo(periodo, inicio), "$lt": fim})
+        if tipo: f["tipo"] = tipo
+        pipeline = [
+            {"$match": f},
+            {"$group": {"_id": {"tipo": "$tipo", "inicio": "$inicio"}, "total": {"$sum": "$total"},
+                        "primeira": {"$min": "$primeira"}, "ultima": {"$max": "$ultima"}}},
+            {"$sort": {"_id.inicio": 1, "_id.tipo": 1}},
+            {"$limit": MAX_PERIODOS},
+        ]
+        out = []
+        for b in self.col.aggregate(pipeline):
+            doc = {"tipo": b["_id"]["tipo"], "periodo": periodo, "inicio": b["_id"]["inicio"],
+                   "total": b["total"], "primeira": b["primeira"], "ultima": b["ultima"]}
+            if periodo == "turno": doc["turno"] = turno(doc["inicio"])[0]
+            out.append(doc)
+        return out
+
+    def estado(self):
+        return {"atualizacoes": self.atualizacoes, "erros": self.erros}
+
+
+# --------------------------
+# Reconstrução a partir das leituras brutas
+# --------------------------
+def reconstruir(db, desde=None, ate=None):
+    """Recalcula (substitui) os períodos do intervalo; sem intervalo, também a sequência."""
+    destino, total = db[COLECAO], 0
+    for canal, tipo in TIPOS.items():
+        origem = db[FONTES[canal]]
+        for periodo, segundos in PERIODOS.items():
+            desvio = TURNO_INICIO * 3600 * 1000 if periodo == "turno" else 0
+            ms = segundos * 1000
+            f = {}
+            # alinha aos períodos para não substituir um período por parte das suas peças
+            if desde: f["$gte"] = inicio_periodo(periodo, desde)
+            if ate:   f["$lt"]  = inicio_periodo(periodo, ate) + timedelta(seconds=segundos)
+            t = {"$subtract": [{"$subtract": ["$timestamp", EPOCA]}, desvio]}
+            pipeline = ([{"$match": {"timestamp": f}}] if f else []) + [
+                {"$group": {"_id": dict(expr_meta("linha", "dispositivo"),
+                                        t={"$subtract": [t, {"$mod": [t, ms]}]}),
+                            "total": {"$sum": 1},
+                            "primeira": {"$min": "$timestamp"}, "ultima": {"$max": "$timestamp"}}},
+            ]
+            ops = []
+            for b in origem.aggregate(pipeline, allowDiskUse=True):
+                chave = {"tipo": tipo, "periodo": periodo,
+                         "inicio": EPOCA + timedelta(milliseconds=b["_id"]["t"] + desvio),
+                         "linha": b["_id"].get("linha"), "dispositivo": b["_id"].get("dispositivo")}
+                doc = dict(chave, total=b["total"], primeira=b["primeira"], ultima=b["ultima"])
+                if periodo == "turno": doc["turno"] = turno(chave["inicio"])[0]
+                ops.append(ReplaceOne(chave, doc, upsert=True))
+            if ops:
+                destino.bulk_write(ops, ordered=False); total += len(ops)
+        if desde is None and ate is None:
+            # sequência de cada linha/dispositivo
+            for e in origem.aggregate([{"$group": {"_id": expr_meta("linha", "dispositivo"),
+                                                   "total": {"$sum": 1},
+                                                   "primeira": {"$min": "$timestamp"},
+                                                   "ultima": {"$max": "$timestamp"}}}]):
+                chave = {"tipo": tipo, "periodo": "total", "inicio": EPOCA,
+                         "linha": e["_id"].get("linha"), "dispositivo": e["_id"].get("dispositivo")}
+                destino.replace_one(chave, dict(chave, total=e["total"], primeira=e["primeira"],
+                                                ultima=e["ultima"]), upsert=True)
+                total += 1
+    return total
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Contadores de produção por hora / turno do ProdSenseBD")
+    ap.add_argument("--uri", default="mongodb://localhost:27017/")
+    ap.add_argument("--db", default="ProdSenseBD")
+    ap.add_argument("--reconstruir", action="store_true",
+                    help="recalcula os contadores a partir das leituras brutas")
+    ap.add_argument("--desde", type=datetime.fromisoformat, help="UTC, ex.: 2025-01-01T00:00")
+    ap.add_argument("--ate", type=datetime.fromisoformat, help="UTC")
+    args = ap.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    for acao in garantir_indices(db):
+        print(" -", acao)
+    if args.reconstruir:
+        print(f"{reconstruir(db, args.desde, args.ate)} documentos escritos")
+    print(Contadores(db).atual())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Controlo automático por histerese (ventilador e humidificador).
+
+O controlador é avaliado pela API a cada nova amostra que chega à ingestão:
+abaixo do mínimo liga, acima do máximo desliga, e entre os dois mantém o
+estado. Só comanda o relé quando o estado real (o último comandado) tem de
+mudar, e a atuação é agendada no event loop da API para não atrasar a
+ingestão (que corre na threadpool).
+Há um controlador por grandeza em cada dispositivo (atua nos relés desse
+dispositivo com as amostras dele). Os setpoints ficam guardados no MongoDB
+e o modo automático é retomado quando a API arranca.
+"""
+import asyncio, threading, time
+from datetime import datetime, timedelta
+
+from modbus_conexao import ErroModbus
+
+IDADE_MAX_AMOSTRA = timedelta(seconds=120)   # amostras reenviadas mais antigas não atuam
+
+
+class ControladorHisterese:
+    """Histerese min/max sobre um canal, a atuar num relé."""
+
+    def __init__(self, nome, atuar, estado_real, col_setpoints, ao_mudar=None, chave=None):
+        self.nome          = nome            # "temperatura" / "humidade"
+        self.chave         = chave or nome   # _id dos setpoints (um por dispositivo)
+        self._atuar        = atuar           # corrotina atuar("on"|"off"), lança ErroModbus
+        self._estado_real  = estado_real     # () -> "on"|"off" (último estado comandado)
+        self._col          = col_setpoints
+        self.ao_mudar      = ao_mudar
+        self._loop         = None
+        self._lock         = threading.Lock()
+        self._em_curso     = None            # estado a ser comandado neste momento
+
+        self.ativo   = False
+        self.minimo  = None
+        self.maximo  = None
+        self.ultima_amostra = None
+        self.atuacoes = 0
+        self.erros    = 0
+        self._lat_soma = 0.0
+        self._lat_max  = 0.0
+        self._lat_ultima = None
+
+    def ligar_loop(self, loop):
+        self._loop = loop
+
+    # --------------------------
+    # Setpoints (persistidos)
+    # --------------------------
+    def carregar(self):
+        """Repõe setpoints guardados; retoma o modo automático se estava ativo."""
+        d = self._col.find_one({"_id": self.chave})
+        if d:
+            self.minimo, self.maximo = d.get("minimo"), d.get("maximo")
+            self.ativo = bool(d.get("ativo")) and self.minimo is not None
+        return self.ativo
+
+    def _guardar(self):
+        self._col.update_one(
+            {"_id": self.chave},
+            {"$set": {"ativo": self.ativo, "minimo": self.minimo, "maximo": self.maximo,
+                      "atualizado": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def iniciar(self, minimo, maximo):
+        if minimo >= maximo:
+            raise ValueError("Limites inválidos (mínimo tem de ser menor que máximo)")
+        self.minimo, self.maximo, self.ativo = minimo, maximo, True
+        self._guardar()
+        if self.ultima_amostra is not None:
+            self.amostra(*self.ultima_amostra)
+        self._notificar()
+
+    def parar(self):
+        """Desativa o automático e desliga o relé (como fazia o dashboard)."""
+        self.ativo = False
+        self._guardar()
+        self._comandar("off", time.monotonic())
+        self._notificar()
+
+    # --------------------------
+    # Avaliação
+    # --------------------------
+    def amostra(self, valor, timestamp):
+        """Avalia a histerese para uma nova amostra do canal."""
+        self.ultima_amostra = (valor, timestamp)
+        if not self.ativo or valor is None:
+            return
+        if isinstance(timestamp, datetime) and datetime.utcnow() - timestamp > IDADE_MAX_AMOSTRA:
+            return
+        t0 = time.monotonic()
+        if valor <= self.minimo:
+            self._comandar("on", t0)
+        elif valor >= self.maximo:
+            self._comandar("off", t0)
+
+    def _comandar(self, estado, t0):
+        with self._lock:
+            if self._em_curso == estado:
+                return
+            if self._em_curso is None and self._estado_real() == estado:
+                return   # relé já está no estado pedido: não reenvia (ex.: pulsos do humidificador)
+            if self._loop is None:
+                return   # API ainda a arrancar
+            self._em_curso = estado
+        # pode ser chamado da threadpool (ingestão) ou do próprio loop
+        asyncio.run_coroutine_threadsafe(self._executar(estado, t0), self._loop)
+
+    async def _executar(self, estado, t0):
+        try:
+            await self._atuar(estado)
+            lat = time.monotonic() - t0
+            self.atuacoes += 1
+            self._lat_soma += lat
+            self._lat_ultima = lat
+            if lat > self._lat_max: self._lat_max = lat
+        except ErroModbus:
+            self.erros += 1
+        finally:
+            with self._lock:
+                self._em_curso = None
+
+    def _notificar(self):
+        if self.ao_mudar: self.ao_mudar(self.estado())
+
+    def estado(self):
+        n = self.atuacoes or 1
+        return {
+            "grandeza": self.nome,
+            "ativo": self.ativo,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "estado_rele": self._estado_real(),
+            "ultima_amostra": self.ultima_amostra[0] if self.ultima_amostra else None,
+            "atuacoes": self.atuacoes,
+            "erros": self.erros,
+            "latencia_ultima_ms": round(self._lat_ultima * 1000, 1) if self._lat_ultima is not None else None,
+            "latencia_media_ms": round(self._lat_soma / n * 1000, 1),
+            "latencia_max_ms": round(self._lat_max * 1000, 1),
+        }
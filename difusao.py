@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Difusão de eventos em tempo real (Server-Sent Events).
+
+Um único produtor publica leituras e estados (tapete, relés, interlock);
+o Difusor serializa cada evento uma vez e entrega-o a todas as ligações
+abertas em /stream. publicar() pode ser chamado de qualquer thread.
+Os eventos de um dispositivo só chegam a quem subscreveu esse dispositivo
+(ou todos); os eventos sem dispositivo chegam a toda a gente.
+"""
+import asyncio
+
+from serializacao import dumps_str
+
+
+class Difusor:
+    """Fan-out de eventos para subscritores SSE, com o último estado de cada tópico."""
+
+    def __init__(self, max_fila=256, heartbeat=15.0):
+        self.max_fila   = max_fila
+        self.heartbeat  = heartbeat
+        self._subs      = {}      # fila -> dispositivo subscrito (None = todos)
+        self._ultimos   = {}      # (tipo, chave) -> (dispositivo, mensagem SSE já formatada)
+        self._loop      = None
+        self.publicados = 0
+        self.descartados = 0
+
+    def ligar_loop(self, loop):
+        self._loop = loop
+
+    @property
+    def subscritores(self):
+        return len(self._subs)
+
+    # --------------------------
+    # Produção
+    # --------------------------
+    def publicar(self, tipo, dados, chave=None, dispositivo=None):
+        """Formata o evento e agenda a distribuição no event loop."""
+        msg = f"event: {tipo}\ndata: {dumps_str(dados)}\n\n"
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._ultimos[(tipo, chave)] = (dispositivo, msg)
+            return
+        loop.call_soon_threadsafe(self._distribuir, tipo, chave, dispositivo, msg)
+
+    def _distribuir(self, tipo, chave, dispositivo, msg):
+        self._ultimos[(tipo, chave)] = (dispositivo, msg)
+        self.publicados += 1
+        for q, filtro in self._subs.items():
+            if filtro is not None and dispositivo is not None and dispositivo != filtro:
+                continue
+            if q.full():
+                # cliente lento: perde o evento mais antigo, não bloqueia os outros
+                q.get_nowait()
+                self.descartados += 1
+            q.put_nowait(msg)
+
+    # --------------------------
+    # Consumo
+    # --------------------------
+    async def subscrever(self, dispositivo=None):
+        """Gerador SSE: estado atual primeiro, depois os eventos à medida que chegam."""
+        q = asyncio.Queue(self.max_fila)
+        self._subs[q] = dispositivo
+        try:
+            for d, msg in list(self._ultimos.values()):
+                if dispositivo is None or d is None or d == dispositivo:
+                    yield msg
+            while True:
+                try:
+                    yield await asyncio.wait_for(q.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"   # mantém proxies/browsers ligados
+        finally:
+            self._subs.pop(q, None)
+
+    def estado(self):
+        return {
+            "subscritores": self.subscritores,
+            "publicados": self.publicados,
+            "descartados": self.descartados,
+            "topicos": len(self._ultimos),
+        }
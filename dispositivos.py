@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Registo de dispositivos (FieldLoggers) e das linhas de produção a que pertencem.
+
+Cada dispositivo tem a sua ligação Modbus (GestorModbus: lock, timeout e
+backoff próprios), o seu motor de snapshot (tarefa asyncio própria), a sua
+fila de comandos de escrita (FilaComandos), o seu interlock do tapete (com
+ligação própria) e o estado dos seus relés. Os ciclos de todos correm em paralelo no mesmo event
+loop, por isso um FieldLogger offline só atrasa as suas próprias leituras.
+Os arranques são desfasados ao longo de um período para as leituras dos
+vários dispositivos não coincidirem.
+
+A lista vem de dispositivos.json (ou do ficheiro em SYSSENSE_DISPOSITIVOS):
+
+    [
+      {"id": "fl1", "linha": "linha1", "ip": "192.168.0.30"},
+      {"id": "fl2", "linha": "linha2", "ip": "192.168.0.31", "porta": 502,
+       "unit_id": 1, "timeout": 1.0}
+    ]
+
+O primeiro é o dispositivo por omissão: é o que as rotas sem
+/dispositivos/{id} comandam e a quem pertencem as leituras gravadas sem
+"dispositivo" (incluindo as anteriores ao registo). Sem ficheiro, há um só
+dispositivo com a configuração de sempre (SYSSENSE_FIELDLOGGER_*).
+"""
+import asyncio, json, os
+
+from modbus_conexao import GestorModbus
+from modbus_snapshot import MotorSnapshot
+from fila_comandos import FilaComandos
+from indices_mongo import em_meta
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+FICHEIRO = os.environ.get("SYSSENSE_DISPOSITIVOS", os.path.join(PASTA, "dispositivos.json"))
+
+
+class DispositivoDesconhecido(KeyError):
+    """Id de dispositivo que não está no registo."""
+
+    def __str__(self):
+        return f"Dispositivo desconhecido: {self.args[0]}"
+
+
+class Dispositivo:
+    """Um FieldLogger: ligação, snapshot e estado dos relés de uma linha."""
+
+    def __init__(self, id, linha, ip, porta=502, unit_id=1, timeout=1.0,
+                 registos=(), periodo=0.5, ao_medir=None, ao_comando=None):
+        self.id      = id
+        self.linha   = linha
+        self.padrao  = False
+        self.modbus  = GestorModbus(ip, porta, unit_id, timeout=timeout, ao_medir=ao_medir)
+        self.snapshot = MotorSnapshot(self.modbus, registos, periodo=periodo)
+        self.comandos = FilaComandos(self.modbus, ao_concluir=ao_comando)   # todas as escritas
+        self.estado_reles = {"ventilador": "off", "humidificador": "off"}   # último estado comandado
+        self.pisca   = None   # PiscaAlarme, criado pela API (publica no difusor)
+        self.interlock = None # MotorInterlock, criado pela API (audita no Mongo)
+
+    def metadados(self):
+        """Campos gravados em cada leitura (índices e sharding por linha)."""
+        return {"linha": self.linha, "dispositivo": self.id}
+
+    def filtro(self):
+        """Filtro MongoDB deste dispositivo (agregados, contadores; campos no topo)."""
+        if self.padrao:
+            # as leituras anteriores ao registo não têm metadados: são do dispositivo por omissão
+            return {"linha": {"$in": [self.linha, None]}, "dispositivo": {"$in": [self.id, None]}}
+        return self.metadados()
+
+    def filtro_leituras(self):
+        """Filtro das leituras *_logger deste dispositivo (metadados no subdocumento meta)."""
+        return em_meta(self.filtro())
+
+    def resumo(self):
+        return {"id": self.id, "linha": self.linha, "padrao": self.padrao,
+                "endereco": f"{self.modbus.ip}:{self.modbus.porta}", "unit_id": self.modbus.unit_id,
+                "ligado": self.modbus.ligado, "reles": dict(self.estado_reles)}
+
+
+class RegistoDispositivos:
+    """Dispositivos por id; o primeiro da configuração é o dispositivo por omissão."""
+
+    def __init__(self, configs, registos, periodo=0.5, ao_medir=None, ao_comando=None):
+        if not configs:
+            raise ValueError("O registo precisa de pelo menos um dispositivo")
+        self.periodo = periodo
+        self._por_id = {}
+        for cfg in configs:
+            id = str(cfg["id"])
+            if id in self._por_id:
+                raise ValueError(f"Dispositivo repetido: {id}")
+            medir = (lambda *a, id=id: ao_medir(id, *a)) if ao_medir else None
+            comando = (lambda *a, id=id: ao_comando(id, *a)) if ao_comando else None
+            self._por_id[id] = Dispositivo(
+                id, str(cfg.get("linha", id)), cfg["ip"], int(cfg.get("porta", 502)),
+                int(cfg.get("unit_id", 1)), float(cfg.get("timeout", 1.0)),
+                registos, periodo, medir, comando)
+        self.padrao = next(iter(self._por_id.values()))
+        self.padrao.padrao = True
+
+    def __iter__(self):
+        return iter(list(self._por_id.values()))
+
+    def __len__(self):
+        return len(self._por_id)
+
+    def obter(self, id=None):
+        """Dispositivo pelo id; None → dispositivo por omissão."""
+        if id is None: return self.padrao
+        d = self._por_id.get(id)
+        if d is None: raise DispositivoDesconhecido(id)
+        return d
+
+    def linhas(self):
+        out = {}
+        for d in self._por_id.values():
+            out.setdefault(d.linha, []).append(d.id)
+        return out
+
+    # --------------------------
+    # Ciclo de vida (chamado no event loop da API)
+    # --------------------------
+    def iniciar(self):
+        # desfasa os ciclos: com 20 dispositivos e período de 0,5 s, um arranque a cada 25 ms
+        passo = self.periodo / len(self._por_id)
+        for i, d in enumerate(self._por_id.values()):
+            d.comandos.iniciar()
+            if d.interlock: d.interlock.iniciar()
+            d.snapshot.iniciar(atraso=i * passo)
+
+    async def parar(self):
+        dispositivos = list(self._por_id.values())
+        await asyncio.gather(*(d.interlock.parar() for d in dispositivos if d.interlock),
+                             *(d.pisca.parar() for d in dispositivos if d.pisca),
+                             return_exceptions=True)
+        # depois do pisca, que ainda escreve a luz desligada pela fila
+        await asyncio.gather(*(d.comandos.parar() for d in dispositivos))
+        await asyncio.gather(*(d.snapshot.parar() for d in dispositivos))
+        for d in dispositivos:
+            d.modbus.fechar()
+
+    def estado(self):
+        return {"padrao": self.padrao.id, "linhas": self.linhas(),
+                "dispositivos": [d.resumo() for d in self._por_id.values()]}
+
+
+def carregar(registos, ip, porta=502, unit_id=1, caminho=FICHEIRO, periodo=0.5, ao_medir=None,
+             ao_comando=None):
+    """Registo a partir do ficheiro; sem ficheiro, um só dispositivo com ip/porta/unit_id."""
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            configs = json.load(f)
+    else:
+        configs = [{"id": os.environ.get("SYSSENSE_DISPOSITIVO", "fl1"),
+                    "linha": os.environ.get("SYSSENSE_LINHA", "linha1"),
+                    "ip": ip, "porta": porta, "unit_id": unit_id}]
+    return RegistoDispositivos(configs, registos, periodo, ao_medir, ao_comando)
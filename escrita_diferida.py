@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Escrita diferida (write-behind) para as coleções *_logger.
+
+Cada coleção tem um buffer limitado em memória. Os pedidos de ingestão só
+acrescentam ao buffer; uma thread por coleção descarrega-o com insert_many
+quando atinge `max_lote` documentos ou quando o documento mais antigo
+espera há `max_espera` segundos.
+
+Ao parar, os buffers são drenados: com o Mongo em baixo, a thread continua
+a tentar até ao fim do `timeout`. O que ainda assim ficar por gravar (já
+aceite com 202) não é perdido em silêncio: vai para um ficheiro JSON
+lines (extended JSON, mantém _id e datas) na pasta de resgate, que volta
+ao buffer quando a coleção arranca outra vez, e parar() devolve quantos
+documentos ficaram por gravar no Mongo.
+"""
+import glob, os, threading, time, uuid
+from collections import deque
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+
+class BufferCheio(Exception):
+    """O buffer da coleção atingiu a capacidade e não libertou espaço a tempo."""
+
+
+class BufferEscrita:
+    """Buffer limitado de documentos para uma coleção, descarregado em lote."""
+
+    def __init__(self, col, max_lote=500, max_espera=1.0, capacidade=20000,
+                 espera_espaco=2.0, pasta_resgate=None):
+        self.col           = col
+        self.max_lote      = max_lote
+        self.max_espera    = max_espera
+        self.capacidade    = capacidade
+        self.espera_espaco = espera_espaco
+        self.pasta_resgate = pasta_resgate   # None = sem resgate em disco
+
+        self._docs    = deque()
+        self._cond    = threading.Condition()
+        self._parar   = False
+        self._thread  = None
+        self._primeiro = None      # monotonic do documento mais antigo no buffer
+        self._prazo    = None      # monotonic até ao qual se tenta drenar ao parar
+        self._em_curso = 0         # documentos no insert_many em curso
+
+        self.inseridos = 0
+        self.lotes     = 0
+        self.erros     = 0
+        self.resgatados  = 0       # guardados em disco ao parar
+        self.recuperados = 0       # lidos do disco ao iniciar
+
+    # --------------------------
+    # Produtor (pedidos HTTP)
+    # --------------------------
+    def adicionar(self, docs):
+        """Acrescenta documentos ao buffer; atribui o _id já aqui."""
+        for d in docs:
+            d.setdefault("_id", ObjectId())
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: len(self._docs) + len(docs) <= self.capacidade or self._parar,
+                    self.espera_espaco):
+                raise BufferCheio(f"Buffer de {self.col.name} cheio")
+            if not self._docs:
+                self._primeiro = time.monotonic()
+            self._docs.extend(docs)
+            if len(self._docs) >= self.max_lote:
+                self._cond.notify_all()
+
+    # --------------------------
+    # Consumidor (thread de descarga)
+    # --------------------------
+    def _pronto(self):
+        if self._parar or len(self._docs) >= self.max_lote:
+            return True
+        return bool(self._docs) and time.monotonic() - self._primeiro >= self.max_espera
+
+    def _retirar_lote(self):
+        n = min(len(self._docs), self.max_lote)
+        lote = [self._docs.popleft() for _ in range(n)]
+        self._primeiro = time.monotonic() if self._docs else None
+        self._cond.notify_all()   # liberta produtores à espera de espaço
+        return lote
+
+    def _descarregar(self, lote):
+        try:
+            self.col.insert_many(lote, ordered=False)
+        except BulkWriteError as e:
+            # erros por documento não se resolvem a repetir; duplicados (11000)
+            # vêm de um lote reenviado que já tinha sido parcialmente inserido
+            det = e.details
+            self.erros += sum(1 for w in det.get("writeErrors", []) if w.get("code") != 11000)
+            self.inseridos += det.get("nInserted", 0)
+            self.lotes += 1
+            return True
+        except Exception:
+            self.erros += 1
+            return False
+        self.inseridos += len(lote)
+        self.lotes += 1
+        return True
+
+    def _loop(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(self._pronto, self.max_espera)
+                if self._parar and not self._docs:
+                    return
+                if not self._docs:
+                    continue
+                lote = self._retirar_lote()
+                self._em_curso = len(lote)
+
+            ok = self._descarregar(lote)
+            self._em_curso = 0
+            if ok:
+                backoff = 0.0
+                continue
+
+            # Mongo indisponível: devolve o lote à frente do buffer e tenta mais tarde
+            # (a parar, só até ao prazo: o que sobrar é resgatado por parar())
+            with self._cond:
+                self._docs.extendleft(reversed(lote))
+                self._primeiro = time.monotonic()
+                resta = self._prazo - time.monotonic() if self._parar else None
+                if resta is not None and resta <= 0:
+                    return
+            backoff = min(max(backoff * 2, 0.5), 10.0)
+            time.sleep(backoff if resta is None else min(backoff, resta))
+
+    def iniciar(self):
+        self._parar = False
+        self._recuperar()
+        self._thread = threading.Thread(
+            target=self._loop, name=f"escrita-{self.col.name}", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=10.0):
+        """
+        Pede à thread que drene o buffer (a tentar até `timeout`) e termine.
+        Devolve o nº de documentos aceites que não chegaram ao Mongo: os do
+        buffer vão para a pasta de resgate (se houver); os de um insert ainda
+        em curso ao fim do prazo têm destino incerto e também são contados.
+        """
+        with self._cond:
+            self._parar = True
+            self._prazo = time.monotonic() + timeout
+            self._cond.notify_all()
+        em_curso = 0
+        if self._thread:
+            self._thread.join(timeout + 1.0)
+            if self._thread.is_alive(): em_curso = self._em_curso
+        with self._cond:
+            resto = list(self._docs)
+            self._docs.clear()
+        if resto: self._resgatar(resto)
+        return len(resto) + em_curso
+
+    # --------------------------
+    # Resgate em disco
+    # --------------------------
+    def _ficheiros(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.pasta_resgate), f"{self.col.name}-*.jsonl")))
+
+    def _resgatar(self, docs):
+        if not self.pasta_resgate: return
+        os.makedirs(self.pasta_resgate, exist_ok=True)
+        nome = f"{self.col.name}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl"
+        with open(os.path.join(self.pasta_resgate, nome), "w", encoding="utf-8") as f:
+            for d in docs:
+                f.write(json_util.dumps(d) + "\n")
+        self.resgatados += len(docs)
+
+    def _recuperar(self):
+        """Devolve ao buffer os documentos resgatados numa paragem anterior."""
+        if not self.pasta_resgate: return
+        for caminho in self._ficheiros():
+            with open(caminho, encoding="utf-8") as f:
+                docs = [json_util.loads(l) for l in f if l.strip()]
+            with self._cond:
+                if docs and not self._docs: self._primeiro = time.monotonic()
+                self._docs.extend(docs)
+            self.recuperados += len(docs)
+            os.remove(caminho)   # mesmo _id: um reenvio parcial dá duplicados, já tratados
+
+    def estado(self):
+        return {
+            "pendentes": len(self._docs),
+            "capacidade": self.capacidade,
+            "inseridos": self.inseridos,
+            "lotes": self.lotes,
+            "erros": self.erros,
+            "resgatados": self.resgatados,
+            "recuperados": self.recuperados,
+        }
+
+
+class EscritaDiferida:
+    """Conjunto de buffers, um por coleção."""
+
+    def __init__(self, **opcoes):
+        self._opcoes  = opcoes
+        self._buffers = {}
+        self._lock    = threading.Lock()
+
+    def buffer(self, col):
+        b = self._buffers.get(col.name)
+        if b is None:
+            with self._lock:
+                b = self._buffers.get(col.name)
+                if b is None:
+                    b = self._buffers[col.name] = BufferEscrita(col, **self._opcoes)
+                    b.iniciar()
+        return b
+
+    def parar(self, timeout=10.0):
+        """Drena todos os buffers; devolve {coleção: documentos que ficaram por gravar}."""
+        return {nome: n for nome, b in list(self._buffers.items()) if (n := b.parar(timeout))}
+
+    def estado(self):
+        return {nome: b.estado() for nome, b in self._buffers.items()}
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Exportação em massa das coleções *_logger para CSV ou Parquet.
+
+Os documentos do intervalo são lidos com um cursor em lotes (batch_size) e
+só com os campos exportados, e saem em blocos à medida que o cursor avança:
+  - CSV: cabeçalho e depois um bloco de texto por lote;
+  - Parquet: um row group por lote, entregue assim que é escrito (o rodapé
+    com os metadados sai no fim); precisa do pyarrow (opcional).
+A memória usada fica limitada a um lote, seja qual for o intervalo, e o gzip
+(opcional) é aplicado ao fluxo de blocos, também sem o acumular. Na API, o
+gerador é iterado na threadpool, fora do event loop da ingestão.
+
+Linha de comandos:
+
+    python exportacao.py temperatura --desde 2025-01-01 --ate 2025-02-01 -o temperatura.csv
+    python exportacao.py humidade --formato parquet --sensor S1 -o humidade.parquet
+    python exportacao.py velocidade --dispositivo fl2 --gzip -o velocidade.csv.gz
+"""
+import argparse, csv, io, sys, time, zlib
+from datetime import datetime, timedelta
+from itertools import islice
+
+from pymongo import MongoClient
+
+import historico
+from agregados import FONTES
+from indices_mongo import metadados
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# grandeza -> (coleção, campo do valor)
+COLECOES = dict({"status": ("comunicacao_logger", "status")},
+                **{g: (c, "valor") for g, c in FONTES.items()})
+
+FORMATOS = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+LOTE = 5000          # documentos por lote do cursor, bloco CSV e row group Parquet
+NIVEL_GZIP = 6
+
+COLUNAS = ("timestamp", "linha", "dispositivo", "sensor")
+
+
+class ParquetIndisponivel(RuntimeError):
+    """Exportação em Parquet pedida sem o pyarrow instalado."""
+
+
+# --------------------------
+# Leitura
+# --------------------------
+def documentos(col, campo, inicio, fim, sensor=None, meta=None, lote=LOTE):
+    """Cursor por ordem de timestamp, em lotes de `lote`, só com os campos exportados."""
+    historico.validar_intervalo(inicio, fim)
+    proj = dict(historico.PROJECAO, _id=0, linha=1, **{campo: 1})   # linha: leituras antigas
+    return (col.find(historico.filtro(inicio, fim, sensor, meta), proj)
+               .sort("timestamp", 1).batch_size(lote))
+
+def lotes(docs, lote=LOTE):
+    while True:
+        bloco = list(islice(docs, lote))
+        if not bloco: return
+        yield bloco
+
+
+# --------------------------
+# Formatos
+# --------------------------
+def csv_blocos(docs, campo, lote=LOTE):
+    """Cabeçalho + um bloco de linhas CSV (bytes) por lote."""
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(COLUNAS + ("valor",))
+    yield buf.getvalue().encode()
+    for bloco in lotes(docs, lote):
+        buf.seek(0); buf.truncate()
+        w.writerows((d["timestamp"].isoformat(), *(metadados(d).get(c) for c in COLUNAS[1:]),
+                     d.get(campo)) for d in bloco)
+        yield buf.getvalue().encode()
+
+
+class _Dreno:
+    """Destino do ParquetWriter: guarda os bytes escritos até serem entregues."""
+
+    def __init__(self):
+        self._partes = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._pos += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._pos      # posição no ficheiro inteiro (o writer usa-a nos offsets)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def esquema(campo):
+    valor = pa.int64() if campo == "status" else pa.float64()
+    return pa.schema([("timestamp", pa.timestamp("ms")), ("linha", pa.string()),
+                      ("dispositivo", pa.string()), ("sensor", pa.string()), ("valor", valor)])
+
+def parquet_blocos(docs, campo, lote=LOTE):
+    """Ficheiro Parquet entregue por row group (um por lote); o rodapé sai no fim."""
+    if pa is None:
+        raise ParquetIndisponivel("Parquet requer o pyarrow (pip install pyarrow)")
+    sch = esquema(campo)
+    dreno = _Dreno()
+    writer = pq.ParquetWriter(dreno, sch, compression="snappy")
+    try:
+        for bloco in lotes(docs, lote):
+            colunas = {"timestamp": [d["timestamp"] for d in bloco]}
+            colunas.update({c: [metadados(d).get(c) for d in bloco] for c in COLUNAS[1:]})
+            colunas["valor"] = [d.get(campo) for d in bloco]
+            writer.write_table(pa.Table.from_pydict(colunas, schema=sch), row_group_size=lote)
+            yield dreno.esvaziar()
+    finally:
+        writer.close()
+    yield dreno.esvaziar()
+
+def blocos(formato, docs, campo, lote=LOTE):
+    if formato == "csv": return csv_blocos(docs, campo, lote)
+    if formato == "parquet": return parquet_blocos(docs, campo, lote)
+    raise historico.ErroConsulta(f"Formato inválido ({', '.join(FORMATOS)})")
+
+def comprimir(partes, nivel=NIVEL_GZIP):
+    """gzip incremental de um fluxo de bytes (cada bloco sai comprimido sem esperar pelo fim)."""
+    z = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for p in partes:
+        c = z.compress(p)
+        if c: yield c
+    yield z.flush()
+
+def exportar(col, campo, formato, inicio, fim, sensor=None, meta=None, gzip=False, lote=LOTE):
+    """Gerador de bytes do ficheiro exportado (valida já, lê o Mongo ao iterar)."""
+    if formato not in FORMATOS:
+        raise historico.ErroConsulta(f"Formato inválido ({', '.join(FORMATOS)})")
+    if formato == "parquet" and pa is None:
+        raise ParquetIndisponivel("Parquet requer o pyarrow (pip install pyarrow)")
+    partes = blocos(formato, documentos(col, campo, inicio, fim, sensor, meta, lote), campo, lote)
+    return comprimir(partes) if gzip else partes
+
+def nome_ficheiro(grandeza, formato, inicio, fim, dispositivo=None):
+    prefixo = f"{grandeza}_{dispositivo}" if dispositivo else grandeza
+    return f"{prefixo}_{inicio:%Y%m%dT%H%M}_{fim:%Y%m%dT%H%M}.{formato}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Exportação das leituras do ProdSenseBD para CSV/Parquet")
+    ap.add_argument("grandeza", choices=list(COLECOES))
+    ap.add_argument("--uri", default="mongodb://localhost:27017/")
+    ap.add_argument("--db", default="ProdSenseBD")
+    ap.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    ap.add_argument("--desde", type=datetime.fromisoformat, help="UTC, ex.: 2025-01-01T00:00 (por omissão, 7 dias antes de --ate)")
+    ap.add_argument("--ate", type=datetime.fromisoformat, help="UTC (por omissão, agora)")
+    ap.add_argument("--sensor")
+    ap.add_argument("--dispositivo", help="id do dispositivo (por omissão, todas as linhas)")
+    ap.add_argument("--gzip", action="store_true", help="comprime a saída com gzip")
+    ap.add_argument("--lote", type=int, default=LOTE, help="documentos por lote / row group")
+    ap.add_argument("-o", "--saida", help="ficheiro de destino (por omissão, stdout)")
+    args = ap.parse_args()
+
+    fim = args.ate or datetime.utcnow()
+    inicio = args.desde or fim - timedelta(days=7)
+    nome_col, campo = COLECOES[args.grandeza]
+    col = MongoClient(args.uri)[args.db][nome_col]
+    meta = {"dispositivo": args.dispositivo} if args.dispositivo else None
+    try:
+        partes = exportar(col, campo, args.formato, inicio, fim, args.sensor, meta, args.gzip, args.lote)
+    except (historico.ErroConsulta, ParquetIndisponivel) as e:
+        sys.exit(str(e))
+
+    t0, n = time.monotonic(), 0
+    destino = open(args.saida, "wb") if args.saida else sys.stdout.buffer
+    try:
+        for p in partes:
+            destino.write(p)
+            n += len(p)
+    finally:
+        if args.saida: destino.close()
+    print(f"{args.grandeza}: {n} bytes em {time.monotonic() - t0:.1f} s", file=sys.stderr)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Fila de comandos de escrita Modbus de um dispositivo.
+
+Todas as escritas no FieldLogger (relés, tapete, interlock, pisca, escrita
+manual) passam por uma fila por dispositivo, executada por uma só tarefa:
+  - prioridade: segurança > controlo > cosmético (a segurança passa à frente
+    do pisca e de comandos ainda por executar);
+  - deduplicação: um comando igual ao estado conhecido da saída (última
+    escrita confirmada ou último snapshot lido depois dela) não é enviado;
+  - coalescência: um comando ainda na fila é substituído pelo seguinte para
+    o mesmo endereço (só o último valor é escrito), exceto um comando de
+    segurança, que só outro de segurança substitui: um comando de prioridade
+    menor para esse endereço é recusado (ComandoRejeitado) enquanto espera;
+  - sequências (ex.: pulsos do humidificador) são executadas de uma só vez
+    e nunca são coalescidas; a ligação só fica reservada durante cada escrita,
+    e nas pausas entre passos a fila executa as escritas simples pendentes
+    que não tocam nos endereços da sequência (outros relés, o interlock) e
+    o snapshot continua a ler.
+Cada comando devolve um future com o Resultado (estado e latências); uma
+escrita falhada propaga o erro (ErroModbus ou outro, ex.: valor que o
+pymodbus não codifica) só a quem a pediu: a tarefa da fila continua. Quem
+espera pelo resultado desiste ao fim de `espera_max` (ComandoExpirado): o
+comando sai da fila sem ser escrito e quem o pediu nunca fica pendurado
+numa fila parada.
+"""
+import asyncio, heapq, itertools, time
+from dataclasses import dataclass
+
+from modbus_conexao import ErroModbus
+
+# prioridades (menor = primeiro)
+SEGURANCA, CONTROLO, COSMETICO = 0, 1, 2
+NOMES_PRIORIDADE = {SEGURANCA: "seguranca", CONTROLO: "controlo", COSMETICO: "cosmetico"}
+
+VALIDADE_SOMBRA = 2.0   # s em que o estado conhecido de uma saída dispensa nova escrita
+ESPERA_MAX      = 10.0  # s de espera pelo resultado de um comando (fila + escrita)
+
+
+class ComandoRejeitado(ErroModbus):
+    """Escrita recusada: há uma escrita de segurança à espera para o mesmo endereço."""
+
+
+class ComandoExpirado(ErroModbus):
+    """A fila não concluiu o comando a tempo (ex.: FieldLogger lento ou fila parada)."""
+
+
+@dataclass(frozen=True)
+class Resultado:
+    estado: str               # escrito / ignorado (igual ao estado conhecido) / substituido / rejeitado / erro
+    espera_ms: float = 0.0    # tempo na fila
+    execucao_ms: float = 0.0  # tempo no FieldLogger
+
+    @property
+    def latencia_ms(self):
+        return round(self.espera_ms + self.execucao_ms, 2)
+
+
+class _Comando:
+    __slots__ = ("chave", "valor", "prioridade", "passos", "future", "t0", "cancelado")
+
+    def __init__(self, chave, valor, prioridade, passos=None):
+        self.chave      = chave        # ("registo", end) / ("coil", end) / ("sequencia", nome)
+        self.valor      = valor
+        self.prioridade = prioridade
+        self.passos     = passos       # sequência: [(tipo, end, valor, pausa_s), ...]
+        self.future     = asyncio.get_running_loop().create_future()
+        self.t0         = time.monotonic()
+        self.cancelado  = False        # substituído enquanto esperava (fica no heap até sair)
+
+
+class _Vista:
+    """Interface de escrita do GestorModbus com prioridade fixa (ex.: para o PiscaAlarme)."""
+
+    def __init__(self, fila, prioridade):
+        self._fila, self._prioridade = fila, prioridade
+
+    async def escrever_registo(self, end, valor, timeout=None):
+        return await self._fila.escrever_registo(end, valor, self._prioridade, timeout)
+
+    async def escrever_coil(self, end, valor, timeout=None):
+        return await self._fila.escrever_coil(end, valor, self._prioridade, timeout)
+
+
+class FilaComandos:
+    """Fila de escrita com prioridade, deduplicação e coalescência para um GestorModbus."""
+
+    def __init__(self, modbus, validade=VALIDADE_SOMBRA, ao_concluir=None, espera_max=ESPERA_MAX):
+        self.modbus   = modbus
+        self.validade = validade
+        self.espera_max = espera_max
+        self.ao_concluir = ao_concluir   # callback(prioridade, estado, latencia_s) (ex.: /metrics)
+        self._heap    = []
+        self._seq     = itertools.count()
+        self._pendentes = {}             # chave -> _Comando à espera (coalescência)
+        self._sombra  = {}               # chave -> (valor, monotonic) do estado conhecido
+        self._escrito_em = {}            # chave -> monotonic da última escrita (ver observar)
+        self._observado_em = {}          # chave -> monotonic do início da leitura observada
+        self._novo    = asyncio.Event()
+        self._tarefa  = None
+        self._stats   = {}
+
+    # --------------------------
+    # Submissão
+    # --------------------------
+    def submeter(self, tipo, end, valor, prioridade=CONTROLO):
+        """Agenda a escrita e devolve o future do Resultado (sem esperar)."""
+        return self._agendar(_Comando((tipo, end), int(valor), prioridade))
+
+    def submeter_sequencia(self, nome, estado, passos, prioridade=CONTROLO):
+        """Sequência atómica de escritas [(tipo, end, valor, pausa_s)]; ignorada se já em `estado`."""
+        return self._agendar(_Comando(("sequencia", nome), estado, prioridade, list(passos)))
+
+    async def escrever_registo(self, end, valor, prioridade=CONTROLO, timeout=None):
+        return await self._aguardar(self.submeter("registo", end, valor, prioridade), timeout)
+
+    async def escrever_coil(self, end, valor, prioridade=CONTROLO, timeout=None):
+        return await self._aguardar(self.submeter("coil", end, bool(valor), prioridade), timeout)
+
+    async def sequencia(self, nome, estado, passos, prioridade=CONTROLO, timeout=None):
+        return await self._aguardar(self.submeter_sequencia(nome, estado, passos, prioridade), timeout)
+
+    async def _aguardar(self, futuro, timeout):
+        timeout = self.espera_max if timeout is None else timeout
+        try:
+            # ao expirar, o future é cancelado e o comando é descartado quando sair do heap
+            return await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            raise ComandoExpirado(f"Comando sem resposta em {timeout:g} s") from None
+
+    def vista(self, prioridade):
+        return _Vista(self, prioridade)
+
+    def _agendar(self, cmd):
+        anterior = self._pendentes.get(cmd.chave)
+        if anterior is not None and anterior.future.done():
+            anterior = None   # expirou à espera: já não conta para a coalescência
+        # com um comando diferente ainda na fila, o estado conhecido deixa de ser o final
+        if anterior is None and self._conhecido(cmd.chave) == cmd.valor:
+            self._concluir(cmd, Resultado("ignorado"))
+            return cmd.future
+        if anterior is not None and anterior.prioridade == SEGURANCA and cmd.prioridade != SEGURANCA:
+            # o valor de segurança nunca é trocado por um comando menos prioritário
+            self._concluir(cmd, Resultado("rejeitado"),
+                           ComandoRejeitado(f"Escrita de segurança pendente em {cmd.chave[0]} {cmd.chave[1]}"))
+            return cmd.future
+        if anterior is not None and cmd.passos is None:
+            # só o último valor interessa; herda a prioridade mais alta dos dois
+            anterior.cancelado = True
+            cmd.prioridade = min(cmd.prioridade, anterior.prioridade)
+            self._concluir(anterior, Resultado("substituido", self._ms(time.monotonic() - anterior.t0)))
+        self._pendentes[cmd.chave] = cmd
+        heapq.heappush(self._heap, (cmd.prioridade, next(self._seq), cmd))
+        self._novo.set()
+        return cmd.future
+
+    # --------------------------
+    # Estado conhecido das saídas
+    # --------------------------
+    def _conhecido(self, chave):
+        s = self._sombra.get(chave)
+        if s is None:
+            return None
+        # o estado de uma sequência (ex.: humidificador por pulsos) só se conhece pelos comandos
+        if chave[0] != "sequencia" and time.monotonic() - s[1] > self.validade:
+            return None
+        return s[0]
+
+    def observar(self, registos, lido_em):
+        """Atualiza o estado conhecido com valores lidos (snapshot) a partir de `lido_em` (monotonic)."""
+        for end, valor in registos.items():
+            chave = ("registo", end)
+            # uma leitura iniciada antes da última escrita pode trazer o valor antigo, e uma
+            # iniciada antes da última observada (ex.: snapshot lento, depois do interlock)
+            # é mais velha do que o estado que já se conhece
+            if lido_em > self._escrito_em.get(chave, 0.0) and lido_em >= self._observado_em.get(chave, 0.0):
+                self._sombra[chave] = (valor, time.monotonic())
+                self._observado_em[chave] = lido_em
+
+    def esquecer(self, chave=None):
+        """Descarta o estado conhecido (ex.: saída alterada fora da API)."""
+        if chave is None: self._sombra.clear()
+        else: self._sombra.pop(chave, None)
+
+    # --------------------------
+    # Execução
+    # --------------------------
+    async def _executar(self, cmd):
+        tipo, end = cmd.chave
+        if cmd.passos is not None:
+            # só esta tarefa escreve: nenhuma outra escrita chega aos endereços da sequência
+            for t, e, v, pausa in cmd.passos:
+                await self._escrever(t, e, v)
+                if pausa: await self._pausa(pausa, cmd)
+        else:
+            await self._escrever(tipo, end, cmd.valor)
+
+    async def _escrever(self, tipo, end, valor):
+        self._escrito_em[(tipo, end)] = time.monotonic()
+        try:
+            if tipo == "coil": await self.modbus.escrever_coil(end, valor)
+            else: await self.modbus.escrever_registo(end, valor)
+        except Exception:
+            self._sombra.pop((tipo, end), None)   # estado real desconhecido
+            raise
+        self._sombra[(tipo, end)] = (int(valor), time.monotonic())
+
+    async def _pausa(self, segundos, seq):
+        # a ligação está livre durante a pausa: executa as escritas simples pendentes, por
+        # prioridade, exceto as dos endereços da sequência (a segurança passa sempre)
+        fim = time.monotonic() + segundos
+        ocupados = {(t, e) for t, e, _, _ in seq.passos}
+        while True:
+            self._novo.clear()
+            adiados = []
+            while self._heap:
+                item = heapq.heappop(self._heap)
+                cmd = item[2]
+                if cmd.passos is None and (cmd.prioridade == SEGURANCA or cmd.chave not in ocupados):
+                    await self._processar(cmd)
+                else:
+                    adiados.append(item)
+            for item in adiados: heapq.heappush(self._heap, item)
+            resta = fim - time.monotonic()
+            if resta <= 0: return
+            try:
+                await asyncio.wait_for(self._novo.wait(), resta)
+            except asyncio.TimeoutError:
+                return
+
+    async def _processar(self, cmd):
+        # substituído, ou quem o pediu desistiu (ComandoExpirado): não é escrito
+        if cmd.cancelado or cmd.future.done(): return
+        self._pendentes.pop(cmd.chave, None)
+        inicio = time.monotonic()
+        espera = self._ms(inicio - cmd.t0)
+        # o estado pode ter mudado enquanto esperava (ex.: outra escrita ou um snapshot)
+        if self._conhecido(cmd.chave) == cmd.valor:
+            self._concluir(cmd, Resultado("ignorado", espera))
+            return
+        try:
+            await self._executar(cmd)
+        except Exception as e:
+            # qualquer falha fica só no future deste comando: a fila (e o interlock) não param
+            self._sombra.pop(cmd.chave, None)
+            self._concluir(cmd, Resultado("erro", espera, self._ms(time.monotonic() - inicio)), e)
+            return
+        if cmd.passos is not None:
+            self._sombra[cmd.chave] = (cmd.valor, time.monotonic())
+        self._concluir(cmd, Resultado("escrito", espera, self._ms(time.monotonic() - inicio)))
+
+    async def _loop(self):
+        while True:
+            while not self._heap:
+                self._novo.clear()
+                await self._novo.wait()
+            _, _, cmd = heapq.heappop(self._heap)
+            await self._processar(cmd)
+
+    @staticmethod
+    def _ms(s):
+        return round(s * 1000, 2)
+
+    def _concluir(self, cmd, res, erro=None):
+        nome = NOMES_PRIORIDADE.get(cmd.prioridade, str(cmd.prioridade))
+        s = self._stats.setdefault(nome, {})
+        e = s.setdefault(res.estado, {"n": 0, "total_ms": 0.0, "max_ms": 0.0})
+        e["n"] += 1
+        e["total_ms"] += res.latencia_ms
+        if res.latencia_ms > e["max_ms"]: e["max_ms"] = res.latencia_ms
+        if self.ao_concluir: self.ao_concluir(nome, res.estado, res.latencia_ms / 1000)
+        if cmd.future.done(): return
+        if erro is not None: cmd.future.set_exception(erro)
+        else: cmd.future.set_result(res)
+
+    # --------------------------
+    # Ciclo de vida e estado
+    # --------------------------
+    def iniciar(self):
+        if self._tarefa and not self._tarefa.done():
+            return
+        self._tarefa = asyncio.get_running_loop().create_task(
+            self._loop(), name=f"comandos-modbus-{self.modbus.ip}:{self.modbus.porta}")
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        # quem ainda espera recebe erro em vez de ficar pendurado
+        for _, _, cmd in self._heap:
+            if not cmd.future.done(): cmd.future.set_exception(ErroModbus("Fila de comandos parada"))
+        self._heap.clear()
+        self._pendentes.clear()
+
+    def estado(self):
+        return {
+            "pendentes": len(self._pendentes),
+            # só as saídas comandadas pela fila (o snapshot traz também as entradas)
+            "estado_conhecido": {f"{t}:{e}": v for (t, e), (v, _) in self._sombra.items()
+                                 if (t == "sequencia" or (t, e) in self._escrito_em)
+                                 and self._conhecido((t, e)) is not None},
+            "comandos": {
+                prio: {est: {"n": e["n"], "latencia_media_ms": round(e["total_ms"] / e["n"], 2),
+                             "latencia_max_ms": e["max_ms"]}
+                       for est, e in por_estado.items()}
+                for prio, por_estado in self._stats.items()
+            },
+        }
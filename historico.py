@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Consultas históricas às coleções *_logger.
+
+Duas formas de ler um intervalo de tempo:
+  - agregado: o MongoDB agrupa as leituras em buckets de tamanho fixo e
+    devolve min/max/média/contagem por bucket (uma semana de leituras a 5 s
+    fica em algumas centenas de pontos); se o bucket for múltiplo de uma
+    granularidade dos agregados (1 min / 1 h), lê os agregados em vez das
+    leituras brutas;
+  - bruto: documentos tal como foram gravados, paginados por cursor
+    (timestamp, _id) ou transmitidos em NDJSON quando o intervalo é grande;
+  - reconstruído: sinal numa grelha regular a partir de leituras
+    comprimidas no coletor (degraus para deadband, linear para swinging door).
+"""
+import base64, itertools, json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from indices_mongo import META, em_meta, metadados
+
+EPOCA = datetime(1970, 1, 1)
+
+# tamanhos de bucket "redondos" (s) usados quando o cliente não indica um
+BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 21600, 43200, 86400]
+PONTOS_ALVO   = 500      # pontos pretendidos quando o bucket é automático
+MAX_BUCKETS   = 20000    # acima disto o pedido é recusado (usar bucket maior)
+LIMITE_PAGINA = 1000     # documentos por página no modo bruto
+LOTE_CURSOR   = 2000     # batch_size do cursor no modo NDJSON
+
+
+class ErroConsulta(ValueError):
+    """Parâmetros de consulta inválidos (intervalo, bucket, cursor)."""
+
+
+# --------------------------
+# Parâmetros
+# --------------------------
+def bucket_automatico(inicio, fim, pontos=PONTOS_ALVO):
+    """Menor bucket da lista que não gera mais do que `pontos` pontos."""
+    duracao = (fim - inicio).total_seconds()
+    for b in BUCKETS:
+        if duracao / b <= pontos:
+            return b
+    return BUCKETS[-1]
+
+def validar_intervalo(inicio, fim, bucket=None):
+    if fim <= inicio:
+        raise ErroConsulta("Intervalo inválido (fim tem de ser posterior a início)")
+    if bucket is not None:
+        if bucket <= 0:
+            raise ErroConsulta("Bucket tem de ser positivo")
+        if (fim - inicio).total_seconds() / bucket > MAX_BUCKETS:
+            raise ErroConsulta(f"Demasiados buckets (máx. {MAX_BUCKETS}); use um bucket maior")
+
+def filtro_meta(sensor=None, meta=None):
+    # meta: filtro do dispositivo/linha (dispositivos.Dispositivo.filtro()), aplicado
+    # ao subdocumento de metadados das leituras
+    f = dict(meta or {})
+    if sensor is not None: f["sensor"] = sensor
+    return em_meta(f)
+
+def filtro(inicio, fim, sensor=None, meta=None):
+    return dict(filtro_meta(sensor, meta), timestamp={"$gte": inicio, "$lt": fim})
+
+
+# --------------------------
+# Agregado por buckets
+# --------------------------
+def agregar(col, campo, inicio, fim, bucket, sensor=None, meta=None):
+    """min/max/média/contagem por bucket de `bucket` segundos, calculados no MongoDB."""
+    validar_intervalo(inicio, fim, bucket)
+    ms = int(bucket * 1000)
+    # ms desde a época; $subtract entre datas funciona em qualquer versão do servidor
+    t = {"$subtract": ["$timestamp", EPOCA]}
+    pipeline = [
+        {"$match": filtro(inicio, fim, sensor, meta)},
+        {"$group": {
+            "_id":   {"$subtract": [t, {"$mod": [t, ms]}]},
+            "min":   {"$min": f"${campo}"},
+            "max":   {"$max": f"${campo}"},
+            "media": {"$avg": f"${campo}"},
+            "n":     {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        {"timestamp": EPOCA + timedelta(milliseconds=b["_id"]),
+         "min": b["min"], "max": b["max"], "media": b["media"], "n": b["n"]}
+        for b in col.aggregate(pipeline, allowDiskUse=True)
+    ]
+
+
+def agregar_rollups(col, grandeza, inicio, fim, bucket, sensor=None, meta=None):
+    """Como agregar(), mas a partir dos agregados incrementais (ver agregados.py)."""
+    validar_intervalo(inicio, fim, bucket)
+    ms = int(bucket * 1000)
+    t = {"$subtract": ["$inicio", EPOCA]}
+    # nos agregados, linha/dispositivo/sensor estão no topo: o filtro do dispositivo aplica-se tal como é
+    f = dict(meta or {}, grandeza=grandeza, inicio={"$gte": inicio, "$lt": fim})
+    if sensor is not None: f["sensor"] = sensor
+    pipeline = [
+        {"$match": f},
+        {"$group": {
+            "_id":  {"$subtract": [t, {"$mod": [t, ms]}]},
+            "min":  {"$min": "$min"},
+            "max":  {"$max": "$max"},
+            "soma": {"$sum": "$soma"},
+            "n":    {"$sum": "$n"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        {"timestamp": EPOCA + timedelta(milliseconds=b["_id"]),
+         "min": b["min"], "max": b["max"], "media": b["soma"] / b["n"], "n": b["n"]}
+        for b in col.aggregate(pipeline)
+    ]
+
+
+# --------------------------
+# Bruto: paginação por cursor e NDJSON
+# --------------------------
+def codificar_cursor(doc):
+    bruto = f'{doc["timestamp"].isoformat()}|{doc["_id"]}'
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+def descodificar_cursor(cursor):
+    try:
+        ts, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), ObjectId(oid)
+    except Exception:
+        raise ErroConsulta("Cursor inválido")
+
+# leituras antigas (não migradas) têm os metadados no topo
+PROJECAO = {"timestamp": 1, META: 1, "sensor": 1, "dispositivo": 1}
+
+def _doc(d, campo):
+    out = {"timestamp": d["timestamp"], "valor": d[campo]}
+    m = metadados(d)
+    if "sensor" in m: out["sensor"] = m["sensor"]
+    if "dispositivo" in m: out["dispositivo"] = m["dispositivo"]
+    return out
+
+def pagina(col, campo, inicio, fim, sensor=None, cursor=None, limite=LIMITE_PAGINA, meta=None):
+    """Uma página de documentos por ordem (timestamp, _id) e o cursor da seguinte."""
+    validar_intervalo(inicio, fim)
+    f = filtro(inicio, fim, sensor, meta)
+    if cursor:
+        ts, oid = descodificar_cursor(cursor)
+        f = {"$and": [f, {"$or": [{"timestamp": {"$gt": ts}},
+                                  {"timestamp": ts, "_id": {"$gt": oid}}]}]}
+    docs = list(col.find(f, dict(PROJECAO, **{campo: 1}))
+                   .sort([("timestamp", 1), ("_id", 1)]).limit(limite + 1))
+    seguinte = codificar_cursor(docs[limite - 1]) if len(docs) > limite else None
+    return {"dados": [_doc(d, campo) for d in docs[:limite]], "proximo": seguinte}
+
+def ndjson(col, campo, inicio, fim, sensor=None, meta=None):
+    """Linhas NDJSON com todos os documentos do intervalo (valida já, lê ao iterar)."""
+    validar_intervalo(inicio, fim)
+    cur = (col.find(filtro(inicio, fim, sensor, meta), dict(PROJECAO, **{campo: 1}))
+              .sort("timestamp", 1).batch_size(LOTE_CURSOR))
+    return (_linha(d, campo) for d in cur)
+
+def _linha(d, campo):
+    out = _doc(d, campo)
+    out["timestamp"] = out["timestamp"].isoformat()
+    return (json.dumps(out) + "\n").encode()
+
+
+# --------------------------
+# Reconstrução de leituras comprimidas
+# --------------------------
+MODOS_RECONSTRUCAO = ("auto", "step", "linear")
+
+def reconstruir(col, campo, inicio, fim, passo, modo="auto", sensor=None, meta=None):
+    """
+    Valores em inicio, inicio+passo, ... < fim. Devolve (modo usado, pontos).
+    step: último ponto gravado até t; linear: interpolação entre os pontos
+    vizinhos. Em "auto" usa linear se as leituras vierem de swinging door.
+    As leituras são percorridas pelo cursor ao mesmo tempo que a grelha: em
+    memória ficam só os dois pontos vizinhos de t e a grelha de saída.
+    """
+    if modo not in MODOS_RECONSTRUCAO:
+        raise ErroConsulta(f"Modo inválido ({', '.join(MODOS_RECONSTRUCAO)})")
+    validar_intervalo(inicio, fim, passo)
+    proj = {"timestamp": 1, campo: 1}
+    base = dict(filtro_meta(sensor, meta), **{campo: {"$ne": None}})
+    # ponto anterior ao início e seguinte ao fim: o sinal continua para lá do intervalo
+    antes  = col.find_one(dict(base, timestamp={"$lt": inicio}), proj, sort=[("timestamp", -1)])
+    depois = col.find_one(dict(base, timestamp={"$gte": fim}), proj, sort=[("timestamp", 1)])
+
+    if modo == "auto":
+        janela = {"$gte": antes["timestamp"] if antes else inicio,
+                  "$lte": depois["timestamp"] if depois else fim}
+        sdt = col.find_one(dict(base, timestamp=janela, **{"compressao.modo": "swinging_door"}), {"_id": 1})
+        modo = "linear" if sdt else "step"
+
+    cur = (col.find(dict(base, timestamp={"$gte": inicio, "$lt": fim}), proj)
+              .sort("timestamp", 1).batch_size(LOTE_CURSOR))
+    docs = itertools.chain([antes] if antes else [], cur, [depois] if depois else [])
+
+    pontos = []
+    a, b = None, next(docs, None)    # último ponto <= t e primeiro > t
+    n = int((fim - inicio).total_seconds() // passo)
+    for k in range(n + 1):
+        t = inicio + timedelta(seconds=k * passo)
+        if t >= fim: break
+        while b is not None and b["timestamp"] <= t:
+            a, b = b, next(docs, None)
+        if a is None:
+            valor = None   # sem dados antes de t
+        elif modo == "step" or b is None:
+            valor = a[campo]
+        else:
+            fr = (t - a["timestamp"]) / (b["timestamp"] - a["timestamp"])
+            valor = a[campo] + (b[campo] - a[campo]) * fr
+        pontos.append({"timestamp": t, "valor": valor})
+    return modo, pontos
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Histórico recente em memória (última hora de temperatura, humidade, velocidade).
+
+Cada canal de cada dispositivo tem um buffer circular de capacidade fixa
+sobre dois arrays numpy (timestamp em ms desde a época, int64; valor,
+float64): 16 bytes por ponto, alocados uma vez, sem dicionários por leitura.
+A ingestão junta os lotes ao buffer (leituras fora de ordem ficam só no
+MongoDB) e o arranque preenche-o com as leituras mais recentes da coleção.
+As janelas pedidas pelos dashboards são cortadas com pesquisa binária e,
+se pedido, reduzidas a N buckets de tempo (min/max/média) com operações
+vetoriais, sem ir ao MongoDB.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from indices_mongo import metadados
+
+CAPACIDADE = 7200    # pontos por canal (1 h a 0,5 s)
+HORIZONTE  = 3600    # s carregados no arranque e devolvidos por omissão
+MAX_PONTOS = 5000    # buckets máximos numa resposta decimada
+
+
+def _ms(timestamps):
+    """datetimes UTC sem tzinfo → ms desde a época (int64)."""
+    return np.array(timestamps, dtype="datetime64[ms]").astype(np.int64)
+
+def agora_ms():
+    return int(np.datetime64(datetime.utcnow(), "ms").astype(np.int64))
+
+
+class AnelRecente:
+    """Buffer circular (timestamp_ms, valor) de um canal, ordenado por tempo."""
+
+    def __init__(self, capacidade=CAPACIDADE):
+        self.capacidade = capacidade
+        self._t = np.zeros(capacidade, dtype=np.int64)
+        self._v = np.zeros(capacidade, dtype=np.float64)
+        self._i = 0          # próxima posição a escrever
+        self.n  = 0
+        self.fora_de_ordem = 0
+        self._lock = threading.Lock()   # a ingestão corre na threadpool
+
+    def juntar(self, t_ms, valores):
+        """Junta um lote (arrays ou listas); descarta pontos anteriores ao último guardado."""
+        t = np.asarray(t_ms, dtype=np.int64)
+        v = np.asarray(valores, dtype=np.float64)
+        if len(t) > 1 and np.any(t[1:] < t[:-1]):
+            ordem = np.argsort(t, kind="stable")
+            t, v = t[ordem], v[ordem]
+        with self._lock:
+            if self.n:
+                novos = t >= self._t[self._i - 1]
+                if not novos.all():
+                    self.fora_de_ordem += int(len(t) - novos.sum())
+                    t, v = t[novos], v[novos]
+            if len(t) > self.capacidade:
+                t, v = t[-self.capacidade:], v[-self.capacidade:]
+            k = len(t)
+            if not k: return
+            # no máximo dois cortes: até ao fim do array e o resto a partir do início
+            a = min(k, self.capacidade - self._i)
+            self._t[self._i:self._i + a], self._v[self._i:self._i + a] = t[:a], v[:a]
+            self._t[:k - a], self._v[:k - a] = t[a:], v[a:]
+            self._i = (self._i + k) % self.capacidade
+            self.n = min(self.n + k, self.capacidade)
+
+    def limpar(self):
+        with self._lock:
+            self._i = self.n = 0
+
+    def _ordenado(self):
+        if self.n < self.capacidade:
+            return self._t[:self.n].copy(), self._v[:self.n].copy()
+        return (np.concatenate((self._t[self._i:], self._t[:self._i])),
+                np.concatenate((self._v[self._i:], self._v[:self._i])))
+
+    def janela(self, desde_ms, ate_ms=None):
+        """Pontos com desde_ms <= t (< ate_ms), por ordem cronológica (cópias)."""
+        with self._lock:
+            t, v = self._ordenado()
+        a = np.searchsorted(t, desde_ms, side="left")
+        b = len(t) if ate_ms is None else np.searchsorted(t, ate_ms, side="left")
+        return t[a:b], v[a:b]
+
+    @property
+    def bytes(self):
+        return self._t.nbytes + self._v.nbytes
+
+    def estado(self):
+        with self._lock:
+            t, _ = self._ordenado()
+        return {"pontos": self.n, "capacidade": self.capacidade, "bytes": self.bytes,
+                "fora_de_ordem": self.fora_de_ordem,
+                "mais_antigo": int(t[0]) if len(t) else None,
+                "mais_recente": int(t[-1]) if len(t) else None}
+
+
+def decimar(t, v, pontos):
+    """Reduz a `pontos` buckets de tempo iguais: (t do primeiro ponto, min, max, média)."""
+    limites = np.linspace(t[0], t[-1] + 1, pontos + 1)[:-1]
+    inicios = np.unique(np.searchsorted(t, limites, side="left"))   # sem buckets vazios
+    n = np.diff(np.append(inicios, len(t)))
+    return (t[inicios], np.minimum.reduceat(v, inicios), np.maximum.reduceat(v, inicios),
+            np.add.reduceat(v, inicios) / n)
+
+
+class HistoricoRecente:
+    """Buffers por (dispositivo, canal), criados na primeira leitura de cada um."""
+
+    def __init__(self, canais, capacidade=CAPACIDADE, horizonte=HORIZONTE):
+        self.canais = tuple(canais)
+        self.capacidade = capacidade
+        self.horizonte = horizonte
+        self._aneis = {}
+        self._lock = threading.Lock()
+
+    def anel(self, chave):
+        a = self._aneis.get(chave)
+        if a is None:
+            with self._lock:
+                a = self._aneis.setdefault(chave, AnelRecente(self.capacidade))
+        return a
+
+    def registar(self, canal, docs, campo="valor"):
+        """Junta as leituras gravadas (já com meta.dispositivo) aos buffers de cada dispositivo."""
+        if canal not in self.canais: return
+        por_dispositivo = {}
+        for doc in docs:
+            if doc.get(campo) is None: continue
+            ts, vs = por_dispositivo.setdefault(metadados(doc)["dispositivo"], ([], []))
+            ts.append(doc["timestamp"]); vs.append(doc[campo])
+        for disp_id, (ts, vs) in por_dispositivo.items():
+            self.anel((disp_id, canal)).juntar(_ms(ts), vs)
+
+    def carregar(self, chave, col, campo="valor", filtro=None):
+        """Preenche o buffer com as leituras do último `horizonte` (as mais recentes, se não couberem)."""
+        inicio = datetime.utcnow() - timedelta(seconds=self.horizonte)
+        q = dict(filtro or {}, timestamp={"$gte": inicio}, **{campo: {"$ne": None}})
+        docs = list(col.find(q, {"_id": 0, "timestamp": 1, campo: 1})
+                    .sort("timestamp", -1).limit(self.capacidade).batch_size(self.capacidade))
+        docs.reverse()
+        a = self.anel(chave)
+        a.limpar()
+        if docs:
+            a.juntar(_ms([d["timestamp"] for d in docs]), [d[campo] for d in docs])
+
+    def consultar(self, chave, segundos=None, pontos=None):
+        """Janela dos últimos `segundos` em colunas (t em ms); decimada se tiver mais de `pontos`."""
+        segundos = self.horizonte if segundos is None else segundos
+        a = self._aneis.get(chave)
+        desde = agora_ms() - int(segundos * 1000)
+        t, v = a.janela(desde) if a else (np.zeros(0, np.int64), np.zeros(0))
+        out = {"pontos": len(t), "decimado": False}
+        if pontos and len(t) > pontos:
+            t, mn, mx, media = decimar(t, v, pontos)
+            out.update(decimado=True, buckets=len(t), t=t.tolist(), valor=media.tolist(),
+                       min=mn.tolist(), max=mx.tolist())
+        else:
+            out.update(t=t.tolist(), valor=v.tolist())
+        return out
+
+    def memoria(self):
+        """bytes por (dispositivo, canal) (ex.: /metrics)."""
+        return {k: a.bytes for k, a in list(self._aneis.items())}
+
+    def estado(self):
+        aneis = {f"{d}/{c}": a.estado() for (d, c), a in list(self._aneis.items())}
+        return {"canais": list(self.canais), "capacidade": self.capacidade,
+                "horizonte_s": self.horizonte, "bytes_por_ponto": 16,
+                "bytes_total": sum(e["bytes"] for e in aneis.values()), "buffers": aneis}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Deduplicação das leituras reenviadas pelos coletores.
+
+Cada leitura guardada na fila local de um coletor (windows_services/fila_envio.py)
+leva um id gerado no momento em que é enfileirada (`id_envio`). Se um lote
+chegou ao MongoDB mas a resposta se perdeu (timeout, 5xx depois do insert),
+o coletor reenvia-o com os mesmos ids. A API regista os ids recebidos numa
+coleção normal com _id único (as coleções time-series não garantem unicidade)
+e só grava, conta e agrega as leituras cujo id ainda não existia: um id
+duplicado é um reenvio já aceite e conta como sucesso. Os ids expiram por
+TTL ao fim de VALIDADE; leituras sem id (coletores antigos) passam sempre.
+"""
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+COLECAO  = "ingestao_ids"
+CAMPO    = "id_envio"
+VALIDADE = 7 * 24 * 3600   # s; maior que qualquer reenvio depois de o lote ter chegado
+
+
+def garantir_indices(db):
+    idx = db[COLECAO].create_index([("recebido", ASCENDING)], expireAfterSeconds=VALIDADE)
+    return [f"{COLECAO}: índice {idx} (TTL {VALIDADE} s)"]
+
+
+class RegistoEnvios:
+    """Ids de envio já gravados (reservados antes do insert, libertados se falhar)."""
+
+    def __init__(self, db):
+        self.col   = db[COLECAO]
+        self._lock = threading.Lock()
+        self.novos = 0
+        self.duplicados = 0
+
+    def reservar(self, colecao, docs):
+        """
+        Retira o id de cada documento e devolve (documentos novos, ids reservados).
+        Os documentos com um id já registado (reenvios) ficam de fora.
+        """
+        chaves = [d.pop(CAMPO, None) for d in docs]
+        unicos = list(dict.fromkeys(k for k in chaves if k is not None))
+        if not unicos:
+            return docs, []
+        agora = datetime.utcnow()
+        repetidos = set()
+        try:
+            self.col.insert_many([{"_id": k, "colecao": colecao, "recebido": agora} for k in unicos],
+                                 ordered=False)
+        except BulkWriteError as e:
+            erros = e.details.get("writeErrors", [])
+            if any(w.get("code") != 11000 for w in erros): raise
+            repetidos = {unicos[w["index"]] for w in erros}
+        # o mesmo id duas vezes no próprio lote também é um reenvio
+        novos, vistos = [], set(repetidos)
+        for d, k in zip(docs, chaves):
+            if k is None or k not in vistos:
+                novos.append(d)
+                if k is not None: vistos.add(k)
+        with self._lock:
+            self.novos += len(novos)
+            self.duplicados += len(docs) - len(novos)
+        return novos, [k for k in unicos if k not in repetidos]
+
+    def libertar(self, ids):
+        """O insert falhou: os ids voltam a poder ser gravados no reenvio."""
+        if not ids: return
+        self.col.delete_many({"_id": {"$in": ids}})
+        with self._lock: self.novos -= len(ids)
+
+    def estado(self):
+        return {"novos": self.novos, "duplicados": self.duplicados, "validade_s": VALIDADE}
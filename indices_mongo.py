@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Provisionamento de coleções e índices do ProdSenseBD.
+
+As leituras guardam linha, dispositivo e sensor no subdocumento "meta". Em
+servidores MongoDB >= 5.0 as coleções novas são criadas como time-series
+(timeField=timestamp, metaField=meta): o 5.x só aceita índices secundários
+no timeField e no metaField (e nos seus campos), por isso é aí que ficam os
+campos pelos quais se filtra. No arranque da API garante os índices de que
+as consultas dependem (timestamp, meta.linha + meta.dispositivo + timestamp
+e, onde existe, meta.sensor + timestamp). A linha é o prefixo do índice por
+dispositivo para poder servir de chave de sharding ({meta.linha: 1,
+timestamp: 1}).
+
+Coleções antigas (normais, time-series com outro metaField ou com leituras
+de metadados no topo) só são migradas a pedido, pela linha de comandos:
+
+    python indices_mongo.py --migrar
+    python indices_mongo.py --relatorio
+"""
+import argparse, json
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+# --------------------------
+# Metadados das leituras
+# --------------------------
+META = "meta"                                   # subdocumento / metaField
+CAMPOS_META = ("linha", "dispositivo", "sensor")
+
+def em_meta(campos):
+    """{"linha": x, "sensor": y} → {"meta.linha": x, "meta.sensor": y} (filtros das leituras)."""
+    return {f"{META}.{k}": v for k, v in campos.items()}
+
+def metadados(doc):
+    """Metadados de uma leitura (as gravadas antes do subdocumento têm-nos no topo)."""
+    return doc.get(META) or doc
+
+def expr_meta(*campos):
+    """Expressões de agregação dos metadados (com as leituras antigas: campos no topo)."""
+    return {c: {"$ifNull": [f"${META}.{c}", f"${c}"]} for c in campos}
+
+def com_meta(doc):
+    """Leitura antiga com linha/dispositivo/sensor passados para o subdocumento."""
+    if META not in doc:
+        doc[META] = {c: doc.pop(c) for c in CAMPOS_META if c in doc}
+    return doc
+
+
+# --------------------------
+# Especificação das coleções
+# --------------------------
+# sensor: as leituras têm meta.sensor (índice próprio)
+# índice das leituras de um dispositivo (dispositivos.Dispositivo.filtro_leituras)
+POR_DISPOSITIVO = [(f"{META}.linha", ASCENDING), (f"{META}.dispositivo", ASCENDING),
+                   ("timestamp", DESCENDING)]
+POR_SENSOR = [(f"{META}.sensor", ASCENDING), ("timestamp", DESCENDING)]
+
+COLECOES = {
+    "comunicacao_logger": {
+        "sensor": False,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO],
+    },
+    "temperatura_logger": {
+        "sensor": True,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO, POR_SENSOR],
+    },
+    "humidade_logger": {
+        "sensor": True,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO, POR_SENSOR],
+    },
+    "velocidade_logger": {
+        "sensor": False,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO],
+    },
+    "contador_unidades_logger": {
+        "sensor": True,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO, POR_SENSOR],
+    },
+    "contador_unidades_logger_grandes": {
+        "sensor": True,
+        "indices": [[("timestamp", DESCENDING)], POR_DISPOSITIVO, POR_SENSOR],
+    },
+}
+
+GRANULARIDADE = "seconds"
+LOTE_MIGRACAO = 5000
+
+
+# --------------------------
+# Capacidades do servidor
+# --------------------------
+def versao_servidor(db):
+    try:
+        return tuple(db.client.server_info().get("versionArray", (0,))[:2])
+    except Exception:
+        return (0, 0)
+
+def suporta_timeseries(db):
+    return versao_servidor(db) >= (5, 0)
+
+def _info(db, nome):
+    info = list(db.list_collections(filter={"name": nome}))
+    return info[0] if info else {}
+
+def e_timeseries(db, nome):
+    return _info(db, nome).get("type") == "timeseries"
+
+def meta_field(db, nome):
+    return _info(db, nome).get("options", {}).get("timeseries", {}).get("metaField")
+
+def _opcoes_timeseries():
+    return {"timeField": "timestamp", "metaField": META, "granularity": GRANULARIDADE}
+
+def leituras_antigas(col):
+    """A leitura mais antiga ainda tem os metadados no topo (pelo índice de timestamp)."""
+    d = col.find_one({}, {META: 1}, sort=[("timestamp", ASCENDING)])
+    return d is not None and META not in d
+
+
+# --------------------------
+# Provisionamento
+# --------------------------
+def garantir_colecoes(db, migrar=False):
+    """Cria coleções/índices em falta. Devolve uma lista de ações efetuadas."""
+    acoes = []
+    existentes = set(db.list_collection_names())
+    ts_ok = suporta_timeseries(db)
+
+    for nome, spec in COLECOES.items():
+        col = db[nome]
+        if nome not in existentes and ts_ok:
+            db.create_collection(nome, timeseries=_opcoes_timeseries())
+            acoes.append(f"{nome}: criada como time-series")
+        elif nome in existentes and migrar:
+            if ts_ok and meta_field(db, nome) != META:
+                n = migrar_para_timeseries(db, nome)
+                acoes.append(f"{nome}: migrada para time-series ({n} documentos)")
+            elif not ts_ok:
+                n = normalizar_metadados(col)
+                acoes.append(f"{nome}: metadados de {n} leituras passados para '{META}'")
+        elif nome in existentes and ts_ok and e_timeseries(db, nome) and meta_field(db, nome) != META:
+            # os índices em meta.* não são aceites noutro metaField (5.x)
+            acoes.append(f"{nome}: time-series com metaField {meta_field(db, nome)!r}; "
+                         f"migre com --migrar (índices não criados)")
+            continue
+        elif nome in existentes and leituras_antigas(col):
+            acoes.append(f"{nome}: leituras com metadados no topo; migre com --migrar")
+
+        for chaves in spec["indices"]:
+            idx = col.create_index(chaves)   # idempotente se já existir
+            acoes.append(f"{nome}: índice {idx}")
+    return acoes
+
+
+def migrar_para_timeseries(db, nome):
+    """
+    Passa a coleção para <nome>_legado_<data>, cria a time-series com o nome
+    original e copia os documentos em lotes, com os metadados no subdocumento.
+    A coleção legada fica intacta para verificação e pode ser apagada à mão depois.
+    """
+    legado = f"{nome}_legado_{datetime.utcnow():%Y%m%d%H%M}"
+    if e_timeseries(db, nome):
+        # uma time-series não pode ser renomeada: é copiada ($out) e apagada
+        db[nome].aggregate([{"$out": legado}], allowDiskUse=True)
+        db[nome].drop()
+    else:
+        db[nome].rename(legado)
+    db.create_collection(nome, timeseries=_opcoes_timeseries())
+
+    destino, lote, total = db[nome], [], 0
+    for doc in db[legado].find({"timestamp": {"$type": "date"}}).sort("timestamp", ASCENDING):
+        lote.append(com_meta(doc))
+        if len(lote) >= LOTE_MIGRACAO:
+            destino.insert_many(lote, ordered=False)
+            total += len(lote); lote = []
+    if lote:
+        destino.insert_many(lote, ordered=False)
+        total += len(lote)
+    return total
+
+
+def normalizar_metadados(col):
+    """Coleção normal: passa os metadados das leituras antigas para o subdocumento."""
+    antigas = {META: {"$exists": False}}
+    n = col.update_many(antigas, {"$rename": {c: f"{META}.{c}" for c in CAMPOS_META}}).modified_count
+    # leituras anteriores ao registo de dispositivos, sem nenhum dos campos
+    n += col.update_many(antigas, {"$set": {META: {}}}).modified_count
+    return n
+
+
+# --------------------------
+# Verificação dos planos de consulta
+# --------------------------
+def _resumo_plano(plano):
+    """Extrai estágios e índices usados de um plano de explain()."""
+    estagios, indices = [], []
+    def visitar(no):
+        if isinstance(no, dict):
+            if "stage" in no:
+                estagios.append(no["stage"])
+            if "indexName" in no:
+                indices.append(no["indexName"])
+            for v in no.values():
+                visitar(v)
+        elif isinstance(no, list):
+            for v in no:
+                visitar(v)
+    visitar(plano.get("queryPlanner", {}).get("winningPlan", plano))
+    return {"estagios": estagios, "indices": indices,
+            "collscan": "COLLSCAN" in estagios}
+
+
+def consultas_da_api(db):
+    """Consultas em que a API se apoia, por coleção."""
+    consultas = []
+    for nome, spec in COLECOES.items():
+        col = db[nome]
+        consultas.append((nome, "ultima leitura",
+                          col.find().sort("timestamp", DESCENDING).limit(1)))
+        consultas.append((nome, "historico (intervalo)",
+                          col.find({"timestamp": {"$gte": datetime(2000, 1, 1)}}).sort("timestamp", ASCENDING)))
+        consultas.append((nome, "ultima leitura por dispositivo",
+                          col.find(em_meta({"linha": "?", "dispositivo": "?"}))
+                             .sort("timestamp", DESCENDING).limit(1)))
+        if spec["sensor"]:
+            consultas.append((nome, "ultima leitura por sensor",
+                              col.find(em_meta({"sensor": "?"})).sort("timestamp", DESCENDING).limit(1)))
+            consultas.append((nome, "historico por sensor",
+                              col.find(dict(em_meta({"sensor": "?"}), timestamp={"$gte": datetime(2000, 1, 1)}))
+                                 .sort("timestamp", ASCENDING)))
+    return consultas
+
+
+def relatorio_planos(db):
+    relatorio = []
+    for nome, descricao, cursor in consultas_da_api(db):
+        try:
+            resumo = _resumo_plano(cursor.explain())
+        except Exception as e:
+            resumo = {"erro": str(e)}
+        relatorio.append({
+            "colecao": nome,
+            "consulta": descricao,
+            "timeseries": e_timeseries(db, nome),
+            **resumo,
+        })
+    return relatorio
+
+
+# --------------------------
+# Linha de comandos
+# --------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Provisiona coleções e índices do ProdSenseBD")
+    ap.add_argument("--uri", default="mongodb://localhost:27017/")
+    ap.add_argument("--db", default="ProdSenseBD")
+    ap.add_argument("--migrar", action="store_true",
+                    help="migra coleções existentes para time-series")
+    ap.add_argument("--relatorio", action="store_true",
+                    help="mostra os planos das consultas usadas pela API")
+    args = ap.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    print(f"MongoDB {'.'.join(map(str, versao_servidor(db)))} "
+          f"(time-series: {'sim' if suporta_timeseries(db) else 'não'})")
+    for acao in garantir_colecoes(db, migrar=args.migrar):
+        print(" -", acao)
+    if args.relatorio:
+        print(json.dumps(relatorio_planos(db), indent=2, ensure_ascii=False))
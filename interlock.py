@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Interlock de segurança do tapete: entrada do canal 4 (registo 17) → saída 26.
+
+Um motor por dispositivo lê a entrada e a saída numa só transação, com um
+período curto (por omissão 50 ms, no máximo 100 ms) e numa ligação Modbus
+persistente só sua: as leituras não esperam pelo snapshot nem pelos pulsos
+do humidificador. Só atua nas transições:
+  - canal 4 passa a 0 (ou a saída volta a ligar com o canal 4 a 0): escreve
+    0 na saída pela fila de comandos, com prioridade de segurança, e relê a
+    saída até confirmar que desligou (repete a escrita se não desligou);
+  - enquanto o canal 4 estiver a 0 e a saída não desligar, volta a disparar
+    com backoff (REPETICAO_MIN, a duplicar até REPETICAO_MAX);
+  - a escrita de segurança só é esperada durante ESPERA_ESCRITA: com a fila
+    parada ou bloqueada o disparo fica por confirmar e as leituras continuam;
+  - canal 4 volta a 1: rearme (o tapete não é religado automaticamente).
+Cada disparo fica com o tempo de reação (deteção → saída confirmada a 0) e
+é entregue a `ao_disparar` para a auditoria (coleção interlock_disparos).
+"""
+import asyncio, time
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+from modbus_conexao import ErroModbus
+from fila_comandos import SEGURANCA
+
+COLECAO = "interlock_disparos"
+
+PERIODO_MAX  = 0.1   # s
+CONFIRMACOES = 3     # tentativas de escrita + releitura por disparo
+REPETICAO_MIN = 0.2  # s até voltar a disparar com a saída ainda ligada (duplica a cada falha)
+REPETICAO_MAX = 5.0
+ESPERA_ESCRITA = 1.0 # s à espera da fila de comandos por cada escrita de segurança
+
+
+def garantir_indices(db):
+    idx = db[COLECAO].create_index([("dispositivo", ASCENDING), ("timestamp", DESCENDING)])
+    return [f"{COLECAO}: índice {idx}"]
+
+
+class MotorInterlock:
+    """Vigia o canal 4 e força a saída do tapete a 0 nas transições para segurança."""
+
+    def __init__(self, modbus, comandos, entrada, saida, periodo=0.05,
+                 confirmacoes=CONFIRMACOES, ao_disparar=None, ao_ciclo=None,
+                 repeticao_min=REPETICAO_MIN, repeticao_max=REPETICAO_MAX,
+                 espera_escrita=ESPERA_ESCRITA):
+        if not 0 < periodo <= PERIODO_MAX:
+            raise ValueError(f"Período do interlock fora de ]0, {PERIODO_MAX}] s")
+        self.modbus   = modbus         # ligação própria (só leituras)
+        self.comandos = comandos       # escritas pela fila do dispositivo
+        self.entrada, self.saida = entrada, saida
+        self.periodo  = periodo
+        self.confirmacoes = confirmacoes
+        self.repeticao_min, self.repeticao_max = repeticao_min, repeticao_max
+        self.espera_escrita = espera_escrita
+        self.ao_disparar = ao_disparar # callback(dict do disparo) (ex.: auditoria no Mongo)
+        self.ao_ciclo    = ao_ciclo    # callback(intervalo_s) entre leituras (ex.: /metrics)
+        self._tarefa  = None
+
+        self.seguranca_ativa = None    # None até à primeira leitura
+        self._saida   = None           # saída na leitura anterior
+        self._repetir_em = 0.0         # monotonic do próximo disparo com a saída ainda ligada
+        self._repeticao  = repeticao_min
+        self.ciclos = self.falhas_leitura = 0
+        self.disparos = self.nao_confirmados = self.repeticoes = self.rearmes = 0
+        self.escritas_expiradas = 0
+        self._reacao_soma = self._reacao_max = 0.0
+        self._intervalo_max = 0.0
+        self.ultimo_disparo = None
+
+    # --------------------------
+    # Ciclo
+    # --------------------------
+    async def _ler(self):
+        t0 = time.monotonic()
+        regs = await self.modbus.ler_registos(self.entrada, self.saida - self.entrada + 1)
+        entrada, saida = regs[0], regs[-1]
+        # a leitura também atualiza o estado conhecido da fila (evita escritas repetidas)
+        self.comandos.observar({self.entrada: entrada, self.saida: saida}, t0)
+        return entrada, saida
+
+    async def _loop(self):
+        t0 = time.monotonic()
+        k, ultima = 0, None
+        while True:
+            espera = t0 + k * self.periodo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            # se atrasou (ex.: FieldLogger lento), segue o calendário sem recuperar leituras
+            k = max(k + 1, int((time.monotonic() - t0) / self.periodo) + 1)
+
+            try:
+                entrada, saida = await self._ler()
+            except ErroModbus:
+                self.falhas_leitura += 1
+                continue
+            agora = time.monotonic()
+            self.ciclos += 1
+            if ultima is not None:
+                intervalo = agora - ultima
+                if intervalo > self._intervalo_max: self._intervalo_max = intervalo
+                if self.ao_ciclo: self.ao_ciclo(intervalo)
+
+            seguranca = entrada == 0
+            janela = agora - ultima if ultima else 0.0
+            if seguranca and (self.seguranca_ativa is False or (saida != 0 and saida != self._saida)):
+                # transição do canal 4, ou saída religada com a segurança ativa (ex.: escrita manual)
+                motivo = "saida_ligada" if self.seguranca_ativa else "canal_4"
+                await self._disparar(motivo, saida, agora, janela)
+            elif seguranca and saida != 0 and agora >= self._repetir_em:
+                # a saída continua ligada depois de um disparo não confirmado: volta a
+                # disparar, com backoff para não inundar a fila nem a auditoria
+                self.repeticoes += 1
+                await self._disparar("repeticao", saida, agora, janela)
+            elif not seguranca and self.seguranca_ativa:
+                self.rearmes += 1
+                self._repeticao = self.repeticao_min
+            self.seguranca_ativa, self._saida = seguranca, saida
+            ultima = agora
+
+    async def _disparar(self, motivo, saida_antes, detetado, janela):
+        """Força a saída a 0 e confirma por releitura; regista o tempo de reação."""
+        tentativas, confirmado = 0, saida_antes == 0
+        while not confirmado and tentativas < self.confirmacoes:
+            tentativas += 1
+            try:
+                await asyncio.wait_for(self.comandos.escrever_registo(self.saida, 0, SEGURANCA),
+                                       self.espera_escrita)
+                confirmado = await self.modbus.ler_registo(self.saida) == 0
+            except asyncio.TimeoutError:
+                # fila parada ou bloqueada: insistir agora só atrasava as leituras;
+                # a repetição com backoff volta a tentar
+                self.escritas_expiradas += 1
+                self.comandos.esquecer(("registo", self.saida))
+                break
+            except ErroModbus:
+                pass
+            if not confirmado:
+                self.comandos.esquecer(("registo", self.saida))   # a próxima escrita não é saltada
+        reacao = time.monotonic() - detetado
+        if confirmado:
+            self._repeticao = self.repeticao_min
+        else:
+            self._repetir_em = time.monotonic() + self._repeticao
+            self._repeticao = min(self._repeticao * 2, self.repeticao_max)
+
+        self.disparos += 1
+        if not confirmado: self.nao_confirmados += 1
+        self._reacao_soma += reacao
+        if reacao > self._reacao_max: self._reacao_max = reacao
+        self.ultimo_disparo = {
+            "timestamp": datetime.utcnow(),
+            "motivo": motivo,
+            "saida_antes": saida_antes,
+            "tentativas": tentativas,
+            "confirmado": confirmado,
+            "reacao_ms": round(reacao * 1000, 2),
+            "janela_detecao_ms": round(janela * 1000, 2),   # desde a leitura anterior
+        }
+        if self.ao_disparar: self.ao_disparar(dict(self.ultimo_disparo))
+
+    # --------------------------
+    # Ciclo de vida e estado
+    # --------------------------
+    @property
+    def ativo(self):
+        return self._tarefa is not None and not self._tarefa.done()
+
+    def iniciar(self):
+        if self.ativo:
+            return
+        self._tarefa = asyncio.get_running_loop().create_task(
+            self._loop(), name=f"interlock-{self.modbus.ip}:{self.modbus.porta}")
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        self.modbus.fechar()
+
+    def estado(self):
+        n = self.disparos or 1
+        return {
+            "ativo": self.ativo,
+            "periodo_ms": round(self.periodo * 1000, 1),
+            "intervalo_max_ms": round(self._intervalo_max * 1000, 2),
+            "seguranca_ativa": self.seguranca_ativa,
+            "ciclos": self.ciclos,
+            "falhas_leitura": self.falhas_leitura,
+            "disparos": self.disparos,
+            "nao_confirmados": self.nao_confirmados,
+            "repeticoes": self.repeticoes,
+            "escritas_expiradas": self.escritas_expiradas,
+            "rearmes": self.rearmes,
+            "reacao_media_ms": round(self._reacao_soma / n * 1000, 2),
+            "reacao_max_ms": round(self._reacao_max * 1000, 2),
+            "ultimo_disparo": self.ultimo_disparo,
+        }
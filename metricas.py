@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Métricas da API em formato de texto Prometheus (/metrics).
+
+Implementação mínima, sem dependências: contadores, histogramas e medidores
+calculados no momento da recolha. Cada observação é uma pesquisa binária
+nos limites e um incremento sob lock, por isso a instrumentação pode ficar
+ligada em produção. Inclui:
+  - um listener de comandos do pymongo (latência por comando e coleção);
+  - um middleware ASGI (latência por rota, método e código de estado).
+"""
+import threading, time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+# limites (s) por omissão: de 0,5 ms a 5 s
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _etiquetas(nomes, valores, extra=""):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra: pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _escapar(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+# --------------------------
+# Tipos de métrica
+# --------------------------
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, etiquetas=()):
+        self.nome, self.ajuda, self.etiquetas = nome, ajuda, tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, n=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def linhas(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        for valores, v in itens:
+            yield f"{self.nome}{_etiquetas(self.etiquetas, valores)} {_num(v)}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.nome, self.ajuda, self.etiquetas = nome, ajuda, tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}    # valores das etiquetas -> [contagens por limite..., +Inf], soma
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        i = bisect_left(self.limites, valor)
+        with self._lock:
+            s = self._series.get(valores)
+            if s is None:
+                s = self._series[valores] = [[0] * (len(self.limites) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += valor
+
+    def linhas(self):
+        with self._lock:
+            itens = [(k, list(c), soma) for k, (c, soma) in self._series.items()]
+        les = [f'le="{limite}"' for limite in self.limites] + ['le="+Inf"']
+        for valores, contagens, soma in itens:
+            acum = 0
+            for le, c in zip(les, contagens):
+                acum += c
+                yield f"{self.nome}_bucket{_etiquetas(self.etiquetas, valores, le)} {acum}"
+            yield f"{self.nome}_sum{_etiquetas(self.etiquetas, valores)} {_num(soma)}"
+            yield f"{self.nome}_count{_etiquetas(self.etiquetas, valores)} {acum}"
+
+
+class Medidor:
+    """
+    Valor lido no momento da recolha: funcao() -> número ou {etiquetas: número}.
+    tipo="counter" para totais mantidos fora do registo (ex.: CPU do processo).
+    """
+
+    def __init__(self, nome, ajuda, funcao, etiquetas=(), tipo="gauge"):
+        self.nome, self.ajuda, self.etiquetas = nome, ajuda, tuple(etiquetas)
+        self.funcao = funcao
+        self.tipo = tipo
+
+    def linhas(self):
+        try:
+            v = self.funcao()
+        except Exception:
+            return
+        itens = v.items() if isinstance(v, dict) else [((), v)]
+        for valores, x in itens:
+            if not isinstance(valores, tuple): valores = (valores,)
+            yield f"{self.nome}{_etiquetas(self.etiquetas, valores)} {_num(x)}"
+
+
+class Registo:
+    """Conjunto de métricas exportadas em /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, *a, **kw):   return self._juntar(Contador(*a, **kw))
+    def histograma(self, *a, **kw): return self._juntar(Histograma(*a, **kw))
+    def medidor(self, *a, **kw):    return self._juntar(Medidor(*a, **kw))
+
+    def _juntar(self, m):
+        self._metricas.append(m)
+        return m
+
+    def exportar(self):
+        out = []
+        for m in self._metricas:
+            out.append(f"# HELP {m.nome} {m.ajuda}")
+            out.append(f"# TYPE {m.nome} {m.tipo}")
+            out.extend(m.linhas())
+        return "\n".join(out) + "\n"
+
+
+# --------------------------
+# MongoDB: latência por comando e coleção
+# --------------------------
+class OuvinteMongo(monitoring.CommandListener):
+    """Regista a duração de cada comando enviado ao MongoDB (insert, find, aggregate...)."""
+
+    def __init__(self, histograma, erros):
+        self.histograma = histograma
+        self.erros = erros
+        self._colecoes = {}   # request_id -> coleção (o evento de fim não a traz)
+
+    def started(self, event):
+        col = event.command.get(event.command_name)
+        self._colecoes[event.request_id] = col if isinstance(col, str) else ""
+
+    def succeeded(self, event):
+        col = self._colecoes.pop(event.request_id, "")
+        self.histograma.observar(event.duration_micros / 1e6, event.command_name, col)
+
+    def failed(self, event):
+        col = self._colecoes.pop(event.request_id, "")
+        self.histograma.observar(event.duration_micros / 1e6, event.command_name, col)
+        self.erros.inc(event.command_name, col)
+
+
+# --------------------------
+# HTTP: latência por rota (middleware ASGI)
+# --------------------------
+class MiddlewareLatencia:
+    """
+    Mede o tempo até ao início da resposta (cabeçalhos) de cada pedido HTTP.
+    Usa o caminho da rota (ex.: /historico/{grandeza}) para não criar uma
+    série por URL; pedidos sem rota ficam como "sem_rota".
+    """
+
+    def __init__(self, app, histograma, erros):
+        self.app = app
+        self.histograma = histograma
+        self.erros = erros
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        iniciada = False
+
+        async def enviar(msg):
+            nonlocal iniciada
+            if msg["type"] == "http.response.start":
+                iniciada = True
+                self._medir(scope, msg["status"], time.perf_counter() - t0)
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception:
+            if not iniciada:
+                self._medir(scope, 500, time.perf_counter() - t0)
+            raise
+
+    def _medir(self, scope, estado, duracao):
+        rota = getattr(scope.get("route"), "path", "sem_rota")
+        self.histograma.observar(duracao, scope["method"], rota, str(estado))
+        if estado >= 500:
+            self.erros.inc(scope["method"], rota, str(estado))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Gestor de ligação Modbus TCP persistente para o FieldLogger (asyncio).
+
+Cada dispositivo tem um único AsyncModbusTcpClient que fica ligado entre
+pedidos. As transações são serializadas por um asyncio.Lock (o FieldLogger
+responde a uma transação de cada vez), a religação é feita com backoff
+exponencial e a latência de cada chamada fica registada para consulta.
+Nenhuma operação bloqueia o event loop: quem espera pela ligação cede a vez.
+"""
+import asyncio, time
+from contextlib import asynccontextmanager
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException, ModbusIOException
+
+
+class ErroModbus(Exception):
+    """Falha de ligação ou resposta de erro do FieldLogger."""
+
+
+class GestorModbus:
+    """Ligação Modbus TCP partilhada, com religação e estatísticas de latência."""
+
+    def __init__(self, ip, porta=502, unit_id=1, timeout=1.0,
+                 backoff_min=0.5, backoff_max=10.0, ao_medir=None):
+        self.ip       = ip
+        self.porta    = porta
+        self.unit_id  = unit_id
+        self.timeout  = timeout
+        self._client  = None        # criado no event loop, na primeira ligação
+        self._lock    = asyncio.Lock()
+        self._dono    = None        # tarefa que reservou a ligação com transacao()
+
+        # backoff de religação (s)
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._backoff     = 0.0
+        self._proxima_tentativa = 0.0
+
+        # estatísticas por operação: connect, read, write_register, write_coil
+        self._stats = {}
+        self.religacoes = 0
+        # callback(op, registo, duracao_s, resultado) com resultado ok/erro/timeout (ex.: /metrics)
+        self.ao_medir = ao_medir
+
+    # --------------------------
+    # Ligação
+    # --------------------------
+    @property
+    def ligado(self):
+        return self._client is not None and self._client.connected
+
+    async def _garantir_ligacao(self):
+        if self.ligado:
+            return
+        if self._client is None:
+            # reconnect_delay=0: a religação é gerida aqui, com backoff próprio
+            self._client = AsyncModbusTcpClient(self.ip, port=self.porta, timeout=self.timeout,
+                                                retries=0, reconnect_delay=0)
+        agora = time.monotonic()
+        if agora < self._proxima_tentativa:
+            raise ErroModbus("Falha conexão Modbus (a aguardar nova tentativa)")
+
+        t0 = time.perf_counter()
+        ok = await self._client.connect()
+        self._registar("connect", time.perf_counter() - t0, ok)
+        if not ok:
+            self._backoff = min(max(self._backoff * 2, self._backoff_min), self._backoff_max)
+            self._proxima_tentativa = agora + self._backoff
+            raise ErroModbus("Falha conexão Modbus")
+        self._backoff = 0.0
+        self.religacoes += 1
+
+    def fechar(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    @asynccontextmanager
+    async def _reservar(self):
+        # reentrante para a tarefa que já reservou a ligação (ex.: dentro de transacao())
+        if self._dono is asyncio.current_task():
+            yield
+            return
+        async with self._lock:
+            self._dono = asyncio.current_task()
+            try:
+                yield
+            finally:
+                self._dono = None
+
+    @asynccontextmanager
+    async def transacao(self):
+        """Reserva a ligação para uma sequência de operações (ex.: pulsos)."""
+        async with self._reservar():
+            yield self
+
+    # --------------------------
+    # Execução com medição
+    # --------------------------
+    def _registar(self, op, duracao, ok, end=None, resultado=None):
+        s = self._stats.get(op)
+        if s is None:
+            s = self._stats[op] = {"n": 0, "erros": 0, "total_s": 0.0, "max_s": 0.0, "ultimo_s": 0.0}
+        s["n"] += 1
+        s["total_s"] += duracao
+        s["ultimo_s"] = duracao
+        if duracao > s["max_s"]: s["max_s"] = duracao
+        if not ok: s["erros"] += 1
+        if self.ao_medir:
+            self.ao_medir(op, end, duracao, resultado or ("ok" if ok else "erro"))
+
+    async def _executar(self, op, fn, end=None):
+        """Executa `await fn(client)` com a ligação garantida; repete uma vez se o socket caiu."""
+        async with self._reservar():
+            for tentativa in (1, 2):
+                await self._garantir_ligacao()
+                t0 = time.perf_counter()
+                try:
+                    rsp = await fn(self._client)
+                except (ModbusException, OSError, asyncio.TimeoutError) as e:
+                    if isinstance(e.__cause__, asyncio.CancelledError):
+                        # o pymodbus converte o cancelamento da tarefa em ModbusIOException
+                        raise e.__cause__
+                    sem_resposta = isinstance(e, (ModbusIOException, asyncio.TimeoutError))
+                    self._registar(op, time.perf_counter() - t0, False, end,
+                                   "timeout" if sem_resposta else "erro")
+                    # ligação morta (ex.: o FieldLogger fechou o socket inativo)
+                    self._client.close()
+                    if tentativa == 2:
+                        raise ErroModbus(f"Falha conexão Modbus: {e}") from e
+                    continue
+                ok = not rsp.isError()
+                self._registar(op, time.perf_counter() - t0, ok, end)
+                if not ok:
+                    raise ErroModbus(f"Erro Modbus em {op}")
+                return rsp
+
+    # --------------------------
+    # Operações
+    # --------------------------
+    async def ler_registos(self, end, qtd=1):
+        rsp = await self._executar("read", lambda c: c.read_holding_registers(
+            address=end, count=qtd, slave=self.unit_id), end)
+        return list(rsp.registers)
+
+    async def ler_registo(self, end):
+        return (await self.ler_registos(end, 1))[0]
+
+    async def escrever_registo(self, end, valor):
+        await self._executar("write_register", lambda c: c.write_register(
+            end, valor, slave=self.unit_id), end)
+
+    async def escrever_coil(self, end, valor):
+        await self._executar("write_coil", lambda c: c.write_coil(
+            end, bool(valor), slave=self.unit_id), end)
+
+    def estatisticas(self):
+        ops = {
+            op: {
+                "chamadas": s["n"],
+                "erros": s["erros"],
+                "ultimo_ms": round(s["ultimo_s"] * 1000, 2),
+                "medio_ms": round(s["total_s"] / s["n"] * 1000, 2) if s["n"] else 0.0,
+                "max_ms": round(s["max_s"] * 1000, 2),
+            }
+            for op, s in self._stats.items()
+        }
+        return {
+            "dispositivo": f"{self.ip}:{self.porta}",
+            "ligado": self.ligado,
+            "religacoes": self.religacoes,
+            "operacoes": ops,
+        }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Motor de snapshot de registos Modbus.
+
+Em vez de ler cada registo com uma transação própria, o motor agrupa os
+endereços configurados em blocos contíguos e lê-os com o menor número
+possível de `read_holding_registers`. O resultado de cada ciclo é publicado
+como um Snapshot imutável (versão + timestamp), para que todos os valores
+de um ciclo sejam coerentes entre si. O ciclo corre como tarefa asyncio.
+"""
+import asyncio, time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from modbus_conexao import ErroModbus
+
+MAX_REGISTOS_POR_LEITURA = 125   # limite do protocolo Modbus para FC03
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    versao: int
+    timestamp: datetime                          # UTC, fim do ciclo de leitura
+    registos: dict = field(default_factory=dict) # endereço -> valor
+    duracao_ms: float = 0.0
+    completo: bool = True                        # False se algum bloco falhou
+    monotonic: float = 0.0
+
+    def idade(self):
+        return time.monotonic() - self.monotonic
+
+
+def planear_blocos(enderecos, max_lacuna=10, max_qtd=MAX_REGISTOS_POR_LEITURA):
+    """
+    Agrupa endereços em blocos (inicio, quantidade).
+    Dois endereços ficam no mesmo bloco se a lacuna entre eles for <= max_lacuna,
+    já que ler alguns registos a mais custa menos do que outra transação.
+    """
+    blocos = []
+    for end in sorted(set(enderecos)):
+        if blocos:
+            inicio, qtd = blocos[-1]
+            fim = inicio + qtd - 1
+            if end - fim - 1 <= max_lacuna and end - inicio + 1 <= max_qtd:
+                blocos[-1] = (inicio, end - inicio + 1)
+                continue
+        blocos.append((end, 1))
+    return blocos
+
+
+class MotorSnapshot:
+    """Lê periodicamente os blocos configurados e publica o último Snapshot."""
+
+    def __init__(self, modbus, enderecos, periodo=0.5, max_lacuna=10):
+        self.modbus   = modbus
+        self.periodo  = periodo
+        self.blocos   = planear_blocos(enderecos, max_lacuna)
+        self._atual   = None
+        self._versao  = 0
+        self._nova    = asyncio.Event()   # substituído a cada publicação
+        self._tarefa  = None
+        self.ciclos_falhados = 0
+
+    # --------------------------
+    # Ciclo de leitura
+    # --------------------------
+    async def ler_ciclo(self):
+        """Lê todos os blocos e publica o snapshot resultante (devolve-o)."""
+        t0 = time.perf_counter()
+        registos, completo = {}, True
+        for inicio, qtd in self.blocos:
+            try:
+                valores = await self.modbus.ler_registos(inicio, qtd)
+            except ErroModbus:
+                completo = False
+                continue
+            registos.update(zip(range(inicio, inicio + qtd), valores))
+
+        if not registos:
+            self.ciclos_falhados += 1
+            return None
+
+        self._versao += 1
+        self._atual = Snapshot(
+            versao=self._versao,
+            timestamp=datetime.utcnow(),
+            registos=registos,
+            duracao_ms=round((time.perf_counter() - t0) * 1000, 2),
+            completo=completo,
+            monotonic=time.monotonic(),
+        )
+        nova, self._nova = self._nova, asyncio.Event()
+        nova.set()
+        return self._atual
+
+    async def _loop(self, atraso=0.0):
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+        proximo = time.monotonic()
+        while True:
+            await self.ler_ciclo()
+            proximo += self.periodo
+            espera = proximo - time.monotonic()
+            if espera < 0:
+                # atrasado (ex.: FieldLogger offline) → realinha em vez de acumular
+                proximo, espera = time.monotonic(), 0
+            await asyncio.sleep(espera)
+
+    def iniciar(self, atraso=0.0):
+        """Arranca o ciclo; `atraso` (s) desfasa o primeiro ciclo (vários dispositivos)."""
+        if self._tarefa and not self._tarefa.done():
+            return
+        self._tarefa = asyncio.get_running_loop().create_task(
+            self._loop(atraso), name=f"snapshot-modbus-{self.modbus.ip}:{self.modbus.porta}")
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    # --------------------------
+    # Consulta
+    # --------------------------
+    @property
+    def atual(self):
+        return self._atual
+
+    def valor(self, end, idade_max=None):
+        """Valor do registo no último snapshot, ou None se ausente/antigo."""
+        snap = self._atual
+        if snap is None or end not in snap.registos:
+            return None
+        if idade_max is not None and snap.idade() > idade_max:
+            return None
+        return snap.registos[end]
+
+    async def esperar_nova(self, versao, timeout=None):
+        """Espera até existir um snapshot com versão > `versao` (None se expirar)."""
+        if self._versao <= versao:
+            try:
+                await asyncio.wait_for(self._nova.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._atual
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Pisca da luz de alerta (registo 27) comandado pela API.
+
+Uma única tarefa asyncio percorre o padrão escolhido com um calendário absoluto
+(t0 + k * período), pelo que o erro de cada passo não se acumula. Cada
+escrita usa a ligação Modbus persistente e a deriva entre o instante
+pedido e o instante real fica registada.
+"""
+import asyncio, time
+
+from modbus_conexao import ErroModbus
+
+# sequência de estados da luz, um por período
+PADROES = {
+    "pisca":   [1, 0],
+    "rapido":  [1, 0, 1, 0, 0, 0],
+    "fixo":    [1],
+}
+
+PERIODO_MIN = 0.05   # s
+PERIODO_MAX = 10.0   # s
+
+
+class PiscaAlarme:
+    """Agenda as escritas do padrão de pisca e mede a deriva temporal."""
+
+    def __init__(self, modbus, registo, padrao="pisca", periodo=0.6, ao_mudar=None):
+        self.modbus   = modbus
+        self.registo  = registo
+        self.padrao   = padrao
+        self.periodo  = periodo
+        self.ao_mudar = ao_mudar       # callback(estado) quando inicia/para
+        self._tarefa  = None
+        self._lock    = asyncio.Lock()
+        self._repor_estatisticas()
+
+    def _repor_estatisticas(self):
+        self.passos        = 0
+        self.passos_saltados = 0
+        self.erros         = 0
+        self._deriva_soma  = 0.0
+        self._deriva_max   = 0.0
+        self._deriva_ultima = 0.0
+
+    @property
+    def ativo(self):
+        return self._tarefa is not None and not self._tarefa.done()
+
+    # --------------------------
+    # Controlo
+    # --------------------------
+    async def _cancelar(self):
+        if self.ativo:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+        self._tarefa = None
+
+    async def iniciar(self, padrao=None, periodo=None):
+        """Inicia o pisca (ou altera padrão/período se já estiver ativo)."""
+        if padrao is not None and padrao not in PADROES:
+            raise ValueError(f"Padrão desconhecido: {padrao}")
+        if periodo is not None and not PERIODO_MIN <= periodo <= PERIODO_MAX:
+            raise ValueError(f"Período fora de [{PERIODO_MIN}, {PERIODO_MAX}] s")
+        if padrao is not None: self.padrao = padrao
+        if periodo is not None: self.periodo = periodo
+
+        async with self._lock:
+            await self._cancelar()
+            self._repor_estatisticas()
+            self._tarefa = asyncio.get_running_loop().create_task(self._loop(), name="pisca-alarme")
+        if self.ao_mudar: self.ao_mudar(self.estado())
+
+    async def parar(self):
+        """Para o pisca e garante a luz desligada."""
+        async with self._lock:
+            await self._cancelar()
+        try:
+            await self.modbus.escrever_registo(self.registo, 0)
+        except ErroModbus:
+            self.erros += 1
+        if self.ao_mudar: self.ao_mudar(self.estado())
+
+    # --------------------------
+    # Ciclo
+    # --------------------------
+    async def _loop(self):
+        sequencia = PADROES[self.padrao]
+        periodo   = self.periodo
+        t0        = time.monotonic()
+        k, anterior = 0, None
+        while True:
+            alvo = t0 + k * periodo
+            espera = alvo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+
+            valor = sequencia[k % len(sequencia)]
+            if valor != anterior:
+                try:
+                    await self.modbus.escrever_registo(self.registo, valor)
+                    anterior = valor
+                except ErroModbus:
+                    self.erros += 1
+                    anterior = None   # estado desconhecido, volta a escrever no próximo passo
+
+            deriva = time.monotonic() - alvo
+            self.passos += 1
+            self._deriva_soma += abs(deriva)
+            self._deriva_ultima = deriva
+            if abs(deriva) > self._deriva_max: self._deriva_max = abs(deriva)
+
+            # se um passo atrasou mais que um período, salta em vez de "recuperar" a correr
+            k_seguinte = int((time.monotonic() - t0) / periodo) + 1
+            self.passos_saltados += max(0, k_seguinte - k - 1)
+            k = max(k + 1, k_seguinte)
+
+    def estado(self):
+        n = self.passos or 1
+        return {
+            "ativo": self.ativo,
+            "registo": self.registo,
+            "padrao": self.padrao,
+            "periodo_s": self.periodo,
+            "passos": self.passos,
+            "passos_saltados": self.passos_saltados,
+            "erros": self.erros,
+            "deriva_media_ms": round(self._deriva_soma / n * 1000, 2),
+            "deriva_max_ms": round(self._deriva_max * 1000, 2),
+            "deriva_ultima_ms": round(self._deriva_ultima * 1000, 2),
+        }
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Serialização JSON da API.
+
+Usa o orjson quando está instalado (opcional: `pip install orjson`) e o
+módulo json da biblioteca padrão caso contrário; o resultado é o mesmo
+(datetimes em ISO 8601, ObjectId e afins como texto). RespostaJSON é a
+classe de resposta por omissão da API: as rotas que devolvem listas grandes
+entregam-lhe o conteúdo diretamente, sem passar pelo jsonable_encoder.
+"""
+import json
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _por_omissao(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    return str(o)
+
+if orjson is not None:
+    _OPCOES = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_por_omissao, option=_OPCOES)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_por_omissao, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+def dumps_str(obj) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
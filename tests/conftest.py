@@ -0,0 +1,54 @@
+import os, socket, sys
+
+import pytest
+
+# os módulos da API estão na raiz, os dos coletores em windows_services/ e o simulador em bench/ (sem pacote)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for pasta in (RAIZ, os.path.join(RAIZ, "windows_services"), os.path.join(RAIZ, "bench")):
+    if pasta not in sys.path:
+        sys.path.insert(0, pasta)
+
+
+def _bulk_write(self, ops, ordered=True, **kw):
+    # o mongomock 4.x não aceita as operações do pymongo >= 4.9 (argumento sort)
+    from pymongo import InsertOne, ReplaceOne, UpdateOne
+    for o in ops:
+        if isinstance(o, UpdateOne): self.update_one(o._filter, o._doc, upsert=o._upsert)
+        elif isinstance(o, ReplaceOne): self.replace_one(o._filter, o._doc, upsert=o._upsert)
+        elif isinstance(o, InsertOne): self.insert_one(o._doc)
+
+
+@pytest.fixture
+def db():
+    """Base de dados em memória (mongomock)."""
+    mongomock = pytest.importorskip("mongomock")
+    mongomock.collection.Collection.bulk_write = _bulk_write
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture(scope="session")
+def api():
+    """api_logger sobre um MongoDB em memória; sem lifespan (não liga aos FieldLoggers)."""
+    mongomock = pytest.importorskip("mongomock")
+    pytest.importorskip("httpx")
+    import pymongo
+    mongomock.collection.Collection.bulk_write = _bulk_write
+    pymongo.MongoClient = mongomock.MongoClient
+    import api_logger
+    return api_logger
+
+
+@pytest.fixture
+def cliente(api):
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
+
+
+@pytest.fixture(scope="session")
+def simulador():
+    """FieldLogger simulado (Modbus TCP) numa porta livre, partilhado pelos testes."""
+    from simulador_fieldlogger import SimuladorFieldLogger
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]
+    return SimuladorFieldLogger(porta).iniciar()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import agregados
+import historico
+from agregados import Agregados, colecao
+
+T0 = datetime(2026, 1, 1, 10)
+
+
+def leitura(s, valor, dispositivo="fl1", sensor="s1"):
+    return {"timestamp": T0 + timedelta(seconds=s), "valor": valor,
+            "meta": {"linha": "l1", "dispositivo": dispositivo, "sensor": sensor}}
+
+
+def buckets(db, g, **f):
+    return {(b["dispositivo"], b["inicio"]): (b["n"], b["soma"], b["min"], b["max"])
+            for b in colecao(db, g).find(dict(f, grandeza="temperatura"))}
+
+
+def test_upserts_acumulam_por_bucket_e_dispositivo(db):
+    agregados.garantir_indices(db)
+    agr = Agregados(db)
+    agr.atualizar("temperatura", [leitura(0, 20.0), leitura(30, 22.0), leitura(70, 25.0)])
+    agr.atualizar("temperatura", [leitura(50, 18.0), leitura(10, 30.0, dispositivo="fl2")])
+    assert buckets(db, "1m") == {
+        ("fl1", T0): (3, 60.0, 18.0, 22.0),
+        ("fl1", T0 + timedelta(minutes=1)): (1, 25.0, 25.0, 25.0),
+        ("fl2", T0): (1, 30.0, 30.0, 30.0),
+    }
+    assert buckets(db, "1h") == {("fl1", T0): (4, 85.0, 18.0, 25.0), ("fl2", T0): (1, 30.0, 30.0, 30.0)}
+    assert agr.estado()["erros"] == 0
+
+
+def test_reconstruir_da_o_mesmo_que_o_incremental(db):
+    docs = [leitura(s, float(s % 7), sensor=f"s{s % 2}") for s in range(0, 300, 5)]
+    db.temperatura_logger.insert_many([dict(d) for d in docs])
+    Agregados(db).atualizar("temperatura", docs)
+    incremental = buckets(db, "1m")
+    colecao(db, "1m").delete_many({})
+    assert agregados.reconstruir(db, "temperatura", "1m") == 10      # 5 minutos × 2 sensores
+    assert buckets(db, "1m") == incremental
+
+
+def test_historico_pelos_agregados_igual_ao_bruto(db):
+    docs = [leitura(s, float(s % 11)) for s in range(0, 600, 10)]
+    db.temperatura_logger.insert_many([dict(d) for d in docs])
+    Agregados(db).atualizar("temperatura", docs)
+    fim = T0 + timedelta(minutes=10)
+    bruto = historico.agregar(db.temperatura_logger, "valor", T0, fim, 120)
+    rollups = historico.agregar_rollups(colecao(db, "1m"), "temperatura", T0, fim, 120)
+    assert rollups == bruto
@@ -0,0 +1,4 @@
+def test_escrever_registo_fora_de_16_bits_da_400(cliente):
+    assert cliente.post("/escrever_registro/26/70000").status_code == 400
+    assert cliente.post("/escrever_registro/26/-1").status_code == 400
+    assert cliente.post("/escrever_registro/70000/1").status_code == 400
@@ -0,0 +1,76 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import aquisicao
+from aquisicao import Aquisicao, CanalAnalogico, bloquear_instancia, semear, validar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+T0 = datetime(2026, 1, 1)
+
+
+class FilaFalsa:
+    def __init__(self, nome=None, api_url=None):
+        self.enviados = []
+
+    def enfileirar(self, endpoint, payload):
+        self.enviados.append((endpoint, payload))
+
+    def estado(self):
+        return {"endpoints": {}}
+
+
+def test_mapa_semeado_do_flc_e_valido():
+    mapa = validar(semear(os.path.join(RAIZ, "Config_Logger.FLC")))
+    canais = {c["nome"]: c for c in mapa["canais"]}
+    assert canais["temperatura"]["registo"] == 3 and canais["humidade"]["registo"] == 5
+    assert canais["contagem"]["registo"] == 15 and canais["velocidade"]["registo"] == 14
+    with pytest.raises(ValueError):
+        validar(dict(mapa, canais=[dict(canais["status"], endpoint=None)]))
+    with pytest.raises(ValueError):
+        validar(dict(mapa, dispositivos=[{"id": "fl1"}, {"id": "fl1"}]))
+
+
+def test_agenda_em_calendario_absoluto():
+    canal = CanalAnalogico({"nome": "t", "intervalo": 5, "registo": 3, "endpoint": "/t"}, FilaFalsa())
+    canal.proximo = 100.0
+    canal.leituras = 1
+    canal.agendar(100.2)                  # ligeiro atraso: não empurra o calendário
+    assert canal.proximo == 105.0
+    canal.agendar(117.0)                  # atraso de mais de um período: realinha
+    assert canal.proximo == 122.0
+    assert canal.estado()["atraso_max_ms"] == 12000.0
+
+
+def test_analogico_converte_e_comprime():
+    fila = FilaFalsa()
+    canal = CanalAnalogico({"nome": "t", "intervalo": 5, "registo": 3, "endpoint": "/temperatura_logger",
+                            "sensor": "Sensor1", "offset": -5, "compressao": {"modo": "deadband", "desvio": 0.5}},
+                           fila, dispositivo="fl2")
+    for i, bruto in enumerate([27, 27, 28, 28]):
+        canal.processar({3: bruto}, True, T0.replace(second=i))
+    canal.processar({}, False, T0.replace(second=9))          # bloco falhado
+    assert [(p["valor"], p["dispositivo"]) for _, p in fila.enviados] == [(22.0, "fl2"), (23.0, "fl2")]
+    assert canal.leituras == 4 and canal.falhas == 1
+
+
+def test_canais_devidos_lidos_num_so_bloco(simulador, monkeypatch):
+    monkeypatch.setattr(aquisicao, "FilaEnvio", FilaFalsa)
+    mapa = semear(os.path.join(RAIZ, "Config_Logger.FLC"))
+    mapa["fieldlogger"] = {"ip": "127.0.0.1", "porta": simulador.porta, "timeout": 1.0}
+    aq = Aquisicao(mapa)
+    enderecos = [r for c in aq.canais for r in c.registos]
+    valores, ligado = aq._ler(enderecos)
+    aq._client.close()
+    assert ligado and set(enderecos) <= set(valores)
+    assert aq.transacoes == 1                                  # registos 3..16 numa transação
+    assert valores[3] == simulador.registo(3)
+
+
+def test_uma_so_instancia(tmp_path):
+    caminho = str(tmp_path / "aquisicao.lock")
+    primeiro = bloquear_instancia(caminho)
+    assert primeiro is not None and bloquear_instancia(caminho) is None
+    primeiro.close()
+    assert bloquear_instancia(caminho) is not None
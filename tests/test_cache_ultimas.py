@@ -0,0 +1,41 @@
+import json
+from datetime import datetime, timedelta
+
+from cache_ultimas import CacheUltimas
+
+T0 = datetime(2026, 1, 1, 10)
+
+
+def test_leitura_atrasada_nao_substitui_a_mais_recente():
+    cache = CacheUltimas()
+    cache.atualizar("temperatura", T0, 21.0)
+    cache.atualizar("temperatura", T0 - timedelta(minutes=1), 19.0)   # reenvio da fila
+    e = cache.obter("temperatura")
+    assert (e.timestamp, e.valor) == (T0, 21.0)
+    assert json.loads(e.corpo) == {"timestamp": "2026-01-01T10:00:00", "valor": 21.0}
+
+
+def test_etag_depende_do_conteudo():
+    a, b = CacheUltimas(), CacheUltimas()
+    etag = a.atualizar("t", T0, 21.0).etag
+    assert b.atualizar("t", T0, 21.0).etag == etag                         # igual após reinício
+    assert b.atualizar("t", T0, 21.5).etag != etag                         # outro valor
+    assert b.atualizar("t", T0 + timedelta(seconds=1), 21.0).etag != etag  # outra leitura
+
+
+def test_carregar_da_colecao(db):
+    db.temperatura_logger.insert_many([{"timestamp": T0 + timedelta(seconds=i), "valor": float(i),
+                                        "meta": {"dispositivo": "fl1"}} for i in range(5)])
+    cache = CacheUltimas()
+    assert cache.carregar(("fl1", "temperatura"), db.temperatura_logger).valor == 4.0
+    assert cache.carregar(("fl2", "humidade"), db.humidade_logger) is None
+
+
+def test_ultima_leitura_com_etag(cliente):
+    cliente.post("/humidade_logger", json={"sensor": "h1", "valor": 55.0, "timestamp": "2030-01-01T00:00:00"})
+    r = cliente.get("/ultima_humidade")
+    assert r.status_code == 200 and r.json() == {"timestamp": "2030-01-01T00:00:00", "valor": 55.0}
+    assert cliente.get("/ultima_humidade", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    cliente.post("/humidade_logger", json={"sensor": "h1", "valor": 56.0, "timestamp": "2030-01-01T00:00:01"})
+    r2 = cliente.get("/ultima_humidade", headers={"If-None-Match": r.headers["etag"]})
+    assert r2.status_code == 200 and r2.json()["valor"] == 56.0
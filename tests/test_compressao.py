@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from compressao import Compressor
+
+T0 = datetime(2026, 1, 1)
+
+
+def alimentar(comp, valores, passo=1.0):
+    """Leituras a cada `passo` s; devolve os pontos enviados (incluindo o pendente no fim)."""
+    pontos = []
+    for i, v in enumerate(valores):
+        pontos += comp.avaliar(v, T0 + timedelta(seconds=i * passo))
+    return pontos + comp.pendente()
+
+
+def interpolar(pontos, ts):
+    """Reconstrução linear (swinging door) no instante ts."""
+    for a, b in zip(pontos, pontos[1:]):
+        if a["timestamp"] <= ts <= b["timestamp"]:
+            f = (ts - a["timestamp"]) / (b["timestamp"] - a["timestamp"])
+            return a["valor"] + f * (b["valor"] - a["valor"])
+    raise AssertionError(f"{ts} fora dos pontos enviados")
+
+
+def test_parametros_invalidos():
+    with pytest.raises(ValueError):
+        Compressor("gzip")
+    with pytest.raises(ValueError):
+        Compressor(desvio=-1)
+
+
+def test_deadband_envia_so_os_degraus():
+    valores = [20.0] * 10 + [21.0] * 10 + [21.1] * 10
+    pontos = alimentar(Compressor("deadband", 0.2), valores)
+    assert [(p["valor"], p["compressao"]["motivo"]) for p in pontos] == [(20.0, "inicial"), (21.0, "desvio")]
+    assert pontos[1]["timestamp"] == T0 + timedelta(seconds=10)
+
+
+def test_swinging_door_degrau_fecha_o_segmento():
+    valores = [20.0] * 10 + [25.0] * 10
+    pontos = alimentar(Compressor("swinging_door", 0.2, atraso_max=1e9), valores)
+    # início, fim do patamar (antes do degrau), o degrau e a última leitura retida
+    assert [p["valor"] for p in pontos] == [20.0, 20.0, 25.0, 25.0]
+    assert pontos[-1]["compressao"]["motivo"] == "final"
+
+
+def test_swinging_door_reconstroi_dentro_do_desvio():
+    valores = [20 + (i % 17) * 0.05 + (i // 40) * 0.7 for i in range(200)]
+    comp = Compressor("swinging_door", 0.2, atraso_max=1e9)
+    pontos = alimentar(comp, valores)
+    assert len(pontos) < len(valores) / 3
+    for i, v in enumerate(valores):
+        assert abs(interpolar(pontos, T0 + timedelta(seconds=i)) - v) <= 0.2 + 1e-9
+
+
+def test_swinging_door_rampa_respeita_o_atraso_max():
+    valores = [20 + 0.1 * i for i in range(200)]     # rampa constante: a porta nunca fecha
+    pontos = alimentar(Compressor("swinging_door", 0.2, atraso_max=10), valores)
+    motivos = [p["compressao"]["motivo"] for p in pontos]
+    assert motivos.count("atraso") >= 15
+    gaps = [(b["timestamp"] - a["timestamp"]).total_seconds() for a, b in zip(pontos, pontos[1:])]
+    assert max(gaps) <= 10
+    for i, v in enumerate(valores):
+        assert abs(interpolar(pontos, T0 + timedelta(seconds=i)) - v) <= 0.2 + 1e-9
+
+
+def test_sinal_parado_so_envia_heartbeats():
+    for modo in ("deadband", "swinging_door"):
+        comp = Compressor(modo, 0.2, silencio_max=60)
+        pontos = [p for i in range(301) for p in comp.avaliar(20.0, T0 + timedelta(seconds=i))]
+        assert [p["compressao"]["motivo"] for p in pontos] == ["inicial"] + ["heartbeat"] * 5, modo
+        assert comp.razao() == round(301 / 6, 1)
+
+
+def test_heartbeat_com_degrau_fecha_o_segmento():
+    valores = [20.0] * 60 + [25.0]
+    pontos = alimentar(Compressor("swinging_door", 0.2, silencio_max=60, atraso_max=1e9), valores)
+    assert [(p["valor"], p["compressao"]["motivo"]) for p in pontos] == \
+        [(20.0, "inicial"), (20.0, "desvio"), (25.0, "heartbeat")]
+    for i, v in enumerate(valores):
+        assert abs(interpolar(pontos, T0 + timedelta(seconds=i)) - v) <= 0.2 + 1e-9
+
+
+def test_leituras_repetidas_ou_fora_de_ordem_sao_ignoradas():
+    comp = Compressor("swinging_door", 0.2)
+    comp.avaliar(20.0, T0 + timedelta(seconds=5))
+    comp.avaliar(20.1, T0 + timedelta(seconds=6))
+    assert comp.avaliar(30.0, T0 + timedelta(seconds=6)) == []
+    assert comp.avaliar(30.0, T0 + timedelta(seconds=1)) == []
+
+
+def test_pendente_so_uma_vez():
+    comp = Compressor("swinging_door", 0.2)
+    comp.avaliar(20.0, T0)
+    comp.avaliar(20.1, T0 + timedelta(seconds=1))
+    assert [p["valor"] for p in comp.pendente()] == [20.1]
+    assert comp.pendente() == []
+    assert Compressor("deadband").pendente() == []
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import contadores
+from contadores import Contadores, turno
+
+DIA = datetime(2026, 3, 10)
+
+
+@pytest.mark.parametrize("ts, esperado", [
+    (DIA.replace(hour=6), ("A", DIA.replace(hour=6))),
+    (DIA.replace(hour=13, minute=59, second=59), ("A", DIA.replace(hour=6))),
+    (DIA.replace(hour=14), ("B", DIA.replace(hour=14))),
+    (DIA.replace(hour=22), ("C", DIA.replace(hour=22))),
+    (DIA.replace(hour=5, minute=59), ("C", DIA - timedelta(hours=2))),   # turno C começou na véspera
+    (DIA.replace(hour=0), ("C", DIA - timedelta(hours=2))),
+])
+def test_limites_dos_turnos(ts, esperado):
+    assert turno(ts) == esperado
+
+
+def peca(ts, dispositivo="fl1"):
+    return {"timestamp": ts, "valor": 1, "meta": {"linha": "l1", "dispositivo": dispositivo}}
+
+
+def test_pecas_somadas_por_hora_turno_e_sequencia(db):
+    contadores.garantir_indices(db)
+    cont = Contadores(db)
+    cont.registar("contador_pequenas", [peca(DIA.replace(hour=13, minute=50)), peca(DIA.replace(hour=13, minute=55))])
+    cont.registar("contador_pequenas", [peca(DIA.replace(hour=14, minute=5))])
+    cont.registar("contador_grandes", [peca(DIA.replace(hour=14, minute=10)), peca(DIA.replace(hour=14), "fl2")])
+
+    agora = DIA.replace(hour=14, minute=30)
+    res = cont.atual(agora, meta={"linha": "l1", "dispositivo": "fl1"})
+    assert res["turno"]["nome"] == "B" and res["turno"]["fim"] == DIA.replace(hour=22)
+    assert res["pequena"]["turno"] == 1 and res["pequena"]["hora"] == 1 and res["pequena"]["sequencia"] == 3
+    assert res["grande"]["turno"] == 1 and res["total"]["sequencia"] == 4
+    # últimos 60 min: a hora corrente + metade da anterior (2 peças) = 2 peças → 2/60 por minuto
+    assert res["pequena"]["ultimos_60_min_por_minuto"] == round(2 / 60, 2)
+    assert cont.sequencia() == {"pequena": 3, "grande": 2}              # todas as linhas
+    turnos = cont.periodos("turno", DIA, DIA + timedelta(days=1), tipo="pequena")
+    assert [(t["turno"], t["total"]) for t in turnos] == [("A", 2), ("B", 1)]
+
+
+def test_reconstruir_a_partir_das_leituras(db):
+    pecas = [peca(DIA.replace(hour=h, minute=m)) for h, m in [(5, 0), (6, 0), (6, 30), (21, 59), (22, 0)]]
+    db.contador_unidades_logger.insert_many([dict(p) for p in pecas])
+    Contadores(db).registar("contador_pequenas", pecas)
+    incremental = sorted((d["periodo"], d["inicio"], d["total"]) for d in db.contadores_producao.find())
+    db.contadores_producao.delete_many({})
+    contadores.reconstruir(db)
+    assert sorted((d["periodo"], d["inicio"], d["total"]) for d in db.contadores_producao.find()) == incremental
+
+
+def test_duplicados_nao_contam_pela_api(cliente, api):
+    antes = cliente.get("/contadores/sequencia").json()["pequena"]
+    peca = {"sensor": "ContadorPequenas", "valor": 1, "timestamp": "2035-01-01T10:00:00", "id_envio": "peca-1"}
+    cliente.post("/contador_unidades_logger", json=peca)
+    cliente.post("/contador_unidades_logger/lote", json=[peca, dict(peca, id_envio="peca-2")])
+    assert cliente.get("/contadores/sequencia").json()["pequena"] == antes + 2
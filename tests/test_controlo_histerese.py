@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from controlo_histerese import ControladorHisterese
+
+
+class Rele:
+    def __init__(self, estado="off"):
+        self.estado = estado
+        self.comandos = []
+
+    async def atuar(self, estado):
+        self.comandos.append(estado)
+        self.estado = estado
+
+
+def controlador(db, rele, chave="fl1:temperatura"):
+    return ControladorHisterese("temperatura", rele.atuar, lambda: rele.estado, db.controlo_setpoints, chave=chave)
+
+
+def test_histerese_so_comanda_nas_mudancas(db):
+    async def teste():
+        rele = Rele()
+        ctl = controlador(db, rele)
+        ctl.ligar_loop(asyncio.get_running_loop())
+        ctl.iniciar(20.0, 22.0)
+        agora = datetime.utcnow()
+        for v in (21.0, 19.5, 19.0, 21.0, 22.5, 23.0, 21.5):
+            ctl.amostra(v, agora)
+            await asyncio.sleep(0.01)
+        ctl.amostra(10.0, agora - timedelta(minutes=10))   # reenvio antigo não atua
+        await asyncio.sleep(0.01)
+        return rele.comandos, ctl.estado()
+    comandos, estado = asyncio.run(teste())
+    assert comandos == ["on", "off"]
+    assert estado["atuacoes"] == 2 and estado["estado_rele"] == "off"
+
+
+def test_setpoints_persistidos_e_retomados(db):
+    ctl = controlador(db, Rele())
+    with pytest.raises(ValueError):
+        ctl.iniciar(22.0, 20.0)
+    ctl.iniciar(18.0, 24.0)
+    novo = controlador(db, Rele())
+    assert novo.carregar() and (novo.minimo, novo.maximo) == (18.0, 24.0)
+    assert not controlador(db, Rele(), chave="fl2:temperatura").carregar()   # outro dispositivo
@@ -0,0 +1,48 @@
+import asyncio, json
+
+from difusao import Difusor
+
+
+def _dados(msg):
+    tipo, dados = msg.strip().split("\n")
+    return tipo.removeprefix("event: "), json.loads(dados.removeprefix("data: "))
+
+
+def test_subscritor_recebe_o_ultimo_estado_e_os_eventos_do_seu_dispositivo():
+    async def teste():
+        dif = Difusor(heartbeat=0.05)
+        dif.ligar_loop(asyncio.get_running_loop())
+        dif.publicar("tapete", {"estado": "on"}, chave="fl1", dispositivo="fl1")
+        dif.publicar("tapete", {"estado": "off"}, chave="fl2", dispositivo="fl2")
+        await asyncio.sleep(0)
+        sub = dif.subscrever("fl1")
+        inicial = _dados(await anext(sub))
+        dif.publicar("leitura", {"valor": 1}, chave="temperatura", dispositivo="fl2")   # filtrado
+        dif.publicar("leitura", {"valor": 2}, chave="temperatura", dispositivo="fl1")
+        dif.publicar("aviso", {"texto": "global"})
+        recebidos = [_dados(await anext(sub)) for _ in range(2)]
+        heartbeat = await anext(sub)
+        await sub.aclose()
+        return inicial, recebidos, heartbeat, dif.estado()
+    inicial, recebidos, heartbeat, estado = asyncio.run(teste())
+    assert inicial == ("tapete", {"estado": "on"})
+    assert recebidos == [("leitura", {"valor": 2}), ("aviso", {"texto": "global"})]
+    assert heartbeat == ": heartbeat\n\n"
+    assert estado["subscritores"] == 0 and estado["publicados"] == 5
+
+
+def test_cliente_lento_perde_os_eventos_mais_antigos():
+    async def teste():
+        dif = Difusor(max_fila=2)
+        dif.ligar_loop(asyncio.get_running_loop())
+        sub = dif.subscrever()
+        pendente = asyncio.ensure_future(anext(sub))   # subscrito, à espera do primeiro evento
+        await asyncio.sleep(0)
+        for i in range(5):
+            dif.publicar("leitura", {"valor": i})
+        await asyncio.sleep(0)
+        recebidos = [_dados(await pendente)] + [_dados(await anext(sub))]
+        await sub.aclose()
+        return recebidos, dif.descartados
+    recebidos, descartados = asyncio.run(teste())
+    assert [d["valor"] for _, d in recebidos] == [3, 4] and descartados == 3
@@ -0,0 +1,46 @@
+import pytest
+
+import dispositivos
+from dispositivos import DispositivoDesconhecido, RegistoDispositivos
+
+CONFIGS = [{"id": "fl1", "linha": "linha1", "ip": "10.0.0.1"},
+           {"id": "fl2", "linha": "linha1", "ip": "10.0.0.2", "porta": 5020},
+           {"id": "fl3", "linha": "linha2", "ip": "10.0.0.3"}]
+
+
+def test_registo_e_dispositivo_por_omissao():
+    reg = RegistoDispositivos(CONFIGS, registos=(17, 26))
+    assert reg.obter() is reg.obter("fl1") and reg.obter().padrao
+    assert reg.linhas() == {"linha1": ["fl1", "fl2"], "linha2": ["fl3"]}
+    assert reg.obter("fl2").resumo()["endereco"] == "10.0.0.2:5020"
+    with pytest.raises(DispositivoDesconhecido, match="fl9"):
+        reg.obter("fl9")
+    with pytest.raises(ValueError):
+        RegistoDispositivos(CONFIGS + [CONFIGS[0]], registos=())
+
+
+def test_filtros_incluem_as_leituras_antigas_so_no_dispositivo_por_omissao(db):
+    reg = RegistoDispositivos(CONFIGS, registos=())
+    col = db.temperatura_logger
+    col.insert_many([{"valor": 1, "meta": {}},                                    # anterior ao registo
+                     {"valor": 2, "meta": {"linha": "linha1", "dispositivo": "fl1"}},
+                     {"valor": 3, "meta": {"linha": "linha1", "dispositivo": "fl2"}}])
+    assert sorted(d["valor"] for d in col.find(reg.obter("fl1").filtro_leituras())) == [1, 2]
+    assert [d["valor"] for d in col.find(reg.obter("fl2").filtro_leituras())] == [3]
+    assert reg.obter("fl2").filtro() == {"linha": "linha1", "dispositivo": "fl2"}
+
+
+def test_sem_ficheiro_um_so_dispositivo(tmp_path, monkeypatch):
+    monkeypatch.setenv("SYSSENSE_DISPOSITIVO", "principal")
+    reg = dispositivos.carregar((), "10.0.0.9", caminho=str(tmp_path / "nao_existe.json"))
+    assert len(reg) == 1 and reg.obter().id == "principal" and reg.obter().modbus.ip == "10.0.0.9"
+
+
+def test_rotas_por_dispositivo(cliente, api):
+    padrao = api.registo_dispositivos.obter().id
+    assert cliente.get("/dispositivos").json()["padrao"] == padrao
+    assert cliente.get("/dispositivos/nao_existe/ultima_temperatura").status_code == 404
+    r = cliente.post("/temperatura_logger", json={"sensor": "s", "valor": 1.0, "dispositivo": "nao_existe"})
+    assert r.status_code == 404 and "nao_existe" in r.json()["error"]
+    cliente.post("/velocidade_logger", json={"valor": 0.5, "dispositivo": padrao, "timestamp": "2037-01-01T00:00:00"})
+    assert cliente.get(f"/dispositivos/{padrao}/ultima_velocidade").json()["valor"] == 0.5
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from escrita_diferida import BufferCheio, BufferEscrita
+
+
+class ColecaoEmBaixo:
+    """Coleção cujo insert_many falha sempre (Mongo indisponível)."""
+
+    name = "temperatura_logger"
+
+    def __init__(self):
+        self.tentativas = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.tentativas += 1
+        raise ConnectionError("mongo em baixo")
+
+
+def test_descarrega_por_lote_e_ao_parar(db):
+    buf = BufferEscrita(db.temperatura_logger, max_lote=3, max_espera=60)
+    buf.iniciar()
+    buf.adicionar([{"valor": i} for i in range(4)])
+    for _ in range(100):
+        if db.temperatura_logger.count_documents({}) >= 3: break
+        time.sleep(0.01)
+    assert db.temperatura_logger.count_documents({}) == 3    # o 4.º espera pelo lote seguinte
+    assert buf.parar(timeout=1) == 0
+    assert sorted(d["valor"] for d in db.temperatura_logger.find()) == [0, 1, 2, 3]
+
+
+def test_mongo_em_baixo_ao_parar_resgata_para_disco(db, tmp_path):
+    col = ColecaoEmBaixo()
+    buf = BufferEscrita(col, max_lote=10, max_espera=60, pasta_resgate=str(tmp_path))
+    buf.iniciar()
+    docs = [{"valor": i} for i in range(5)]
+    buf.adicionar(docs)
+    t0 = time.monotonic()
+    assert buf.parar(timeout=0.6) == 5
+    assert 0.5 <= time.monotonic() - t0 < 2.0       # tentou até ao prazo, não desistiu logo
+    assert col.tentativas >= 2
+    assert buf.estado()["resgatados"] == 5 and len(list(tmp_path.iterdir())) == 1
+
+    # no arranque seguinte, com o Mongo de volta, os documentos são gravados (mesmo _id)
+    buf = BufferEscrita(db.temperatura_logger, max_lote=10, max_espera=0.05, pasta_resgate=str(tmp_path))
+    buf.iniciar()
+    assert buf.parar(timeout=1) == 0
+    assert buf.estado()["recuperados"] == 5 and list(tmp_path.iterdir()) == []
+    gravados = list(db.temperatura_logger.find().sort("valor"))
+    assert [d["_id"] for d in gravados] == [d["_id"] for d in docs]
+
+
+def test_sem_pasta_de_resgate_reporta_os_perdidos():
+    buf = BufferEscrita(ColecaoEmBaixo(), max_espera=60)
+    buf.iniciar()
+    buf.adicionar([{"valor": 1}, {"valor": 2}])
+    assert buf.parar(timeout=0.1) == 2
+
+
+def test_buffer_cheio_recusa_sem_bloquear():
+    buf = BufferEscrita(ColecaoEmBaixo(), capacidade=3, espera_espaco=0.05)   # thread parada
+    buf.adicionar([{"valor": 1}, {"valor": 2}])
+    with pytest.raises(BufferCheio):
+        buf.adicionar([{"valor": 3}, {"valor": 4}])
+    assert buf.estado()["pendentes"] == 2
+
+
+def test_ingestao_em_lote(cliente, api):
+    lote = [{"sensor": "lote", "valor": 20.0 + i, "timestamp": f"2031-01-01T00:00:0{i}"} for i in range(3)]
+    r = cliente.post("/temperatura_logger/lote", json=lote)
+    assert r.status_code == 200 and r.json()["inseridos"] == 3
+    assert api.col_temp.count_documents({"meta.sensor": "lote"}) == 3
+    assert cliente.get("/ultima_temperatura").json()["valor"] == 22.0
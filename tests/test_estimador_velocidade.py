@@ -0,0 +1,50 @@
+import pytest
+
+from estimador_velocidade import Anel, EstimadorVelocidade, MotorVelocidade
+
+ATIVO = 5
+
+
+def test_anel_mantem_a_ordem_cronologica():
+    anel = Anel(3)
+    for v in (1, 2, 3, 4, 5):
+        anel.juntar(v)
+    assert list(anel.valores()) == [3, 4, 5] and anel.ultimo() == 5.0
+    anel.limpar()
+    assert anel.ultimo() is None and len(anel.valores()) == 0
+
+
+def test_velocidade_pela_mediana_dos_intervalos():
+    est = EstimadorVelocidade(0.5, janela=6, resolucao=0.02)
+    for t in (10.0, 11.0, 12.0, 12.1, 13.0, 14.0, 15.0):   # 12.1: pulso duplicado (ignorado pela mediana)
+        est.flanco(t)
+    r = est.estimar(agora=15.5)
+    assert r["velocidade"] == 0.5 and not r["parado"] and r["periodo_s"] == 1.0
+    assert 0 < r["confianca"] < 1                     # um intervalo anómalo baixa a confiança
+    # intervalo em curso mais longo que o típico: a velocidade desce com ele
+    assert est.estimar(agora=17.0)["velocidade"] == 0.25
+
+
+def test_paragem_adaptativa_e_arranque():
+    est = EstimadorVelocidade(1.0, janela=4, paragem_min=2.0, paragem_max=60.0)
+    for t in (0.0, 1.0, 2.0, 3.0):
+        est.flanco(t)
+    assert est.estimar(agora=5.9)["parado"] is False
+    parado = est.estimar(agora=6.1)                   # 3 × período sem pulso
+    assert parado["parado"] and parado["velocidade"] == 0.0
+    est.flanco(30.0)                                  # arranque: a janela recomeça
+    assert est.arranques == 1 and est.estimar(agora=30.5)["intervalos"] == 0
+    with pytest.raises(ValueError):
+        EstimadorVelocidade(0)
+
+
+def test_amostras_datam_o_flanco_a_meio_periodo():
+    est = EstimadorVelocidade(1.0)
+    motor = MotorVelocidade(est, periodo=0.02, ativo=ATIVO)
+    amostras = [(1.00, 0), (1.02, ATIVO), (1.04, ATIVO), (1.06, 0), (2.02, 0), (2.04, ATIVO)]
+    flancos = [motor.amostra(v, t) for t, v in amostras]
+    assert flancos == [False, True, False, False, False, True]
+    assert list(est._flancos.valores()) == pytest.approx([1.01, 2.03])
+    # uma falha de leitura: o flanco seguinte não tem instante conhecido
+    motor.amostra(None, 2.06)
+    assert motor.amostra(ATIVO, 2.08) is False and motor.estatisticas()["falhas"] == 1
@@ -0,0 +1,87 @@
+import csv, gzip, io
+from datetime import datetime, timedelta
+
+import pytest
+
+import exportacao
+import historico
+
+T0 = datetime(2026, 3, 1)
+
+
+def leituras(db, n=7):
+    docs = [{"timestamp": T0 + timedelta(seconds=i), "valor": float(i),
+             "meta": {"sensor": "S1", "linha": "L1", "dispositivo": "fl1"}} for i in range(n)]
+    # leitura antiga: metadados no topo, sem o subdocumento
+    docs.append({"timestamp": T0 - timedelta(seconds=1), "valor": -1.0, "sensor": "S0", "linha": "L0"})
+    db.temperatura_logger.insert_many(docs)
+    return db.temperatura_logger
+
+
+def linhas(dados):
+    return list(csv.reader(io.StringIO(dados.decode())))
+
+
+def test_csv_por_lotes_e_por_ordem_de_timestamp(db):
+    col = leituras(db)
+    partes = list(exportacao.exportar(col, "valor", "csv", T0 - timedelta(hours=1), T0 + timedelta(hours=1), lote=3))
+    assert len(partes) == 1 + 3                      # cabeçalho + 8 documentos em lotes de 3
+    tabela = linhas(b"".join(partes))
+    assert tabela[0] == ["timestamp", "linha", "dispositivo", "sensor", "valor"]
+    assert tabela[1] == [(T0 - timedelta(seconds=1)).isoformat(), "L0", "", "S0", "-1.0"]
+    assert tabela[2] == [T0.isoformat(), "L1", "fl1", "S1", "0.0"]
+    assert len(tabela) == 9
+
+
+def test_gzip_do_fluxo(db):
+    col = leituras(db)
+    simples = b"".join(exportacao.exportar(col, "valor", "csv", T0, T0 + timedelta(hours=1)))
+    comprimido = b"".join(exportacao.exportar(col, "valor", "csv", T0, T0 + timedelta(hours=1), gzip=True))
+    assert gzip.decompress(comprimido) == simples and len(linhas(simples)) == 1 + 7
+
+
+def test_formato_e_intervalo_invalidos(db):
+    col = leituras(db)
+    with pytest.raises(historico.ErroConsulta):
+        exportacao.exportar(col, "valor", "xlsx", T0, T0 + timedelta(hours=1))
+    with pytest.raises(historico.ErroConsulta):
+        exportacao.exportar(col, "valor", "csv", T0 + timedelta(hours=1), T0)
+
+
+def test_parquet_sem_pyarrow(db, monkeypatch):
+    monkeypatch.setattr(exportacao, "pa", None)
+    with pytest.raises(exportacao.ParquetIndisponivel):
+        exportacao.exportar(leituras(db), "valor", "parquet", T0, T0 + timedelta(hours=1))
+
+
+def test_parquet_um_row_group_por_lote(db):
+    pq = pytest.importorskip("pyarrow.parquet")
+    col = leituras(db)
+    dados = b"".join(exportacao.exportar(col, "valor", "parquet", T0, T0 + timedelta(hours=1), lote=3))
+    ficheiro = pq.ParquetFile(io.BytesIO(dados))
+    assert ficheiro.metadata.num_row_groups == 3
+    tabela = ficheiro.read()
+    assert tabela.column("valor").to_pylist() == [float(i) for i in range(7)]
+    assert tabela.column("dispositivo").to_pylist() == ["fl1"] * 7
+
+
+def test_nome_ficheiro():
+    assert exportacao.nome_ficheiro("humidade", "csv", T0, T0 + timedelta(days=1), "fl2") == \
+        "humidade_fl2_20260301T0000_20260302T0000.csv"
+
+
+def test_rota_exportar(cliente):
+    for i in range(3):
+        cliente.post("/humidade_logger", json={"sensor": "exp", "valor": 40.0 + i,
+                                               "timestamp": f"2038-01-01T00:00:0{i}"})
+    params = {"inicio": "2038-01-01T00:00:00", "fim": "2038-01-01T01:00:00", "sensor": "exp"}
+    r = cliente.get("/exportar/humidade", params=params)
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+    assert 'filename="humidade_20380101T0000_20380101T0100.csv"' in r.headers["content-disposition"]
+    assert [l[-1] for l in linhas(r.content)[1:]] == ["40.0", "41.0", "42.0"]
+
+    r = cliente.get("/exportar/humidade", params=dict(params, gzip=True))
+    assert r.headers["content-encoding"] == "gzip" and len(linhas(r.content)) == 1 + 3   # o cliente descomprime
+
+    assert cliente.get("/exportar/humidade", params=dict(params, formato="xlsx")).status_code == 400
+    assert cliente.get("/exportar/pressao").status_code == 404
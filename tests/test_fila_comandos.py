@@ -0,0 +1,178 @@
+import asyncio, struct, time
+
+import pytest
+
+from fila_comandos import (COSMETICO, CONTROLO, SEGURANCA, ComandoExpirado, ComandoRejeitado,
+                           FilaComandos)
+from modbus_conexao import ErroModbus
+
+
+class ModbusFalso:
+    """GestorModbus em memória: regista as escritas pela ordem em que chegam."""
+
+    ip, porta = "127.0.0.1", 502
+
+    def __init__(self, atraso=0.0, falhar=()):
+        self.escritas = []
+        self.atraso = atraso
+        self.falhar = set(falhar)
+
+    async def escrever_registo(self, end, valor):
+        await self._escrever("registo", end, valor)
+
+    async def escrever_coil(self, end, valor):
+        await self._escrever("coil", end, int(valor))
+
+    async def _escrever(self, tipo, end, valor):
+        if self.atraso: await asyncio.sleep(self.atraso)
+        if end in self.falhar: raise ErroModbus(f"falha em {end}")
+        struct.pack(">H", valor)   # como o pymodbus: struct.error fora de 16 bits
+        self.escritas.append((tipo, end, valor))
+
+
+def correr(corrotina):
+    return asyncio.run(corrotina)
+
+
+async def _com_fila(teste, **kw):
+    fila = FilaComandos(ModbusFalso(**kw))
+    try:
+        return await teste(fila)
+    finally:
+        await fila.parar()
+
+
+def test_prioridade_seguranca_passa_a_frente():
+    async def teste(fila):
+        futuros = [fila.submeter("coil", 1, 1, COSMETICO),
+                   fila.submeter("registo", 2, 5, CONTROLO),
+                   fila.submeter("registo", 3, 0, SEGURANCA)]
+        fila.iniciar()
+        await asyncio.gather(*futuros)
+        return fila.modbus.escritas
+    assert correr(_com_fila(teste)) == [("registo", 3, 0), ("registo", 2, 5), ("coil", 1, 1)]
+
+
+def test_coalescencia_escreve_so_o_ultimo_valor():
+    async def teste(fila):
+        f1 = fila.submeter("registo", 2, 1)
+        f2 = fila.submeter("registo", 2, 2)
+        f3 = fila.submeter("registo", 2, 3)
+        fila.iniciar()
+        return [f.estado for f in await asyncio.gather(f1, f2, f3)], fila.modbus.escritas
+    estados, escritas = correr(_com_fila(teste))
+    assert estados == ["substituido", "substituido", "escrito"]
+    assert escritas == [("registo", 2, 3)]
+
+
+def test_coalescencia_herda_a_prioridade_mais_alta():
+    async def teste(fila):
+        fila.submeter("registo", 5, 1, CONTROLO)
+        fila.submeter("registo", 2, 0, SEGURANCA)
+        fila.submeter("registo", 2, 0, SEGURANCA)   # coalescido com o anterior
+        fila.submeter("registo", 2, 0, SEGURANCA)
+        f = fila.submeter("registo", 7, 1, COSMETICO)
+        fila.iniciar()
+        await f
+        return fila.modbus.escritas
+    assert correr(_com_fila(teste)) == [("registo", 2, 0), ("registo", 5, 1), ("registo", 7, 1)]
+
+
+def test_comando_menos_prioritario_nao_substitui_seguranca():
+    async def teste(fila):
+        seg = fila.submeter("registo", 2, 0, SEGURANCA)
+        ctl = fila.submeter("registo", 2, 1, CONTROLO)
+        fila.iniciar()
+        with pytest.raises(ComandoRejeitado):
+            await ctl
+        return (await seg).estado, fila.modbus.escritas
+    estado, escritas = correr(_com_fila(teste))
+    assert estado == "escrito"
+    assert escritas == [("registo", 2, 0)]
+
+
+def test_seguranca_substitui_comando_pendente():
+    async def teste(fila):
+        ctl = fila.submeter("registo", 2, 1, CONTROLO)
+        seg = fila.submeter("registo", 2, 0, SEGURANCA)
+        fila.iniciar()
+        return (await ctl).estado, (await seg).estado, fila.modbus.escritas
+    assert correr(_com_fila(teste)) == ("substituido", "escrito", [("registo", 2, 0)])
+
+
+def test_comando_depois_da_seguranca_executada_segue_na_fila():
+    async def teste(fila):
+        fila.iniciar()
+        await fila.escrever_registo(2, 0, SEGURANCA)
+        res = await fila.escrever_registo(2, 1, CONTROLO)
+        return res.estado, fila.modbus.escritas
+    assert correr(_com_fila(teste)) == ("escrito", [("registo", 2, 0), ("registo", 2, 1)])
+
+
+def test_deduplicacao_pelo_estado_conhecido():
+    async def teste(fila):
+        fila.iniciar()
+        r1 = await fila.escrever_registo(2, 1)
+        r2 = await fila.escrever_registo(2, 1)
+        return r1.estado, r2.estado, fila.modbus.escritas
+    assert correr(_com_fila(teste)) == ("escrito", "ignorado", [("registo", 2, 1)])
+
+
+def test_deduplicacao_expira_com_a_validade():
+    async def teste(fila):
+        fila.validade = 0.01
+        fila.iniciar()
+        await fila.escrever_registo(2, 1)
+        await asyncio.sleep(0.02)
+        return (await fila.escrever_registo(2, 1)).estado
+    assert correr(_com_fila(teste)) == "escrito"
+
+
+def test_snapshot_anterior_a_escrita_nao_altera_o_estado_conhecido():
+    async def teste(fila):
+        fila.iniciar()
+        antes = time.monotonic()
+        await fila.escrever_registo(2, 1)
+        fila.observar({2: 0}, antes)              # leitura iniciada antes da escrita
+        return (await fila.escrever_registo(2, 1)).estado
+    assert correr(_com_fila(teste)) == "ignorado"
+
+
+def test_erro_propaga_e_esquece_o_estado():
+    async def teste(fila):
+        fila.iniciar()
+        with pytest.raises(ErroModbus):
+            await fila.escrever_registo(4, 1)
+        return fila._conhecido(("registo", 4))
+    assert correr(_com_fila(teste, falhar={4})) is None
+
+
+def test_pausa_da_sequencia_deixa_passar_outros_enderecos():
+    async def teste(fila):
+        fila.iniciar()
+        seq = fila.submeter_sequencia("humidificador", "on", [("coil", 9, 1, 0.05), ("coil", 9, 0, 0.05)])
+        await asyncio.sleep(0.01)                 # sequência já na primeira pausa
+        outro = fila.submeter("coil", 8, 1)
+        await asyncio.gather(seq, outro)
+        return fila.modbus.escritas
+    assert correr(_com_fila(teste)) == [("coil", 9, 1), ("coil", 8, 1), ("coil", 9, 0)]
+
+
+def test_erro_inesperado_nao_para_a_fila():
+    async def teste(fila):
+        fila.iniciar()
+        with pytest.raises(struct.error):
+            await fila.escrever_registo(2, 70000)
+        res = await asyncio.wait_for(fila.escrever_registo(26, 0, SEGURANCA), 1.0)
+        return res.estado, fila._tarefa.done(), fila.modbus.escritas
+    assert correr(_com_fila(teste)) == ("escrito", False, [("registo", 26, 0)])
+
+
+def test_espera_expira_e_o_comando_nao_e_escrito():
+    async def teste(fila):
+        with pytest.raises(ComandoExpirado):
+            await fila.escrever_registo(2, 1, timeout=0.02)     # fila ainda parada
+        fila.iniciar()
+        res = await fila.escrever_registo(2, 5)
+        return res.estado, fila.modbus.escritas
+    assert correr(_com_fila(teste)) == ("escrito", [("registo", 2, 5)])
@@ -0,0 +1,82 @@
+import json, time
+
+import requests
+
+import fila_envio
+from fila_envio import FilaEnvio
+
+
+class Resposta:
+    def __init__(self, status_code, text=""):
+        self.status_code, self.text = status_code, text
+
+
+class SessaoApi(requests.Session):
+    """Sessão HTTP da fila ligada ao TestClient; pode perder respostas depois de a API gravar."""
+
+    def __init__(self, cliente, perder=0):
+        super().__init__()
+        self.cliente = cliente
+        self.perder = perder          # respostas perdidas depois de a API gravar
+        self.lotes = []
+
+    def post(self, url, data, headers, timeout):
+        rota = url.split("8000", 1)[1]
+        self.lotes.append(len(json.loads(data)))
+        r = self.cliente.post(rota, content=data, headers=headers)
+        if self.perder:
+            self.perder -= 1
+            raise requests.ReadTimeout("resposta perdida")
+        return Resposta(r.status_code, r.text)
+
+
+def fila(tmp_path, monkeypatch, sessao, pendentes=(), **kw):
+    """FilaEnvio com a sessão HTTP simulada e leituras já em disco (enviadas num só lote)."""
+    db = fila_envio.abrir(str(tmp_path / "teste.db"))
+    for i, (endpoint, payload) in enumerate(pendentes):
+        db.execute("INSERT INTO fila (endpoint, payload, criado) VALUES (?, ?, ?)",
+                   (endpoint, json.dumps(dict(payload, id_envio=f"{tmp_path.name}-{i}")), time.time()))
+    db.commit()
+    monkeypatch.setattr(fila_envio.requests, "Session", lambda: sessao)
+    return FilaEnvio("teste", api_url="http://api:8000", pasta=str(tmp_path), **kw)
+
+
+def esperar(f, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while f.estado()["pendentes"] and time.monotonic() < limite:
+        time.sleep(0.02)
+    return f.estado()
+
+
+def test_resposta_perdida_e_reenviada_sem_duplicar(tmp_path, cliente, api, monkeypatch):
+    monkeypatch.setattr(fila_envio, "BACKOFF_MIN", 0.01)
+    leituras = [("/temperatura_logger", {"sensor": "fila", "valor": float(i),
+                                         "timestamp": f"2033-01-01T00:00:0{i}"}) for i in range(3)]
+    f = fila(tmp_path, monkeypatch, SessaoApi(cliente, perder=1), leituras, lote=10)
+    estado = esperar(f)
+    assert estado["pendentes"] == 0 and estado["enviados"] == 3 and estado["falhas"] == 1
+    assert f._sessao.lotes == [3, 3]                          # o mesmo lote, duas vezes
+    assert api.col_temp.count_documents({"meta.sensor": "fila"}) == 3
+
+
+def test_leitura_invalida_fica_de_parte_sem_bloquear(tmp_path, monkeypatch, cliente, api):
+    leituras = [("/humidade_logger", {"sensor": "fila", "valor": v, "timestamp": f"2033-01-01T00:00:0{i}"})
+                for i, v in enumerate([50.0, "x", 51.0])]
+    f = fila(tmp_path, monkeypatch, SessaoApi(cliente), leituras, lote=10)
+    estado = esperar(f)
+    assert estado["enviados"] == 2 and estado["rejeitados"] == 1 and estado["rejeitados_em_disco"] == 1
+    assert f._sessao.lotes == [3, 1, 1, 1]                    # lote recusado, depois uma a uma
+    assert api.col_hum.count_documents({"meta.sensor": "fila"}) == 2
+
+
+def test_fila_cheia_descarta_as_mais_antigas(tmp_path, monkeypatch):
+    class ApiEmBaixo(requests.Session):
+        def post(self, *a, **kw):
+            raise requests.ConnectionError("recusada")
+    f = fila(tmp_path, monkeypatch, ApiEmBaixo(), max_registos=3)
+    for i in range(5):
+        f.enfileirar("/velocidade_logger", {"valor": i})
+    estado = f.estado()
+    assert estado["pendentes"] == 3 and estado["descartados"] == 2
+    ids = [json.loads(p)["id_envio"] for (p,) in f._db.execute("SELECT payload FROM fila")]
+    assert len(set(ids)) == 3                                 # id fixado ao enfileirar
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import historico
+from historico import ErroConsulta
+
+T0 = datetime(2026, 1, 1)
+FIM = T0 + timedelta(hours=1)
+
+
+def leituras(col, valores, passo=10, sensor="s1", dispositivo="fl1"):
+    col.insert_many([{"timestamp": T0 + timedelta(seconds=i * passo), "valor": v,
+                      "meta": {"linha": "l1", "dispositivo": dispositivo, "sensor": sensor}}
+                     for i, v in enumerate(valores)])
+
+
+def test_bucket_automatico_e_limites():
+    assert historico.bucket_automatico(T0, T0 + timedelta(minutes=10)) == 5
+    assert historico.bucket_automatico(T0, T0 + timedelta(days=7)) == 1800
+    with pytest.raises(ErroConsulta):
+        historico.validar_intervalo(FIM, T0)
+    with pytest.raises(ErroConsulta):
+        historico.validar_intervalo(T0, T0 + timedelta(days=1), bucket=1)
+
+
+def test_agregar_por_bucket_e_sensor(db):
+    leituras(db.temperatura_logger, [1, 2, 3, 4, 5, 6, 7])          # de 10 em 10 s
+    leituras(db.temperatura_logger, [100] * 7, sensor="s2")
+    pontos = historico.agregar(db.temperatura_logger, "valor", T0, FIM, 30, sensor="s1")
+    assert [(p["timestamp"], p["min"], p["max"], p["media"], p["n"]) for p in pontos] == [
+        (T0, 1, 3, 2, 3), (T0 + timedelta(seconds=30), 4, 6, 5, 3), (T0 + timedelta(seconds=60), 7, 7, 7, 1)]
+
+
+def test_pagina_percorre_tudo_pelo_cursor_com_timestamps_repetidos(db):
+    col = db.temperatura_logger
+    # três leituras no mesmo instante: o _id desempata e nenhuma se perde na mudança de página
+    col.insert_many([{"_id": ObjectId(), "timestamp": T0 + timedelta(seconds=s), "valor": i,
+                      "meta": {"dispositivo": "fl1", "sensor": "s1"}}
+                     for i, s in enumerate([0, 5, 5, 5, 9, 12])])
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        p = historico.pagina(col, "valor", T0, FIM, cursor=cursor, limite=2)
+        vistos += [d["valor"] for d in p["dados"]]
+        paginas += 1
+        cursor = p["proximo"]
+        if cursor is None: break
+        assert historico.descodificar_cursor(cursor)[0] <= T0 + timedelta(seconds=12)
+    assert vistos == [0, 1, 2, 3, 4, 5] and paginas == 3
+    assert p["dados"][-1] == {"timestamp": T0 + timedelta(seconds=12), "valor": 5,
+                              "sensor": "s1", "dispositivo": "fl1"}
+
+
+def test_cursor_invalido():
+    with pytest.raises(ErroConsulta):
+        historico.descodificar_cursor("nao-e-um-cursor")
+
+
+def test_rotas_do_historico(cliente):
+    base = "/historico/temperatura/bruto?inicio=2026-01-01T00:00:00&fim=2026-01-01T01:00:00"
+    assert cliente.get(base + "&cursor=xyz").status_code == 400
+    assert cliente.get(base + "&limite=0").status_code == 400
+    assert cliente.get(base + "&formato=xml").status_code == 400
+    assert cliente.get("/historico/temperatura?inicio=2026-01-02T00:00:00&fim=2026-01-01T00:00:00").status_code == 400
+    assert cliente.get("/historico/pressao").status_code == 404
+
+
+def pontos_comprimidos(col, modo):
+    # dois pontos enviados pelo coletor: 10 em t=0 e 20 em t=10 s (mais um anterior ao intervalo)
+    col.insert_many([{"timestamp": T0 + timedelta(seconds=s), "valor": v, "compressao": {"modo": modo},
+                      "meta": {"dispositivo": "fl1", "sensor": "s1"}}
+                     for s, v in [(-30, 0.0), (0, 10.0), (10, 20.0)]])
+
+
+def test_reconstrucao_em_degraus_e_linear(db):
+    col = db.temperatura_logger
+    pontos_comprimidos(col, "deadband")
+    fim = T0 + timedelta(seconds=15)
+    modo, degraus = historico.reconstruir(col, "valor", T0 - timedelta(seconds=5), fim, 5)
+    assert modo == "step"
+    assert [p["valor"] for p in degraus] == [0.0, 10.0, 10.0, 20.0]
+    modo, linear = historico.reconstruir(col, "valor", T0 - timedelta(seconds=5), fim, 5, modo="linear")
+    assert modo == "linear"
+    assert [p["valor"] for p in linear] == [pytest.approx(25 / 3), 10.0, 15.0, 20.0]
+
+
+def test_reconstrucao_auto_usa_linear_com_swinging_door(db):
+    col = db.humidade_logger
+    pontos_comprimidos(col, "swinging_door")
+    modo, pontos = historico.reconstruir(col, "valor", T0, T0 + timedelta(seconds=10), 2.5)
+    assert modo == "linear" and [p["valor"] for p in pontos] == [10.0, 12.5, 15.0, 17.5]
+    # sem dados antes do início não há valor; depois do último ponto fica o último valor
+    _, antes = historico.reconstruir(col, "valor", T0 - timedelta(seconds=60), T0 - timedelta(seconds=40), 10)
+    assert [p["valor"] for p in antes] == [None, None]
+    _, depois = historico.reconstruir(col, "valor", T0 + timedelta(seconds=20), T0 + timedelta(seconds=30), 5)
+    assert [p["valor"] for p in depois] == [20.0, 20.0]
+    with pytest.raises(ErroConsulta):
+        historico.reconstruir(col, "valor", T0, FIM, 5, modo="spline")
+
+
+def test_rota_reconstruida_com_leituras_comprimidas(cliente):
+    sd = {"modo": "swinging_door", "desvio": 0.2, "motivo": "desvio"}
+    for s, v in [(0, 1.0), (20, 3.0)]:
+        cliente.post("/velocidade_logger", json={"valor": v, "timestamp": f"2034-01-01T00:00:{s:02d}", "compressao": sd})
+    r = cliente.get("/historico/velocidade/reconstruido?inicio=2034-01-01T00:00:00"
+                    "&fim=2034-01-01T00:00:20&passo=10").json()
+    assert r["modo"] == "linear" and [p["valor"] for p in r["pontos"]] == [1.0, 2.0]
+    assert cliente.get("/historico/velocidade/reconstruido?inicio=2034-01-01T00:00:00"
+                       "&fim=2034-01-01T00:00:20&modo=cubico").status_code == 400
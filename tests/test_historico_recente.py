@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from historico_recente import AnelRecente, HistoricoRecente, decimar
+
+
+def test_anel_da_a_volta_e_descarta_pontos_fora_de_ordem():
+    anel = AnelRecente(capacidade=5)
+    anel.juntar([1, 2, 3], [10, 20, 30])
+    anel.juntar([5, 4], [50, 40])              # lote desordenado: é ordenado
+    anel.juntar([2], [99])                     # anterior ao último guardado: só fica no Mongo
+    anel.juntar([6, 7, 8], [60, 70, 80])       # dá a volta ao buffer
+    t, v = anel.janela(0)
+    assert t.tolist() == [4, 5, 6, 7, 8] and v.tolist() == [40, 50, 60, 70, 80]
+    assert anel.fora_de_ordem == 1 and anel.n == 5
+    t, _ = anel.janela(5, 8)
+    assert t.tolist() == [5, 6, 7]
+
+
+def test_decimar_em_buckets_de_tempo():
+    t = np.arange(0, 100, dtype=np.int64)
+    v = np.arange(0, 100, dtype=np.float64)
+    tb, mn, mx, media = decimar(t, v, 4)
+    assert tb.tolist() == [0, 25, 50, 75]
+    assert mn.tolist() == [0, 25, 50, 75] and mx.tolist() == [24, 49, 74, 99]
+    assert media.tolist() == [12.0, 37.0, 62.0, 87.0]
+
+
+def test_registar_carregar_e_consultar_por_dispositivo(db):
+    agora = datetime.utcnow()
+    docs = [{"timestamp": agora - timedelta(seconds=60 - i), "valor": float(i),
+             "meta": {"dispositivo": "fl1" if i % 2 else "fl2"}} for i in range(60)]
+    rec = HistoricoRecente(("temperatura",))
+    rec.registar("temperatura", docs)
+    rec.registar("pressao", docs)                            # canal sem buffer: ignorado
+    assert rec.consultar(("fl1", "temperatura"))["pontos"] == 30
+    ultimos = rec.consultar(("fl2", "temperatura"), segundos=11)
+    assert ultimos["valor"] == [50.0, 52.0, 54.0, 56.0, 58.0]
+    decimado = rec.consultar(("fl1", "temperatura"), pontos=3)
+    assert decimado["decimado"] and decimado["buckets"] == 3 and decimado["min"][0] == 1.0
+
+    db.temperatura_logger.insert_many([dict(d) for d in docs] +
+                                      [{"timestamp": agora - timedelta(hours=2), "valor": -1.0,
+                                        "meta": {"dispositivo": "fl1"}}])
+    novo = HistoricoRecente(("temperatura",), capacidade=10)
+    novo.carregar(("fl1", "temperatura"), db.temperatura_logger, filtro={"meta.dispositivo": "fl1"})
+    r = novo.consultar(("fl1", "temperatura"))
+    assert r["pontos"] == 10 and r["valor"][-1] == 59.0     # as mais recentes, fora do horizonte não
+
+
+def test_rota_recente(cliente, api, monkeypatch):
+    # buffers vazios: os outros testes publicam leituras com timestamps no futuro
+    monkeypatch.setattr(api, "recente", HistoricoRecente(api.RECENTE_CANAIS))
+    ts = (datetime.utcnow() - timedelta(seconds=5)).isoformat()
+    cliente.post("/humidade_logger", json={"sensor": "rec", "valor": 61.5, "timestamp": ts})
+    r = cliente.get("/recente/humidade?segundos=60").json()
+    assert r["valor"][-1] == 61.5 and len(r["t"]) == r["pontos"]
+    assert cliente.get("/recente/humidade?segundos=0").status_code == 400
+    assert cliente.get("/recente/status").status_code == 404
@@ -0,0 +1,33 @@
+from idempotencia import CAMPO, RegistoEnvios
+
+
+def docs(*ids):
+    return [{"valor": i, CAMPO: k} if k is not None else {"valor": i} for i, k in enumerate(ids)]
+
+
+def test_ids_repetidos_sao_rejeitados(db):
+    envios = RegistoEnvios(db)
+    novos, reservados = envios.reservar("temperatura_logger", docs("a", "b"))
+    assert [d["valor"] for d in novos] == [0, 1] and reservados == ["a", "b"]
+    assert all(CAMPO not in d for d in novos)             # o id não é gravado com a leitura
+    # reenvio parcial: "b" já chegou; "c" repetido no próprio lote; sem id passa sempre
+    novos, reservados = envios.reservar("temperatura_logger", docs("b", "c", "c", None))
+    assert [d["valor"] for d in novos] == [1, 3] and reservados == ["c"]
+    assert envios.estado()["duplicados"] == 2
+
+
+def test_insert_falhado_liberta_os_ids(db):
+    envios = RegistoEnvios(db)
+    _, reservados = envios.reservar("humidade_logger", docs("x", "y"))
+    envios.libertar(reservados)
+    novos, _ = envios.reservar("humidade_logger", docs("x", "y"))
+    assert len(novos) == 2 and envios.estado()["novos"] == 2
+
+
+def test_reenvio_pela_api_nao_duplica(cliente, api):
+    leitura = {"sensor": "idem", "valor": 7.0, "timestamp": "2032-01-01T00:00:00", "id_envio": "e-1"}
+    assert "dados" in cliente.post("/temperatura_logger", json=leitura).json()
+    assert cliente.post("/temperatura_logger", json=leitura).json()["duplicado"] is True
+    r = cliente.post("/temperatura_logger/lote", json=[leitura, dict(leitura, id_envio="e-2")]).json()
+    assert (r["inseridos"], r["duplicados"]) == (1, 1)
+    assert api.col_temp.count_documents({"meta.sensor": "idem"}) == 2
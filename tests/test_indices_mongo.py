@@ -0,0 +1,35 @@
+import indices_mongo
+from indices_mongo import META, com_meta, em_meta, garantir_colecoes, metadados
+
+
+def test_helpers_de_metadados():
+    assert em_meta({"linha": "l1", "sensor": "s1"}) == {"meta.linha": "l1", "meta.sensor": "s1"}
+    antiga = {"timestamp": 1, "linha": "l1", "dispositivo": "fl1", "valor": 2}
+    assert com_meta(dict(antiga)) == {"timestamp": 1, "valor": 2, META: {"linha": "l1", "dispositivo": "fl1"}}
+    assert metadados(antiga) is antiga
+    assert metadados({META: {"linha": "l1"}}) == {"linha": "l1"}
+
+
+def test_sem_timeseries_so_cria_indices(db, monkeypatch):
+    monkeypatch.setattr(indices_mongo, "versao_servidor", lambda db: (4, 4))
+    db.temperatura_logger.insert_one({"timestamp": 1, "linha": "l1", "sensor": "s1", "valor": 2})
+    acoes = garantir_colecoes(db)
+    assert "temperatura_logger: leituras com metadados no topo; migre com --migrar" in acoes
+    indices = db.temperatura_logger.index_information()
+    assert "meta.linha_1_meta.dispositivo_1_timestamp_-1" in indices
+    assert "meta.sensor_1_timestamp_-1" in indices
+    assert "meta.sensor_1_timestamp_-1" not in db.velocidade_logger.index_information()
+    assert garantir_colecoes(db) == acoes   # idempotente
+
+
+def test_colecoes_novas_como_timeseries(db, monkeypatch):
+    criadas = {}
+    def criar(nome, **opcoes):
+        criadas[nome] = opcoes["timeseries"]
+        return db[nome]
+    monkeypatch.setattr(db, "create_collection", criar)
+    monkeypatch.setattr(indices_mongo, "versao_servidor", lambda db: (7, 0))
+    acoes = garantir_colecoes(db)
+    assert set(criadas) == set(indices_mongo.COLECOES)
+    assert criadas["humidade_logger"] == {"timeField": "timestamp", "metaField": META, "granularity": "seconds"}
+    assert "humidade_logger: criada como time-series" in acoes
@@ -0,0 +1,124 @@
+import asyncio, time
+
+from fila_comandos import FilaComandos
+from interlock import MotorInterlock
+
+ENTRADA, SAIDA = 17, 26
+
+
+class Planta:
+    """FieldLogger simulado: registos partilhados pela ligação de leitura e pela de escrita."""
+
+    ip, porta = "127.0.0.1", 502
+
+    def __init__(self, entrada=1, saida=1):
+        self.regs = {ENTRADA: entrada, SAIDA: saida}
+        self.presa = False        # a saída ignora as escritas (ex.: contactor colado)
+        self.escritas = []
+
+    async def ler_registos(self, inicio, n):
+        return [self.regs.get(inicio + i, 0) for i in range(n)]
+
+    async def ler_registo(self, end):
+        return self.regs.get(end, 0)
+
+    async def escrever_registo(self, end, valor):
+        self.escritas.append((end, valor))
+        if not self.presa: self.regs[end] = valor
+
+    def fechar(self):
+        pass
+
+
+async def _com_interlock(teste, planta, **kw):
+    fila = FilaComandos(planta)
+    motor = MotorInterlock(planta, fila, ENTRADA, SAIDA, periodo=0.01, **kw)
+    fila.iniciar()
+    motor.iniciar()
+    try:
+        await asyncio.sleep(0.05)      # primeira leitura com o canal 4 a 1
+        return await teste(planta, motor)
+    finally:
+        await motor.parar()
+        await fila.parar()
+
+
+def correr(teste, planta, **kw):
+    return asyncio.run(_com_interlock(teste, planta, **kw))
+
+
+def test_dispara_na_transicao_e_rearma():
+    async def teste(planta, motor):
+        planta.regs[ENTRADA] = 0
+        await asyncio.sleep(0.1)
+        disparo = dict(motor.ultimo_disparo)
+        planta.regs[ENTRADA] = 1
+        await asyncio.sleep(0.05)
+        return disparo, motor.estado()
+    disparo, estado = correr(teste, Planta())
+    assert disparo["motivo"] == "canal_4" and disparo["confirmado"]
+    assert estado["disparos"] == 1 and estado["repeticoes"] == 0 and estado["rearmes"] == 1
+    assert estado["seguranca_ativa"] is False
+
+
+def test_sem_transicao_nao_dispara():
+    async def teste(planta, motor):
+        await asyncio.sleep(0.1)
+        return motor.estado(), planta.escritas
+    estado, escritas = correr(teste, Planta())
+    assert estado["disparos"] == 0 and escritas == []
+
+
+def test_saida_religada_com_seguranca_ativa_volta_a_disparar():
+    async def teste(planta, motor):
+        planta.regs[ENTRADA] = 0
+        await asyncio.sleep(0.1)
+        planta.regs[SAIDA] = 1        # escrita manual com o canal 4 ainda a 0
+        await asyncio.sleep(0.1)
+        return motor.estado(), planta.regs[SAIDA]
+    estado, saida = correr(teste, Planta())
+    assert estado["disparos"] == 2 and estado["ultimo_disparo"]["motivo"] == "saida_ligada"
+    assert saida == 0
+
+
+def test_saida_que_nao_desliga_e_repetida_com_backoff():
+    async def teste(planta, motor):
+        planta.presa = True
+        planta.regs[ENTRADA] = 0
+        await asyncio.sleep(0.35)
+        presa = motor.estado()
+        planta.presa = False          # a saída volta a obedecer: a repetição seguinte confirma
+        await asyncio.sleep(0.3)
+        return presa, motor.estado(), planta.regs[SAIDA]
+    presa, final, saida = correr(teste, Planta(), confirmacoes=2, repeticao_min=0.05, repeticao_max=0.2)
+    # 1.º disparo falha; repete após 0,05 s, depois 0,1 s, 0,2 s (não a cada leitura de 10 ms)
+    assert presa["ultimo_disparo"]["tentativas"] == 2 and not presa["ultimo_disparo"]["confirmado"]
+    assert 2 <= presa["repeticoes"] <= 4
+    assert final["ultimo_disparo"]["confirmado"] and saida == 0
+    n = final["repeticoes"]
+    assert final["disparos"] == n + 1 and final["nao_confirmados"] == n
+
+
+def test_snapshot_mais_antigo_que_o_interlock_e_ignorado():
+    async def teste(planta, motor):
+        fila, t = motor.comandos, time.monotonic() + 60
+        fila.observar({SAIDA: 0}, t)          # interlock: leitura iniciada em t
+        fila.observar({SAIDA: 1}, t - 0.5)    # snapshot iniciado antes, entregue depois
+        antigo = fila._conhecido(("registo", SAIDA))
+        fila.observar({SAIDA: 1}, t + 0.5)    # leitura mais recente
+        return antigo, fila._conhecido(("registo", SAIDA))
+    assert correr(teste, Planta()) == (0, 1)
+
+
+def test_fila_parada_nao_bloqueia_o_interlock():
+    async def teste(planta, motor):
+        await motor.comandos.parar()          # a fila deixa de executar escritas
+        planta.regs[ENTRADA] = 0
+        await asyncio.sleep(0.3)
+        ciclos = motor.ciclos
+        await asyncio.sleep(0.1)
+        return motor.estado(), motor.ciclos - ciclos
+    estado, ciclos = correr(teste, Planta(), espera_escrita=0.05, repeticao_min=0.05, repeticao_max=0.1)
+    assert not estado["ultimo_disparo"]["confirmado"] and estado["ultimo_disparo"]["tentativas"] == 1
+    assert estado["escritas_expiradas"] >= 2 and estado["repeticoes"] >= 1
+    assert ciclos >= 5                        # as leituras continuam durante os disparos
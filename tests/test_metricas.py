@@ -0,0 +1,38 @@
+from metricas import Registo
+
+
+def test_histograma_cumulativo_por_etiquetas():
+    reg = Registo()
+    h = reg.histograma("lat_segundos", "Latência", ("rota",), limites=(0.01, 0.1))
+    for v in (0.005, 0.01, 0.05, 2.0):
+        h.observar(v, "/a")
+    h.observar(0.02, '/b"x')
+    linhas = reg.exportar().splitlines()
+    assert linhas[:2] == ["# HELP lat_segundos Latência", "# TYPE lat_segundos histogram"]
+    assert 'lat_segundos_bucket{rota="/a",le="0.01"} 2' in linhas        # o limite é inclusivo
+    assert 'lat_segundos_bucket{rota="/a",le="0.1"} 3' in linhas
+    assert 'lat_segundos_bucket{rota="/a",le="+Inf"} 4' in linhas
+    assert 'lat_segundos_count{rota="/a"} 4' in linhas
+    assert 'lat_segundos_sum{rota="/a"} 2.065' in linhas
+    assert 'lat_segundos_count{rota="/b\\"x"} 1' in linhas              # aspas escapadas
+
+
+def test_contador_e_medidor():
+    reg = Registo()
+    c = reg.contador("erros_total", "Erros", ("op",))
+    c.inc("read"); c.inc("read", n=2)
+    reg.medidor("fila", "Pendentes", lambda: {"fl1": 3, "fl2": 0}, ("dispositivo",))
+    reg.medidor("avariado", "Sem valor", lambda: 1 / 0)                # não parte a recolha
+    texto = reg.exportar()
+    assert 'erros_total{op="read"} 3' in texto
+    assert 'fila{dispositivo="fl1"} 3' in texto and 'fila{dispositivo="fl2"} 0' in texto
+    assert "# TYPE avariado gauge" in texto and "\navariado " not in texto
+
+
+def test_rota_metrics_mede_pedidos_pela_rota(cliente):
+    cliente.get("/historico/pressao")
+    cliente.get("/historico/pressao")
+    texto = cliente.get("/metrics").text
+    serie = 'syssense_http_latencia_segundos_count{metodo="GET",rota="/historico/{grandeza}",estado="404"}'
+    linha = next(l for l in texto.splitlines() if l.startswith(serie))
+    assert int(linha.rsplit(" ", 1)[1]) >= 2                          # uma série por rota, não por URL
@@ -0,0 +1,44 @@
+import asyncio, socket
+
+import pytest
+
+from modbus_conexao import ErroModbus, GestorModbus
+
+SAIDA = 26
+
+
+def test_leitura_e_escrita_na_ligacao_persistente(simulador):
+    async def teste():
+        g = GestorModbus("127.0.0.1", simulador.porta, timeout=1.0)
+        await g.escrever_registo(SAIDA, 1)
+        lido = await g.ler_registo(SAIDA)
+        # transações concorrentes são serializadas na mesma ligação
+        blocos = await asyncio.gather(*(g.ler_registos(SAIDA, 2) for _ in range(5)))
+        async with g.transacao():                     # reentrante para a tarefa que a reservou
+            await g.escrever_registo(SAIDA, 0)
+        estado = g.estatisticas()
+        g.fechar()
+        return lido, blocos, estado
+    lido, blocos, estado = asyncio.run(teste())
+    assert lido == 1 and simulador.registo(SAIDA) == 0
+    assert all(len(b) == 2 for b in blocos)
+    assert estado["religacoes"] == 1 and estado["operacoes"]["read"]["chamadas"] == 6
+    assert estado["operacoes"]["write_register"]["erros"] == 0
+
+
+def test_sem_ligacao_falha_depressa_com_backoff():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]          # porta fechada
+    medicoes = []
+    async def teste():
+        g = GestorModbus("127.0.0.1", porta, timeout=0.2, backoff_min=5.0,
+                         ao_medir=lambda *m: medicoes.append(m))
+        for _ in range(3):
+            with pytest.raises(ErroModbus):
+                await g.ler_registo(SAIDA)
+        return g.estatisticas()
+    estado = asyncio.run(teste())
+    # só a primeira chamada tenta ligar; as seguintes esperam pelo fim do backoff
+    assert estado["operacoes"]["connect"] == {**estado["operacoes"]["connect"], "chamadas": 1, "erros": 1}
+    assert [(op, r) for op, _, _, r in medicoes] == [("connect", "erro")]
@@ -0,0 +1,27 @@
+from modbus_snapshot import MAX_REGISTOS_POR_LEITURA, planear_blocos
+
+
+def test_sem_enderecos():
+    assert planear_blocos([]) == []
+
+
+def test_enderecos_proximos_num_so_bloco():
+    assert planear_blocos([17, 26, 20]) == [(17, 10)]
+
+
+def test_lacuna_maior_que_o_limite_separa_blocos():
+    assert planear_blocos([0, 11]) == [(0, 12)]          # lacuna de 10 registos
+    assert planear_blocos([0, 12]) == [(0, 1), (12, 1)]  # lacuna de 11
+    assert planear_blocos([0, 5, 100, 103], max_lacuna=3) == [(0, 1), (5, 1), (100, 4)]
+
+
+def test_duplicados_e_ordem_nao_importam():
+    assert planear_blocos([26, 17, 26, 17]) == planear_blocos([17, 26])
+
+
+def test_blocos_respeitam_o_maximo_do_protocolo():
+    blocos = planear_blocos(range(0, 300, 5))
+    assert all(qtd <= MAX_REGISTOS_POR_LEITURA for _, qtd in blocos)
+    cobertos = {i for inicio, qtd in blocos for i in range(inicio, inicio + qtd)}
+    assert set(range(0, 300, 5)) <= cobertos
+    assert planear_blocos([0, 4, 9], max_qtd=5) == [(0, 5), (9, 1)]
@@ -0,0 +1,45 @@
+import pytest
+
+from motor_contagem import ALTO, BAIXO, MotorContagem
+
+
+def pulsos(motor, amostras, periodo=0.02):
+    contados = []
+    for i, leitura in enumerate(amostras):
+        tipo = motor.amostra(leitura, agora=1 + i * periodo)
+        if tipo: contados.append(tipo)
+    return contados
+
+
+def test_pequena_e_grande_contam_no_fim_do_pulso():
+    eventos = []
+    motor = MotorContagem(None, ao_contar=lambda tipo, total, ts: eventos.append((tipo, total)))
+    motor.semear(10, 3)
+    amostras = ([(BAIXO, BAIXO)] + [(ALTO, BAIXO)] * 3 + [(BAIXO, BAIXO)]          # pequena
+                + [(ALTO, BAIXO), (ALTO, ALTO), (ALTO, BAIXO), (BAIXO, BAIXO)]   # grande
+                + [(ALTO, BAIXO), (BAIXO, BAIXO)])                               # pulso curto
+    assert pulsos(motor, amostras) == ["pequena", "grande", "pequena"]
+    assert eventos == [("pequena", 11), ("grande", 4), ("pequena", 12)]
+    est = motor.estatisticas()
+    assert est["pulsos_curtos"] == 1 and est["grandes_sem_pequena"] == 0
+
+
+def test_grande_sem_pequena_nao_conta():
+    motor = MotorContagem(None)
+    assert pulsos(motor, [(BAIXO, ALTO), (BAIXO, ALTO), (BAIXO, BAIXO)]) == []
+    assert motor.grandes_sem_pequena == 1 and motor.contador_grandes == 0
+
+
+def test_falhas_e_lacunas():
+    motor = MotorContagem(None, periodo=0.02)
+    motor.amostra((BAIXO, BAIXO), agora=1.0)
+    motor.amostra(None, agora=1.02)
+    motor.amostra((BAIXO, BAIXO), agora=1.5)     # depois de uma falha: intervalo não conta
+    motor.amostra((BAIXO, BAIXO), agora=1.6)     # 5 períodos: um pulso pode ter escapado
+    est = motor.estatisticas()
+    assert est["falhas"] == 1 and est["lacunas_suspeitas"] == 1 and est["intervalo_max_ms"] == 100.0
+
+
+def test_registos_tem_de_ser_contiguos():
+    with pytest.raises(ValueError):
+        MotorContagem(None, reg_pequenas=15, reg_grandes=20)
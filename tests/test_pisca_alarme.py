@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from modbus_conexao import ErroModbus
+from pisca_alarme import PiscaAlarme
+
+LUZ = 27
+
+
+class Luz:
+    def __init__(self, falhas=0):
+        self.escritas = []
+        self.falhas = falhas      # primeiras escritas que falham
+
+    async def escrever_registo(self, end, valor):
+        if self.falhas:
+            self.falhas -= 1
+            raise ErroModbus("sem resposta")
+        self.escritas.append((end, valor))
+
+
+def test_pisca_escreve_so_as_mudancas_e_desliga_ao_parar():
+    async def teste():
+        luz, mudancas = Luz(), []
+        pisca = PiscaAlarme(luz, LUZ, padrao="rapido", periodo=0.05, ao_mudar=lambda e: mudancas.append(e["ativo"]))
+        await pisca.iniciar()
+        await asyncio.sleep(0.27)             # passos 0..5 do padrão 1,0,1,0,0,0
+        await pisca.parar()
+        return luz.escritas, pisca.estado(), mudancas
+    escritas, estado, mudancas = asyncio.run(teste())
+    assert [v for _, v in escritas] == [1, 0, 1, 0, 0]       # 3 zeros seguidos = 1 escrita; + parar
+    assert all(end == LUZ for end, _ in escritas)
+    assert estado["passos"] == 6 and not estado["ativo"] and mudancas == [True, False]
+    assert estado["deriva_max_ms"] < 50
+
+
+def test_falha_de_escrita_repete_no_passo_seguinte():
+    async def teste():
+        luz = Luz(falhas=1)
+        pisca = PiscaAlarme(luz, LUZ, padrao="fixo", periodo=0.05)
+        await pisca.iniciar()
+        await asyncio.sleep(0.12)
+        await pisca.parar()
+        return luz.escritas, pisca.erros
+    escritas, erros = asyncio.run(teste())
+    assert escritas == [(LUZ, 1), (LUZ, 0)] and erros == 1
+
+
+def test_parametros_invalidos():
+    async def teste(**kw):
+        await PiscaAlarme(Luz(), LUZ).iniciar(**kw)
+    with pytest.raises(ValueError):
+        asyncio.run(teste(padrao="morse"))
+    with pytest.raises(ValueError):
+        asyncio.run(teste(periodo=0.001))
@@ -0,0 +1,37 @@
+import importlib, json, sys
+from datetime import datetime
+
+from bson import ObjectId
+
+import serializacao
+
+DOC = {"timestamp": datetime(2026, 1, 1, 10, 0, 0, 250000), "_id": ObjectId("65a000000000000000000001"),
+       "valor": 21.5, "texto": "ação", "lista": [1, None, True]}
+ESPERADO = {"timestamp": "2026-01-01T10:00:00.250000", "_id": "65a000000000000000000001",
+            "valor": 21.5, "texto": "ação", "lista": [1, None, True]}
+
+
+def test_serializa_datas_e_objectid():
+    assert json.loads(serializacao.dumps(DOC)) == ESPERADO
+    assert serializacao.RespostaJSON(DOC).body == serializacao.dumps(DOC)
+
+
+def test_sem_orjson_o_resultado_e_o_mesmo(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)          # import orjson → ImportError
+    try:
+        sem = importlib.reload(serializacao)
+        assert sem.orjson is None
+        assert json.loads(sem.dumps(DOC)) == ESPERADO
+        assert sem.dumps_str({"a": 1}) == '{"a":1}'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(serializacao)
+
+
+def test_ingestao_rapida_so_confirma(cliente, api, monkeypatch):
+    monkeypatch.setattr(api, "INGESTAO_RAPIDA", True)
+    r = cliente.post("/temperatura_logger", json={"sensor": "rapida", "valor": 1.0, "timestamp": "2036-01-01T00:00:00"})
+    assert r.status_code == 204 and r.content == b""
+    r = cliente.post("/temperatura_logger/lote", json=[{"sensor": "rapida", "valor": 2.0, "timestamp": "2036-01-01T00:00:01"}])
+    assert r.status_code == 204
+    assert api.col_temp.count_documents({"meta.sensor": "rapida"}) == 2
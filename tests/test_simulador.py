@@ -0,0 +1,41 @@
+import asyncio, time
+
+import pytest
+
+from modbus_conexao import GestorModbus
+from simulador_fieldlogger import ALTO, COIL_VENTILADOR, REG_TEMPERATURA, TremPulsos
+
+
+def amostrar(trem, duracao, passo=0.01):
+    """Flancos de subida (pequena, grande) vistos a amostrar de `passo` em `passo` s."""
+    base, anterior, flancos = time.monotonic(), None, []
+    for k in range(int(duracao / passo)):
+        atual = trem.estado(base + k * passo)
+        if atual[0] == ALTO and (anterior is None or anterior[0] != ALTO):
+            flancos.append("grande" if atual[1] == ALTO else "pequena")
+        anterior = atual
+    return flancos
+
+
+def test_trem_de_pulsos_determinista_e_contado():
+    a = amostrar(TremPulsos(0.1, 0.03, prop_grandes=0.5, jitter=0.2, semente=7), 3.0)
+    b = amostrar(TremPulsos(0.1, 0.03, prop_grandes=0.5, jitter=0.2, semente=7), 3.0)
+    assert a == b and 25 <= len(a) <= 32 and "grande" in a and "pequena" in a
+    trem = TremPulsos(0.1, 0.03, prop_grandes=0.5, semente=7)
+    vistos = amostrar(trem, 3.0)
+    assert sum(trem.gerados.values()) in (len(vistos), len(vistos) - 1)   # o último pode não ter acabado
+    with pytest.raises(ValueError):
+        TremPulsos(0.1, 0.2)
+
+
+def test_simulador_responde_como_o_fieldlogger(simulador):
+    async def teste():
+        g = GestorModbus("127.0.0.1", simulador.porta)
+        temperatura = await g.ler_registo(REG_TEMPERATURA)
+        await g.escrever_coil(COIL_VENTILADOR, 1)
+        g.fechar()
+        return temperatura
+    escritas = simulador.escritas
+    temperatura = asyncio.run(teste())
+    assert 20 <= temperatura - 5 <= 26                    # PT100 bruto = °C + 5
+    assert simulador.coil(COIL_VENTILADOR) == 1 and simulador.escritas == escritas + 1
@@ -0,0 +1,441 @@
+import argparse, json, os, signal, sys, threading, time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pymodbus.client import ModbusTcpClient
+
+# o planeamento dos blocos é o mesmo do motor de snapshot da API (raiz do repositório)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modbus_snapshot import planear_blocos
+from fila_envio import API_URL, PASTA_FILAS, FilaEnvio
+from compressao import ATRASO_MAX, Compressor
+from motor_contagem import MotorContagem, sequencia_inicial
+from estimador_velocidade import EstimadorVelocidade, MotorVelocidade
+
+# ---------------- Configurações ----------------
+PASTA = os.path.dirname(os.path.abspath(__file__))
+MAPA_CANAIS = os.path.join(PASTA, "canais.json")
+
+JANELA_COALESCENCIA = 0.005   # s; canais devidos dentro desta janela são lidos juntos
+MAX_LACUNA          = 10      # registos lidos a mais antes de abrir outra transação
+TIMEOUT_MODBUS      = 0.5     # s
+BACKOFF_MAX         = 5.0     # s
+INTERVALO_ESTADO    = 30      # s entre linhas de estado na consola
+BLOQUEIO            = os.path.join(PASTA_FILAS, "aquisicao.lock")   # uma só instância por máquina
+
+
+# ---------------- Tipos de canal ----------------
+class Canal:
+    """Base: nome, intervalo, registos a ler e estatísticas de agendamento."""
+
+    registos = ()
+
+    def __init__(self, cfg, fila, dispositivo=None):
+        self.nome      = cfg["nome"]
+        self.intervalo = float(cfg["intervalo"])
+        self.endpoint  = cfg.get("endpoint")
+        self.fila      = fila
+        self.dispositivo = dispositivo   # id no registo da API (None = dispositivo por omissão)
+        self.proximo   = 0.0
+        self.leituras  = 0
+        self.falhas    = 0
+        self._atraso_soma = 0.0
+        self._atraso_max  = 0.0
+
+    def agendar(self, agora):
+        """Marca o próximo instante devido (calendário absoluto, realinha se atrasado)."""
+        atraso = agora - self.proximo
+        if self.leituras or self.falhas:
+            self._atraso_soma += atraso
+            if atraso > self._atraso_max: self._atraso_max = atraso
+        self.proximo += self.intervalo
+        if self.proximo <= agora:
+            self.proximo = agora + self.intervalo
+
+    def enviar(self, endpoint, payload):
+        if self.dispositivo is not None: payload["dispositivo"] = self.dispositivo
+        self.fila.enfileirar(endpoint, payload)
+
+    def processar(self, valores, ligado, ts):
+        """valores: endereço -> valor (ausente se o bloco falhou); ligado: FieldLogger acessível."""
+        raise NotImplementedError
+
+    def terminar(self):
+        """Envia o que o canal ainda retém (chamado ao parar o daemon)."""
+
+    def estado(self):
+        n = (self.leituras + self.falhas) or 1
+        return {"intervalo_s": self.intervalo, "leituras": self.leituras, "falhas": self.falhas,
+                "atraso_medio_ms": round(self._atraso_soma / n * 1000, 2),
+                "atraso_max_ms": round(self._atraso_max * 1000, 2)}
+
+
+class CanalAnalogico(Canal):
+    """Registo analógico com escala/offset e compressão opcional (temperatura, humidade...)."""
+
+    def __init__(self, cfg, fila, dispositivo=None):
+        super().__init__(cfg, fila, dispositivo)
+        self.registo = int(cfg["registo"])
+        self.registos = (self.registo,)
+        self.escala  = float(cfg.get("escala", 1.0))
+        self.offset  = float(cfg.get("offset", 0.0))
+        self.decimais = cfg.get("decimais")
+        self.sensor  = cfg.get("sensor", self.nome)
+        c = cfg.get("compressao")
+        self.compressor = Compressor(c["modo"], c["desvio"], c.get("silencio_max", 300),
+                                     c.get("atraso_max", ATRASO_MAX)) if c else None
+
+    def processar(self, valores, ligado, ts):
+        bruto = valores.get(self.registo)
+        if bruto is None:
+            self.falhas += 1
+            return
+        self.leituras += 1
+        valor = bruto * self.escala + self.offset
+        if self.decimais is not None: valor = round(valor, self.decimais)
+        self._enviar_pontos(self.compressor.avaliar(valor, ts) if self.compressor
+                            else [{"timestamp": ts, "valor": valor}])
+
+    def _enviar_pontos(self, pontos):
+        for p in pontos:
+            payload = {"sensor": self.sensor, "valor": p["valor"], "timestamp": p["timestamp"].isoformat()}
+            if "compressao" in p: payload["compressao"] = p["compressao"]
+            self.enviar(self.endpoint, payload)
+
+    def terminar(self):
+        # swinging door: a última leitura fica retida até se saber se era necessária
+        if self.compressor: self._enviar_pontos(self.compressor.pendente())
+
+    def estado(self):
+        e = super().estado()
+        if self.compressor: e["compressao"] = f"{self.compressor.razao()}:1"
+        return e
+
+
+class CanalContagem(Canal):
+    """Peças pequenas/grandes: dois registos contíguos entregues ao MotorContagem."""
+
+    def __init__(self, cfg, fila, dispositivo=None):
+        super().__init__(cfg, fila, dispositivo)
+        reg = int(cfg["registo"])
+        self.registos = (reg, reg + 1)
+        self.endpoint_grandes = cfg["endpoint_grandes"]
+        self.motor = MotorContagem(None, reg_pequenas=reg, reg_grandes=reg + 1,
+                                   periodo=self.intervalo, ao_contar=self._ao_contar)
+
+    def _ao_contar(self, tipo, total, ts):
+        if tipo == "grande":
+            endpoint, sensor = self.endpoint_grandes, "ContadorGrandes"
+        else:
+            endpoint, sensor = self.endpoint, "ContadorPequenas"
+        self.enviar(endpoint, {"valor": total, "sensor": sensor, "timestamp": ts.isoformat()})
+
+    def processar(self, valores, ligado, ts):
+        leitura = tuple(valores.get(r) for r in self.registos)
+        if None in leitura:
+            self.falhas += 1
+            self.motor.amostra(None)
+            return
+        self.leituras += 1
+        self.motor.amostra(leitura)
+
+    def estado(self):
+        return {**super().estado(), **self.motor.estatisticas()}
+
+
+class CanalVelocidade(Canal):
+    """
+    Pulso do tapete: cada flanco 0→ativo é datado e entregue ao EstimadorVelocidade
+    (velocidade pelos intervalos entre pulsos, paragem adaptativa); a estimativa é
+    publicada a cada `publicacao_s`, com jitter e confiança.
+    """
+
+    def __init__(self, cfg, fila, dispositivo=None):
+        super().__init__(cfg, fila, dispositivo)
+        self.registo = int(cfg["registo"])
+        self.registos = (self.registo,)
+        distancia = float(cfg["distancia_m"])
+        self.estimador = EstimadorVelocidade(
+            distancia, int(cfg.get("janela_pulsos", 8)),
+            paragem_max=float(cfg.get("paragem_max_s", cfg.get("tempo_ativo_s", 60))),
+            resolucao=self.intervalo,
+            velocidade_nominal=distancia / float(cfg["tempo_s"]) if cfg.get("tempo_s") else None)
+        self.motor = MotorVelocidade(self.estimador, periodo=self.intervalo,
+                                     ativo=int(cfg.get("valor_ativo", 5)))
+        self.publicacao = float(cfg.get("publicacao_s", 1.0))
+        self._proxima_publicacao = 0.0
+        c = cfg.get("compressao") or {"modo": "deadband", "desvio": 0.005}
+        self.compressor = Compressor(c["modo"], c["desvio"], c.get("silencio_max", 300))
+
+    def processar(self, valores, ligado, ts):
+        estado = valores.get(self.registo)
+        if estado is None: self.falhas += 1
+        else: self.leituras += 1
+        agora = time.monotonic()
+        self.motor.amostra(estado, agora)
+        if agora < self._proxima_publicacao:
+            return
+        self._proxima_publicacao = agora + self.publicacao
+        est = self.estimador.estimar(agora)
+        for p in self.compressor.avaliar(est["velocidade"], ts):
+            self.enviar(self.endpoint, {"timestamp": p["timestamp"].isoformat(),
+                                        "valor": p["valor"], "compressao": p["compressao"],
+                                        "jitter_ms": est["jitter_ms"], "confianca": est["confianca"]})
+
+    def estado(self):
+        return {**super().estado(), **self.motor.estatisticas(), **self.estimador.estimar()}
+
+
+class CanalStatus(Canal):
+    """Estado da ligação ao FieldLogger (1 = acessível, 0 = sem ligação)."""
+
+    def processar(self, valores, ligado, ts):
+        self.leituras += 1
+        self.enviar(self.endpoint, {"status": 1 if ligado else 0, "timestamp": ts.isoformat()})
+
+
+TIPOS = {
+    "analogico":  CanalAnalogico,
+    "contagem":   CanalContagem,
+    "velocidade": CanalVelocidade,
+    "status":     CanalStatus,
+}
+
+
+# ---------------- Agendador ----------------
+class Aquisicao:
+    """
+    Uma só ligação Modbus para todos os canais de um FieldLogger.
+    Os canais devidos no mesmo instante são lidos juntos, agrupados em blocos
+    contíguos (uma transação por bloco). Com vários FieldLoggers ("dispositivos"
+    no mapa), cada um tem a sua Aquisicao: thread, ligação, timeout e fila
+    próprios, e as leituras seguem com o id do dispositivo.
+    """
+
+    def __init__(self, mapa, dispositivo=None):
+        if dispositivo is None:
+            fl = mapa["fieldlogger"]
+            # SYSSENSE_FIELDLOGGER_*: aponta o daemon para outro equipamento (ex.: simulador do bench/)
+            self.ip = os.environ.get("SYSSENSE_FIELDLOGGER_IP", fl["ip"])
+            self.porta = int(os.environ.get("SYSSENSE_FIELDLOGGER_PORT", fl.get("porta", 502)))
+            self.id, fila = None, mapa.get("fila", "aquisicao")
+        else:
+            fl = dispositivo
+            self.ip, self.porta = fl["ip"], int(fl.get("porta", 502))
+            self.id = str(fl["id"])
+            fila = f'{mapa.get("fila", "aquisicao")}_{self.id}'
+        self.unit_id = int(fl.get("unit_id", 1))
+        self._client = ModbusTcpClient(self.ip, port=self.porta, timeout=float(fl.get("timeout", TIMEOUT_MODBUS)))
+        self._proxima_ligacao = 0.0
+        self._backoff = 0.0
+        self.fila = FilaEnvio(fila, api_url=mapa.get("api_url", API_URL))
+        self.canais = [TIPOS[c["tipo"]](c, self.fila, self.id)
+                       for c in mapa["canais"] if c.get("ativo", True)]
+        self.ciclos = 0
+        self.transacoes = 0
+        self._parar = threading.Event()
+        self._thread = None
+
+    # ---------------- Modbus ----------------
+    def _ligar(self):
+        if self._client.connected:
+            return True
+        agora = time.monotonic()
+        if agora < self._proxima_ligacao:
+            return False
+        if self._client.connect():
+            self._backoff = 0.0
+            return True
+        self._backoff = min(max(self._backoff * 2, 0.5), BACKOFF_MAX)
+        self._proxima_ligacao = agora + self._backoff
+        return False
+
+    def _ler(self, enderecos):
+        valores, ligado = {}, self._ligar()
+        if not ligado or not enderecos:
+            return valores, ligado
+        for inicio, qtd in planear_blocos(enderecos, MAX_LACUNA):
+            try:
+                resp = self._client.read_holding_registers(address=inicio, count=qtd, slave=self.unit_id)
+                self.transacoes += 1
+                if resp.isError(): continue
+                valores.update(zip(range(inicio, inicio + qtd), resp.registers))
+            except Exception:
+                self._client.close()   # ligação morta: volta a ligar no próximo ciclo
+                ligado = False
+                break
+        return valores, ligado
+
+    # ---------------- Ciclo ----------------
+    def correr(self):
+        agora = time.monotonic()
+        for c in self.canais: c.proximo = agora
+        while not self._parar.is_set():
+            proximo = min(c.proximo for c in self.canais)
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+            agora = time.monotonic()
+            devidos = [c for c in self.canais if c.proximo <= agora + JANELA_COALESCENCIA]
+            valores, ligado = self._ler([r for c in devidos for r in c.registos])
+            ts = datetime.utcnow()
+            for c in devidos:
+                try:
+                    c.processar(valores, ligado, ts)
+                except Exception as e:
+                    c.falhas += 1
+                    print(f"[{ts}] Erro no canal {c.nome}: {e}")
+                c.agendar(agora)
+            self.ciclos += 1
+
+    def iniciar(self):
+        for c in self.canais:
+            # cada FieldLogger retoma a numeração da sua própria sequência no servidor
+            if isinstance(c, CanalContagem):
+                seq = sequencia_inicial(self.fila, c.endpoint, c.endpoint_grandes, self.id)
+                if seq: c.motor.semear(*seq)
+        self._thread = threading.Thread(target=self.correr, name=f"aquisicao-{self.id or self.ip}", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def parar(self, timeout=5.0):
+        """Para o ciclo e guarda na fila o que os canais ainda retêm (a fila é persistente)."""
+        self._parar.set()
+        if self._thread: self._thread.join(timeout)
+        for c in self.canais:
+            try:
+                c.terminar()
+            except Exception as e:
+                print(f"[{datetime.utcnow()}] Erro ao terminar o canal {c.nome}: {e}")
+        self._client.close()
+
+    def estado(self):
+        return {
+            "dispositivo": self.id,
+            "fieldlogger": f"{self.ip}:{self.porta}",
+            "ligado": bool(self._client.connected),
+            "ciclos": self.ciclos,
+            "transacoes": self.transacoes,
+            "canais": {c.nome: c.estado() for c in self.canais},
+            "fila": self.fila.estado(),
+        }
+
+
+# ---------------- Semear o mapa a partir do Config_Logger.FLC ----------------
+# registos Modbus do FieldLogger: analógico N -> 2+N, digital N -> 13+N
+ANALOGICOS_CONHECIDOS = {
+    "SensorTemp": {"nome": "temperatura", "endpoint": "/temperatura_logger", "sensor": "Sensor1",
+                   "offset": -5, "compressao": {"modo": "swinging_door", "desvio": 0.2}},
+    "SensorHum":  {"nome": "humidade", "endpoint": "/humidade_logger", "sensor": "SensorHum",
+                   "decimais": 2, "compressao": {"modo": "swinging_door", "desvio": 0.5}},
+}
+
+def semear(caminho_flc):
+    """Gera um mapa de canais a partir da configuração exportada do FieldLogger."""
+    fl = ET.parse(caminho_flc).getroot().find(".//FieldLogger")
+    ip = fl.findtext("INTERFACE_ETHERNET/EnderecoIP") or "192.168.0.30"
+    canais = []
+
+    for i, ch in enumerate(fl.findall("CANAIS_ANALOGICOS/Canais/Canal"), start=1):
+        if ch.findtext("CanalHabilitado") != "1": continue
+        tag = ch.findtext("Tag") or f"Analogico{i}"
+        base = {"nome": tag.lower(), "tipo": "analogico", "registo": 2 + i, "intervalo": 5,
+                "escala": float(ch.findtext("Ganho") or 1), "offset": 0, "endpoint": None, "sensor": tag}
+        canais.append({**base, **ANALOGICOS_CONHECIDOS.get(tag, {})})
+
+    tags = {ch.findtext("Tag"): 13 + i
+            for i, ch in enumerate(fl.findall("CANAIS_DIGITAIS/Canais/Canal"), start=1)
+            if ch.findtext("CanalHabilitado") == "1"}
+    if "Unidades" in tags:
+        canais.append({"nome": "contagem", "tipo": "contagem", "registo": tags["Unidades"],
+                       "intervalo": 0.02, "endpoint": "/contador_unidades_logger",
+                       "endpoint_grandes": "/contador_unidades_logger_grandes"})
+    if "Encoder" in tags:
+        canais.append({"nome": "velocidade", "tipo": "velocidade", "registo": tags["Encoder"],
+                       "intervalo": 0.02, "endpoint": "/velocidade_logger",
+                       "distancia_m": 0.455, "tempo_s": 17, "janela_pulsos": 8,
+                       "paragem_max_s": 60, "publicacao_s": 1,
+                       "compressao": {"modo": "deadband", "desvio": 0.005}})
+    canais.append({"nome": "status", "tipo": "status", "intervalo": 15, "endpoint": "/status_logger"})
+
+    return {"fieldlogger": {"ip": ip, "porta": 502, "unit_id": 1},
+            "api_url": "http://127.0.0.1:8000", "canais": canais}
+
+
+def validar(mapa):
+    ids = [str(d.get("id", "")) for d in mapa.get("dispositivos", [])]
+    if "" in ids or len(set(ids)) != len(ids):
+        raise ValueError("Cada dispositivo precisa de um id único (o mesmo do registo da API)")
+    if not ids and "fieldlogger" not in mapa:
+        raise ValueError("Falta o fieldlogger (ou a lista de dispositivos)")
+    for c in mapa["canais"]:
+        if c.get("tipo") not in TIPOS:
+            raise ValueError(f"Canal {c.get('nome')}: tipo desconhecido {c.get('tipo')}")
+        if not c.get("endpoint"):
+            raise ValueError(f"Canal {c['nome']}: falta o endpoint da API")
+        if float(c.get("intervalo", 0)) <= 0:
+            raise ValueError(f"Canal {c['nome']}: intervalo inválido")
+    return mapa
+
+
+# ---------------- Instância única ----------------
+def bloquear_instancia(caminho=BLOQUEIO):
+    """
+    Bloqueio exclusivo do ficheiro (libertado pelo SO se o processo morrer).
+    Devolve o ficheiro aberto, ou None se outro daemon já estiver a correr:
+    dois daemons enviariam cada leitura duas vezes e duplicavam as peças.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    f = open(caminho, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+# ---------------- Arranque ----------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Daemon de aquisição do FieldLogger (todos os canais)")
+    ap.add_argument("--mapa", default=MAPA_CANAIS, help="mapa de canais (JSON)")
+    ap.add_argument("--semear", metavar="FLC", help="gera o mapa a partir de um ficheiro .FLC e sai")
+    args = ap.parse_args()
+
+    if args.semear:
+        print(json.dumps(semear(args.semear), indent=2, ensure_ascii=False))
+        raise SystemExit
+
+    with open(args.mapa, encoding="utf-8") as f:
+        mapa = validar(json.load(f))
+    bloqueio = bloquear_instancia()
+    if bloqueio is None:
+        raise SystemExit(f"Outro daemon de aquisição já está a correr ({BLOQUEIO})")
+    # um FieldLogger offline só atrasa a sua própria thread
+    aquisicoes = [Aquisicao(mapa, d) for d in mapa.get("dispositivos") or [None]]
+    for a in aquisicoes:
+        a.iniciar()
+    # paragem do serviço: sai pelo finally para guardar os pontos retidos pela compressão
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(INTERVALO_ESTADO)
+            for a in aquisicoes:
+                e = a.estado()
+                print(f"[{datetime.utcnow()}] {e['dispositivo'] or e['fieldlogger']} ligado={e['ligado']} "
+                      f"ciclos={e['ciclos']} transações={e['transacoes']} fila={e['fila']['pendentes']} "
+                      f"(atraso {e['fila']['atraso_s']} s)")
+                for nome, c in e["canais"].items():
+                    print(f"    {nome:12} {c['leituras']:>8} leituras  {c['falhas']:>5} falhas  "
+                          f"atraso médio {c['atraso_medio_ms']} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for a in aquisicoes:
+            a.parar()
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+# ---------------- Configurações ----------------
+MODOS = ("deadband", "swinging_door")
+SILENCIO_MAX = 300.0   # s; envia pelo menos um ponto a cada SILENCIO_MAX (heartbeat)
+ATRASO_MAX   = 10.0    # s; swinging door: atraso máximo do último ponto enviado numa rampa
+
+
+# ---------------- Compressor por canal ----------------
+class Compressor:
+    """
+    Decide que leituras de um canal analógico são enviadas para a API.
+
+    - deadband: envia quando o valor se afasta mais de `desvio` do último
+      enviado; o sinal reconstrói-se em degraus (step).
+    - swinging_door: envia os pontos necessários para que a reta entre dois
+      pontos enviados passe a menos de `desvio` de todas as leituras
+      intermédias; o sinal reconstrói-se por interpolação linear. Os pontos
+      são enviados com atraso de uma leitura (só se sabe que um ponto era
+      necessário quando a seguinte já não cabe na "porta"). Numa rampa
+      constante a porta nunca fecha: se passar `atraso_max` desde o último
+      ponto enviado e a leitura atual já estiver a mais de `desvio` dele, a
+      leitura atual é enviada (fecha o segmento), para que a API, o controlo
+      e os dashboards não fiquem com um valor parado durante a rampa.
+
+    Em ambos os modos é enviado um heartbeat se passar `silencio_max` sem
+    envios, para distinguir "sinal estável" de "coletor parado".
+    Cada ponto devolvido leva os metadados de compressão para a API. Ao
+    terminar o coletor, pendente() devolve a última leitura ainda retida.
+    """
+
+    def __init__(self, modo="deadband", desvio=0.2, silencio_max=SILENCIO_MAX, atraso_max=ATRASO_MAX):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de compressão desconhecido: {modo}")
+        if desvio < 0:
+            raise ValueError("O desvio não pode ser negativo")
+        self.modo = modo
+        self.desvio = desvio
+        self.silencio_max = silencio_max
+        self.atraso_max = atraso_max
+        self._arquivo = None     # (ts, valor) do último ponto enviado
+        self._ultimo  = None     # (ts, valor) da última leitura recebida (swinging door)
+        self._sup = self._inf = None
+        self.recebidas = 0
+        self.enviadas  = 0
+
+    def _ponto(self, ts, valor, motivo):
+        self._arquivo = (ts, valor)
+        self.enviadas += 1
+        return {"timestamp": ts, "valor": valor,
+                "compressao": {"modo": self.modo, "desvio": self.desvio, "motivo": motivo}}
+
+    def avaliar(self, valor, ts=None):
+        """Recebe uma leitura; devolve a lista (possivelmente vazia) de pontos a enviar."""
+        ts = ts or datetime.utcnow()
+        self.recebidas += 1
+        if self._arquivo is None:
+            return [self._ponto(ts, valor, "inicial")]
+
+        t0, v0 = self._arquivo
+        dt = (ts - t0).total_seconds()
+        if dt <= 0:
+            return []   # leitura repetida/fora de ordem
+
+        if self.modo == "deadband":
+            if abs(valor - v0) > self.desvio:
+                return [self._ponto(ts, valor, "desvio")]
+            if dt >= self.silencio_max:
+                return [self._ponto(ts, valor, "heartbeat")]
+            return []
+        return self._swinging_door(ts, valor, dt)
+
+    def _swinging_door(self, ts, valor, dt):
+        t0, v0 = self._arquivo
+        if self._ultimo is not None and ts <= self._ultimo[0]:
+            return []
+        pontos = []
+        sup = (valor + self.desvio - v0) / dt
+        inf = (valor - self.desvio - v0) / dt
+        if dt >= self.silencio_max:
+            # envia a leitura atual como heartbeat; a anterior só fecha o segmento se a
+            # atual já não couber na porta (num sinal estável bastam os heartbeats)
+            cabe = self._sup is None or max(self._inf, inf) <= min(self._sup, sup)
+            if self._ultimo is not None and not cabe:
+                pontos.append(self._ponto(*self._ultimo, "desvio"))
+            pontos.append(self._ponto(ts, valor, "heartbeat"))
+            self._ultimo = None
+            self._sup = self._inf = None
+            return pontos
+
+        self._sup = sup if self._sup is None else min(self._sup, sup)
+        self._inf = inf if self._inf is None else max(self._inf, inf)
+
+        if self._inf > self._sup and self._ultimo is not None:
+            # a leitura atual já não cabe na porta: a anterior passa a ponto enviado
+            ta, va = self._ultimo
+            pontos.append(self._ponto(ta, va, "desvio"))
+            dt = (ts - ta).total_seconds()
+            self._sup = (valor + self.desvio - va) / dt
+            self._inf = (valor - self.desvio - va) / dt
+        elif dt >= self.atraso_max and abs(valor - v0) > self.desvio:
+            # rampa: a leitura atual cabe na porta (o segmento até ela é válido), envia-a já
+            pontos.append(self._ponto(ts, valor, "atraso"))
+            self._ultimo = None
+            self._sup = self._inf = None
+            return pontos
+        self._ultimo = (ts, valor)
+        return pontos
+
+    def pendente(self):
+        """Última leitura ainda não enviada (enviar ao terminar o coletor)."""
+        if self.modo == "swinging_door" and self._ultimo is not None:
+            ponto = self._ponto(*self._ultimo, "final")
+            self._ultimo = None
+            self._sup = self._inf = None
+            return [ponto]
+        return []
+
+    def razao(self):
+        """Leituras recebidas por ponto enviado."""
+        return round(self.recebidas / self.enviadas, 1) if self.enviadas else 0.0
@@ -0,0 +1,174 @@
+import threading, time
+
+import numpy as np
+
+# ---------------- Configurações ----------------
+ALTO  = 5      # valor do registo com o pulso do encoder ativo
+
+PERIODO_AMOSTRAGEM = 0.02   # s entre leituras: cada flanco fica datado com ±10 ms
+JANELA_PULSOS      = 8      # intervalos entre pulsos usados na estimativa
+FATOR_PARAGEM      = 3.0    # parado se passar FATOR_PARAGEM × período típico sem pulso
+PARAGEM_MIN_S      = 2.0    # s; limites do tempo de paragem adaptativo
+PARAGEM_MAX_S      = 60.0   # s; também usado antes de haver período conhecido
+TOLERANCIA_PERIODO = 0.5    # intervalos a mais de ±50 % da mediana contam como anómalos
+
+
+# ---------------- Buffer circular ----------------
+class Anel:
+    """Buffer circular de tamanho fixo sobre um array numpy (sem alocações por amostra)."""
+
+    def __init__(self, capacidade):
+        self._dados = np.zeros(capacidade, dtype=np.float64)
+        self._i = 0     # próxima posição a escrever
+        self.n  = 0     # valores guardados
+
+    def juntar(self, valor):
+        self._dados[self._i] = valor
+        self._i = (self._i + 1) % len(self._dados)
+        if self.n < len(self._dados): self.n += 1
+
+    def valores(self):
+        """Valores por ordem cronológica (cópia)."""
+        if self.n < len(self._dados):
+            return self._dados[:self.n].copy()
+        return np.concatenate((self._dados[self._i:], self._dados[:self._i]))
+
+    def ultimo(self):
+        return float(self._dados[self._i - 1]) if self.n else None
+
+    def limpar(self):
+        self._i = self.n = 0
+
+
+# ---------------- Estimador ----------------
+class EstimadorVelocidade:
+    """
+    Velocidade do tapete a partir dos instantes dos pulsos do encoder:
+      - velocidade = distância por pulso / mediana dos últimos intervalos
+        (a mediana ignora um pulso perdido ou duplicado);
+      - se o intervalo em curso já é mais longo que o típico, a velocidade
+        desce com ele (distância / tempo desde o último pulso);
+      - parado quando passa FATOR_PARAGEM × período típico sem pulsos
+        (limitado a [paragem_min, paragem_max]); a janela recomeça no
+        arranque seguinte, para não medir o intervalo da paragem;
+      - jitter = desvio padrão dos intervalos normais; confiança (0..1) desce
+        com poucos pulsos, jitter alto, intervalos anómalos, resolução de
+        amostragem grosseira e intervalo em curso atrasado.
+    """
+
+    def __init__(self, distancia_m, janela=JANELA_PULSOS, fator_paragem=FATOR_PARAGEM,
+                 paragem_min=PARAGEM_MIN_S, paragem_max=PARAGEM_MAX_S,
+                 resolucao=PERIODO_AMOSTRAGEM, velocidade_nominal=None):
+        if distancia_m <= 0 or janela < 1:
+            raise ValueError("Distância por pulso e janela têm de ser positivas")
+        self.distancia   = distancia_m
+        self.janela      = janela
+        self.fator_paragem = fator_paragem
+        self.paragem_min = paragem_min
+        self.paragem_max = paragem_max
+        self.resolucao   = resolucao            # incerteza de cada instante (período de amostragem)
+        self.velocidade_nominal = velocidade_nominal   # enquanto não há dois pulsos (ou None)
+        self._flancos = Anel(janela + 1)        # janela + 1 instantes = janela intervalos
+        self._lock = threading.Lock()           # o amostrador e quem publica correm em threads diferentes
+        self.pulsos = 0
+        self.arranques = 0
+
+    def _periodo(self, intervalos):
+        return float(np.median(intervalos)) if len(intervalos) else None
+
+    def _limite_paragem(self, periodo):
+        if periodo is None: return self.paragem_max
+        return min(max(self.fator_paragem * periodo, self.paragem_min), self.paragem_max)
+
+    def flanco(self, t):
+        """Regista um pulso no instante t (time.monotonic)."""
+        with self._lock:
+            ultimo = self._flancos.ultimo()
+            if ultimo is not None:
+                periodo = self._periodo(np.diff(self._flancos.valores()))
+                if t - ultimo > self._limite_paragem(periodo):
+                    self._flancos.limpar()     # primeiro pulso depois de uma paragem
+                    self.arranques += 1
+            self._flancos.juntar(t)
+            self.pulsos += 1
+
+    def estimar(self, agora=None):
+        agora = agora or time.monotonic()
+        with self._lock:
+            instantes = self._flancos.valores()
+        intervalos = np.diff(instantes)
+        periodo = self._periodo(intervalos)
+        aberto = agora - instantes[-1] if len(instantes) else None   # desde o último pulso
+
+        if aberto is None or aberto > self._limite_paragem(periodo):
+            return {"velocidade": 0.0, "parado": True, "periodo_s": None, "jitter_ms": None,
+                    "confianca": 1.0 if aberto is not None else 0.0, "intervalos": len(intervalos)}
+        if periodo is None:
+            # um só pulso: em movimento, mas sem período medido
+            return {"velocidade": self.velocidade_nominal or 0.0, "parado": False, "periodo_s": None,
+                    "jitter_ms": None, "confianca": 0.0, "intervalos": 0}
+
+        normais = intervalos[np.abs(intervalos - periodo) <= TOLERANCIA_PERIODO * periodo]
+        if not len(normais): normais = intervalos   # dois intervalos muito diferentes
+        media = float(normais.mean())
+        jitter = float(normais.std())
+        efetivo = max(periodo, aberto)
+        confianca = (min(1.0, len(intervalos) / self.janela)
+                     * len(normais) / len(intervalos)
+                     * max(0.0, 1.0 - jitter / media)
+                     * max(0.0, 1.0 - self.resolucao / periodo)
+                     * periodo / efetivo)
+        return {"velocidade": round(self.distancia / efetivo, 5), "parado": False,
+                "periodo_s": round(periodo, 4), "jitter_ms": round(jitter * 1000, 2),
+                "confianca": round(confianca, 3), "intervalos": len(intervalos)}
+
+
+# ---------------- Amostrador ----------------
+class MotorVelocidade:
+    """
+    Recebe as leituras do registo do encoder (feitas pelo ciclo de aquisição)
+    e entrega cada flanco 0→ativo ao estimador. O instante do flanco é o
+    ponto médio entre a amostra anterior e a que o viu, pelo que o erro fica
+    em ± meio período de amostragem.
+    """
+
+    def __init__(self, estimador, periodo=PERIODO_AMOSTRAGEM, ativo=ALTO):
+        self.periodo  = periodo
+        self.ativo    = ativo
+        self.estimador = estimador
+        self._estado  = None           # último valor lido (None = desconhecido)
+        self._anterior = None          # monotonic da última amostra válida
+
+        self.amostras = self.falhas = 0
+        self.flancos  = 0
+        self._intervalo_max = 0.0
+        self._inicio = time.monotonic()
+
+    def amostra(self, valor, agora=None):
+        """Regista uma leitura do registo (None se falhou); devolve True num flanco."""
+        agora = agora or time.monotonic()
+        if valor is None:
+            self.falhas += 1
+            self._estado = self._anterior = None   # um flanco durante a falha não tem instante
+            return False
+        self.amostras += 1
+        flanco = valor == self.ativo and self._estado is not None and self._estado != self.ativo
+        if flanco:
+            self.flancos += 1
+            self.estimador.flanco((self._anterior + agora) / 2)
+        if self._anterior is not None and agora - self._anterior > self._intervalo_max:
+            self._intervalo_max = agora - self._anterior
+        self._estado, self._anterior = valor, agora
+        return flanco
+
+    # ---------------- Estado ----------------
+    def estatisticas(self):
+        decorrido = time.monotonic() - self._inicio
+        return {
+            "taxa_hz": round(self.amostras / decorrido, 1) if decorrido > 0 else 0.0,
+            "periodo_alvo_ms": round(self.periodo * 1000, 1),
+            "intervalo_max_ms": round(self._intervalo_max * 1000, 2),
+            "flancos": self.flancos,
+            "arranques": self.estimador.arranques,
+            "falhas": self.falhas,
+        }
@@ -0,0 +1,200 @@
+import argparse, glob, json, os, sqlite3, threading, time, uuid
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------- Configurações ----------------
+API_URL        = os.environ.get("SYSSENSE_API_URL", "http://127.0.0.1:8000")   # base; os endpoints são acrescentados
+PASTA_FILAS    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filas")
+MAX_REGISTOS   = 200000    # limite de leituras em disco por coletor (descarta as mais antigas)
+LOTE           = 200       # leituras por POST /lote
+TIMEOUT_HTTP   = 5         # s
+BACKOFF_MIN    = 1.0       # s
+BACKOFF_MAX    = 60.0      # s
+
+
+# ---------------- Fila persistente ----------------
+class FilaEnvio:
+    """
+    Fila local persistente (SQLite em modo WAL) entre um coletor e a API.
+
+    O coletor só enfileira; uma thread envia por ordem de chegada, em lotes,
+    para os endpoints /lote da API, com uma sessão HTTP reutilizada. Se a API
+    ou o MongoDB estiverem em baixo, as leituras ficam em disco e são
+    reenviadas quando voltarem. A ordem é garantida por endpoint.
+    Cada leitura leva um id_envio fixado ao enfileirar: se um lote chegou a
+    ser gravado mas a resposta se perdeu (timeout, 5xx), o reenvio traz os
+    mesmos ids e a API ignora os repetidos em vez de os gravar (e contar)
+    outra vez.
+    """
+
+    def __init__(self, nome, api_url=API_URL, pasta=PASTA_FILAS,
+                 max_registos=MAX_REGISTOS, lote=LOTE):
+        os.makedirs(pasta, exist_ok=True)
+        self.nome    = nome
+        self.api_url = api_url.rstrip("/")
+        self.max_registos = max_registos
+        self.lote    = lote
+        self.caminho = os.path.join(pasta, f"{nome}.db")
+
+        self._db   = abrir(self.caminho)
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._tamanho = self._db.execute("SELECT COUNT(*) FROM fila").fetchone()[0]
+
+        self._sessao = requests.Session()
+        self._sessao.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._backoff = 0.0
+        self._isolar  = 0      # leituras a enviar uma a uma depois de um lote recusado
+
+        self.enviados    = 0
+        self.lotes       = 0
+        self.falhas      = 0
+        self.descartados = 0   # removidos por falta de espaço
+        self.rejeitados  = 0   # recusados pela API (4xx): guardados à parte
+        self.ultimo_erro = None
+
+        threading.Thread(target=self._loop, name=f"fila-{nome}", daemon=True).start()
+
+    # ---------------- Enfileirar ----------------
+    def enfileirar(self, endpoint, payload):
+        """Guarda a leitura em disco (o timestamp e o id_envio são fixados agora, não no envio)."""
+        if "timestamp" not in payload:
+            payload = dict(payload, timestamp=datetime.utcnow().isoformat())
+        if "id_envio" not in payload:
+            payload = dict(payload, id_envio=uuid.uuid4().hex)
+        with self._lock:
+            self._db.execute("INSERT INTO fila (endpoint, payload, criado) VALUES (?, ?, ?)",
+                             (endpoint, json.dumps(payload), time.time()))
+            self._tamanho += 1
+            if self._tamanho > self.max_registos:
+                excesso = self._tamanho - self.max_registos
+                self._db.execute("DELETE FROM fila WHERE id IN "
+                                 "(SELECT id FROM fila ORDER BY id LIMIT ?)", (excesso,))
+                self._tamanho -= excesso
+                self.descartados += excesso
+            self._db.commit()
+        self._acordar.set()
+
+    # ---------------- Envio ----------------
+    def _proximo_lote(self):
+        with self._lock:
+            cab = self._db.execute("SELECT endpoint FROM fila ORDER BY id LIMIT 1").fetchone()
+            if cab is None:
+                return None, []
+            linhas = self._db.execute(
+                "SELECT id, payload FROM fila WHERE endpoint = ? ORDER BY id LIMIT ?",
+                (cab[0], 1 if self._isolar else self.lote)).fetchall()
+        return cab[0], linhas
+
+    def _remover(self, ids, tabela_destino=None):
+        marcas = ",".join("?" * len(ids))
+        with self._lock:
+            if tabela_destino:
+                self._db.execute(f"INSERT INTO {tabela_destino} (endpoint, payload, criado) "
+                                 f"SELECT endpoint, payload, criado FROM fila WHERE id IN ({marcas})", ids)
+            # rowcount: parte do lote pode já ter sido descartada por falta de espaço
+            self._tamanho -= self._db.execute(f"DELETE FROM fila WHERE id IN ({marcas})", ids).rowcount
+            self._db.commit()
+
+    def _enviar_lote(self):
+        """Envia um lote; devolve True se houver mais para enviar de imediato."""
+        endpoint, linhas = self._proximo_lote()
+        if not linhas:
+            return False
+        ids = [i for i, _ in linhas]
+        corpo = "[" + ",".join(p for _, p in linhas) + "]"
+        try:
+            r = self._sessao.post(f"{self.api_url}{endpoint}/lote", data=corpo,
+                                  headers={"Content-Type": "application/json"}, timeout=TIMEOUT_HTTP)
+        except requests.RequestException as e:
+            return self._falhou(f"{type(e).__name__}: {e}")
+
+        if self._isolar: self._isolar -= 1
+        if r.status_code < 300:
+            self._remover(ids)
+            self.enviados += len(ids)
+            self.lotes += 1
+            self._backoff = 0.0
+            return True
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            if len(ids) > 1:
+                # reenvia o lote leitura a leitura para só pôr de parte as inválidas
+                self._isolar = len(ids)
+                return True
+            # dados que a API nunca vai aceitar: não podem bloquear a fila
+            self._remover(ids, "rejeitados")
+            self.rejeitados += len(ids)
+            self.ultimo_erro = f"HTTP {r.status_code}: {r.text[:200]}"
+            return True
+        return self._falhou(f"HTTP {r.status_code}")
+
+    def _falhou(self, erro):
+        self.falhas += 1
+        self.ultimo_erro = erro
+        self._backoff = min(max(self._backoff * 2, BACKOFF_MIN), BACKOFF_MAX)
+        return False
+
+    def _loop(self):
+        while True:
+            try:
+                mais = self._enviar_lote()
+            except sqlite3.Error as e:
+                mais = self._falhou(f"sqlite: {e}")
+            if mais:
+                continue
+            if self._backoff:
+                time.sleep(self._backoff)   # API em baixo: novas leituras não forçam reenvio
+            else:
+                self._acordar.wait(1.0)     # fila vazia: espera nova leitura
+                self._acordar.clear()
+
+    # ---------------- Estado ----------------
+    def estado(self):
+        with self._lock:
+            return {**resumo(self._db), "enviados": self.enviados, "lotes": self.lotes,
+                    "falhas": self.falhas, "descartados": self.descartados,
+                    "rejeitados": self.rejeitados, "ultimo_erro": self.ultimo_erro}
+
+
+# ---------------- SQLite ----------------
+def abrir(caminho):
+    db = sqlite3.connect(caminho, check_same_thread=False, timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")   # WAL: não corrompe, só pode perder o último commit
+    for tabela in ("fila", "rejeitados"):
+        db.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ("
+                   "id INTEGER PRIMARY KEY AUTOINCREMENT, endpoint TEXT NOT NULL, "
+                   "payload TEXT NOT NULL, criado REAL NOT NULL)")
+    db.execute("CREATE INDEX IF NOT EXISTS fila_endpoint ON fila (endpoint, id)")
+    db.commit()
+    return db
+
+def resumo(db):
+    """Profundidade e atraso (idade da leitura mais antiga) por endpoint."""
+    agora = time.time()
+    endpoints = {
+        ep: {"pendentes": n, "atraso_s": round(agora - criado, 1)}
+        for ep, n, criado in db.execute(
+            "SELECT endpoint, COUNT(*), MIN(criado) FROM fila GROUP BY endpoint")
+    }
+    return {
+        "pendentes": sum(e["pendentes"] for e in endpoints.values()),
+        "atraso_s": max((e["atraso_s"] for e in endpoints.values()), default=0.0),
+        "rejeitados_em_disco": db.execute("SELECT COUNT(*) FROM rejeitados").fetchone()[0],
+        "endpoints": endpoints,
+    }
+
+
+# ---------------- Leitura do estado de todos os coletores ----------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Profundidade e atraso das filas dos coletores")
+    ap.add_argument("--pasta", default=PASTA_FILAS)
+    args = ap.parse_args()
+
+    for caminho in sorted(glob.glob(os.path.join(args.pasta, "*.db"))):
+        r = resumo(abrir(caminho))
+        print(f"{os.path.basename(caminho)[:-3]:24} {r['pendentes']:>8} pendentes  "
+              f"atraso {r['atraso_s']:>8} s  rejeitados {r['rejeitados_em_disco']}")
+        for ep, e in r["endpoints"].items():
+            print(f"    {ep:40} {e['pendentes']:>8}  {e['atraso_s']:>8} s")
@@ -0,0 +1,209 @@
+import threading, time
+from datetime import datetime
+import requests
+from pymodbus.client import ModbusTcpClient
+
+# ---------------- Configurações ----------------
+ALTO  = 5      # valor do registo com o sensor ativo
+BAIXO = 0      # valor do registo com o sensor inativo
+
+PERIODO_AMOSTRAGEM = 0.02   # s entre leituras (alvo)
+BACKOFF_MAX        = 5.0    # s máximos entre tentativas de religação
+TIMEOUT_MODBUS     = 0.5    # s
+TIMEOUT_HTTP       = 3      # s (pedido da sequência à API no arranque)
+
+
+# ---------------- Motor de contagem ----------------
+class MotorContagem:
+    """
+    Amostra os registos de peças pequenas e grandes numa única leitura
+    (dois registos contíguos) sobre uma ligação Modbus persistente e aplica
+    a máquina de estados pequena/grande:
+      - o sensor de pequenas deteta todas as peças;
+      - se o sensor de grandes também esteve ativo durante o pulso, a peça é grande.
+    A contagem é feita no fim do pulso de pequenas (5 -> 0).
+    """
+
+    def __init__(self, ip, porta=502, unit_id=1, reg_pequenas=15, reg_grandes=16,
+                 periodo=PERIODO_AMOSTRAGEM, ao_contar=None):
+        if reg_grandes != reg_pequenas + 1:
+            raise ValueError("Os registos de pequenas e grandes têm de ser contíguos")
+        self.unit_id  = unit_id
+        self.registo  = reg_pequenas
+        self.periodo  = periodo
+        self.ao_contar = ao_contar     # callback(tipo, total, timestamp)
+        # ip=None: as leituras são feitas por fora e entregues com amostra()
+        self._client  = ModbusTcpClient(ip, port=porta, timeout=TIMEOUT_MODBUS) if ip else None
+        self._backoff = 0.0
+        self._parar   = threading.Event()
+
+        # máquina de estados
+        self.contador_pequenas = 0
+        self.contador_grandes  = 0
+        self._pequena_ativa = False
+        self._grande_ativa  = False
+        self._amostras_pulso = 0       # amostras com o pulso de pequenas ativo
+
+        # estatísticas
+        self.amostras = 0
+        self.falhas   = 0
+        self.religacoes = 0
+        self.lacunas_suspeitas = 0     # intervalos longos onde um pulso pode ter escapado
+        self.pulsos_curtos     = 0     # pulsos vistos numa só amostra (no limite da deteção)
+        self.grandes_sem_pequena = 0   # pulso grande sem pulso pequeno (pequeno perdido?)
+        self._intervalo_soma  = 0.0
+        self._intervalo_soma2 = 0.0
+        self._intervalo_max   = 0.0
+        self._intervalos      = 0
+        self._anterior = None          # monotonic da última amostra válida
+        self._inicio = time.monotonic()
+
+    def semear(self, pequenas, grandes):
+        """Retoma a numeração (ex.: a partir da sequência guardada na API)."""
+        self.contador_pequenas = pequenas
+        self.contador_grandes  = grandes
+
+    # ---------------- Leitura ----------------
+    def _ler(self):
+        """Lê (pequenas, grandes) numa só transação; None em caso de falha."""
+        try:
+            if not self._client.connected:
+                if not self._client.connect():
+                    raise ConnectionError("Falha conexão Modbus")
+                self.religacoes += 1
+            resp = self._client.read_holding_registers(address=self.registo, count=2,
+                                                       slave=self.unit_id)
+            if resp.isError():
+                raise ConnectionError("Erro na leitura Modbus")
+            self._backoff = 0.0
+            return int(resp.registers[0]), int(resp.registers[1])
+        except Exception:
+            self._client.close()
+            self._backoff = min(max(self._backoff * 2, self.periodo), BACKOFF_MAX)
+            return None
+
+    # ---------------- Máquina de estados ----------------
+    def processar(self, pequenas, grandes, agora=None):
+        """Aplica uma amostra à máquina de estados (devolve o tipo contado ou None)."""
+        contado = None
+        if pequenas == ALTO:
+            self._pequena_ativa = True
+            self._amostras_pulso += 1
+        if grandes == ALTO:
+            self._grande_ativa = True
+
+        if pequenas == BAIXO and self._pequena_ativa:
+            if self._amostras_pulso == 1:
+                self.pulsos_curtos += 1
+            if self._grande_ativa:
+                self.contador_grandes += 1
+                contado = "grande"
+            else:
+                self.contador_pequenas += 1
+                contado = "pequena"
+            self._pequena_ativa = False
+            self._grande_ativa  = False
+            self._amostras_pulso = 0
+        elif grandes == BAIXO and self._grande_ativa and not self._pequena_ativa:
+            # pulso grande terminou sem pulso pequeno
+            self.grandes_sem_pequena += 1
+            self._grande_ativa = False
+
+        if contado and self.ao_contar:
+            total = self.contador_grandes if contado == "grande" else self.contador_pequenas
+            self.ao_contar(contado, total, agora or datetime.utcnow())
+        return contado
+
+    # ---------------- Ciclo ----------------
+    def _registar_intervalo(self, dt):
+        self._intervalos += 1
+        self._intervalo_soma  += dt
+        self._intervalo_soma2 += dt * dt
+        if dt > self._intervalo_max: self._intervalo_max = dt
+        # um pulso típico dura várias amostras; um intervalo de 3+ períodos pode tê-lo engolido
+        if dt > 3 * self.periodo:
+            self.lacunas_suspeitas += 1
+
+    def amostra(self, leitura, agora=None):
+        """
+        Regista uma leitura (pequenas, grandes), ou None se a leitura falhou.
+        Usado pelo próprio ciclo e por quem lê os registos por fora
+        (ex.: o daemon de aquisição, que junta várias leituras numa transação).
+        """
+        agora = agora or time.monotonic()
+        if leitura is None:
+            self.falhas += 1
+            self._anterior = None   # o intervalo seguinte não é representativo
+            return None
+        self.amostras += 1
+        if self._anterior is not None:
+            self._registar_intervalo(agora - self._anterior)
+        self._anterior = agora
+        return self.processar(*leitura)
+
+    def correr(self, parar=None):
+        """Ciclo de amostragem com calendário absoluto (não acumula atraso)."""
+        proximo = time.monotonic()
+        while parar is None or not parar.is_set():
+            leitura = self._ler()
+            self.amostra(leitura)
+            if leitura is None:
+                time.sleep(self._backoff)
+                proximo = time.monotonic()
+
+            proximo += self.periodo
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                proximo = time.monotonic()   # atrasado: realinha
+
+    def iniciar(self):
+        self._parar.clear()
+        t = threading.Thread(target=self.correr, args=(self._parar,), name="motor-contagem", daemon=True)
+        t.start()
+        return t
+
+    def parar(self):
+        self._parar.set()
+        if self._client: self._client.close()
+
+    # ---------------- Estado ----------------
+    def estatisticas(self):
+        n = self._intervalos or 1
+        media = self._intervalo_soma / n
+        jitter = max(0.0, self._intervalo_soma2 / n - media * media) ** 0.5
+        decorrido = time.monotonic() - self._inicio
+        return {
+            "pequenas": self.contador_pequenas,
+            "grandes": self.contador_grandes,
+            "taxa_hz": round(self.amostras / decorrido, 1) if decorrido > 0 else 0.0,
+            "periodo_alvo_ms": round(self.periodo * 1000, 1),
+            "periodo_medio_ms": round(media * 1000, 2),
+            "jitter_ms": round(jitter * 1000, 2),
+            "intervalo_max_ms": round(self._intervalo_max * 1000, 2),
+            "falhas": self.falhas,
+            "religacoes": self.religacoes,
+            "lacunas_suspeitas": self.lacunas_suspeitas,
+            "pulsos_curtos": self.pulsos_curtos,
+            "grandes_sem_pequena": self.grandes_sem_pequena,
+        }
+
+
+# ---------------- Sequência no arranque ----------------
+def sequencia_inicial(fila, endpoint_pequenas, endpoint_grandes, dispositivo=None):
+    """
+    Totais de onde retomar a contagem: sequência acumulada na API (do
+    `dispositivo`, ou do dispositivo por omissão) mais as peças ainda na fila
+    local (contadas, mas por enviar). None se a API não responder; os totais
+    do servidor continuam certos (cada peça soma 1), só a numeração das
+    leituras recomeça.
+    """
+    rota = f"/dispositivos/{dispositivo}/contadores/sequencia" if dispositivo else "/contadores/sequencia"
+    try:
+        seq = requests.get(f"{fila.api_url}{rota}", timeout=TIMEOUT_HTTP).json()
+    except (requests.RequestException, ValueError):
+        return None
+    pendentes = fila.estado()["endpoints"]
+    return (seq.get("pequena", 0) + pendentes.get(endpoint_pequenas, {}).get("pendentes", 0),
+            seq.get("grande", 0) + pendentes.get(endpoint_grandes, {}).get("pendentes", 0))